@@ -0,0 +1,81 @@
+"""Agent controller module."""
+import signal
+
+from cement import Controller, ex
+
+from ..core.agent import RefreshAgent
+
+
+class Agent(Controller):
+    """ Class implementing controller for the ``agent`` command."""
+
+    class Meta:
+        """Controller meta-data."""
+
+        label: str = "agent"
+        stacked_on: str = "base"
+        stacked_type: str = "embedded"
+
+    @ex(
+        help="keep secrets listed in the manifest file up to date",
+        arguments=[
+            (
+                ["--manifest", "-m"],
+                {
+                    "help": "YAML file with the list of secrets to save, \
+                        as accepted by 'secrets save-many', with optional \
+                        'interval' property in seconds for each secret",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "required": True,
+                    "dest": "manifest_path",
+                },
+            ),
+            (
+                ["--interval"],
+                {
+                    "help": "Seconds between refreshes of a secret, unless set \
+                        in the manifest (overrides 'agent.interval' config, adaptive \
+                        by default)",
+                    "action": "store",
+                    "type": float,
+                    "metavar": "SECONDS",
+                    "dest": "interval",
+                },
+            ),
+            (
+                ["--jitter"],
+                {
+                    "help": "Upper bound of the random delay in seconds added \
+                        to refreshes (overrides 'agent.jitter' config)",
+                    "action": "store",
+                    "type": float,
+                    "metavar": "SECONDS",
+                    "dest": "jitter",
+                },
+            ),
+        ],
+    )
+    def agent(self) -> None:
+        """Keep secrets listed in the manifest up to date.
+
+        Runs in foreground as a long-lived process, refreshing each secret
+        from the manifest periodically through the same pipeline as
+        ``secrets save``, while reusing Azure credentials, access tokens and
+        connections to Key Vaults between refreshes.
+
+        On ``SIGHUP``, re-reads the config files and the manifest. Stops on
+        ``SIGINT`` or ``SIGTERM``, after refreshes in progress and pending
+        post-hooks.
+
+        """
+        agent = RefreshAgent(
+            self.app,
+            self.app.pargs.manifest_path,
+            interval=self.app.pargs.interval,
+            jitter=self.app.pargs.jitter,
+        )
+
+        signal.signal(signal.SIGHUP, lambda signum, frame: agent.reload())
+
+        agent.run()
@@ -27,4 +27,13 @@ class Base(Controller):
         arguments = [
             # add a version banner
             (["-v", "--version"], {"action": "version", "version": VERSION_BANNER}),
+            (
+                ["--metrics-json"],
+                {
+                    "help": "write timings of the run as JSON to file (stderr if '-')",
+                    "action": "store",
+                    "dest": "metrics_json",
+                    "metavar": "PATH",
+                },
+            ),
         ]
@@ -1,26 +1,38 @@
 """Secrets controller module."""
-from base64 import standard_b64decode
-from binascii import Error as BinAsciiError
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from hashlib import sha256
 from pathlib import Path
-from typing import Any, Dict, KeysView, List, Optional
-
-from azure.core.exceptions import (
-    ClientAuthenticationError,
-    HttpResponseError,
-    ResourceNotFoundError,
-    ServiceRequestError,
-)
-from azure.keyvault.secrets import KeyVaultSecret, SecretClient
+from time import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from cement import Controller, ex
-from cement.utils import shell
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
-from cryptography.hazmat.primitives.serialization import pkcs12
-from cryptography.x509 import Certificate
+from ..core.archive import (
+    ArchiveReader,
+    ArchiveWriter,
+    load_passphrase,
+    record_properties,
+    secret_record,
+)
+from ..core.convert import PFX_OUTPUTS
+from ..core.exc import AzKVError
+from ..core.fetch import SecretFetcher, map_bounded
+from ..core.files import open_atomic
+from ..core.index import MATCH_GLOB, MATCH_REGEX, MATCH_SUBSTRING
+from ..core.output import OUTPUT_JSON, OUTPUT_NDJSON
+from ..core.pipeline import (
+    STATUS_FAILED,
+    STATUS_NOT_FOUND,
+    STATUS_UNCHANGED,
+    SaveEntry,
+    SavePipeline,
+    SaveResult,
+    load_manifest,
+)
+from ..core.schedule import RefreshScheduler
+from ..core.sync import STATUS_FAILED as SYNC_FAILED, VaultSync
 
 
 class Secrets(Controller):
@@ -34,54 +46,6 @@ class Secrets(Controller):
         stacked_type: str = "nested"
         help: str = "Operations with secrets"  # noqa: A003
 
-    def _get_secret(
-        self, vault: str, name: str, version: str = None,
-    ) -> Optional[KeyVaultSecret]:
-        """Get a secret from the specific Azure Key Vault.
-
-        Fetches secret from ``vault`` with the specified ``name`` and ``version``.
-
-        Parameters
-        ----------
-        vault
-            Short name of the Key Vault form config file.
-
-        name
-            The name of the secret.
-
-        version
-            (optional) Version of the secret to get. If unspecified, gets
-            the latest version.
-
-        Returns
-        -------
-        :obj:`~typing.Optional` [:obj:`~azure.keyvault.secrets.KeyVaultSecret`]
-            If found, all of a secret’s properties, and its value. Otherwise returns
-            ``None``.
-
-        """
-        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
-
-        self.app.log.info(
-            "Querying vault '{}' through '{}'".format(vault, keyvaults[vault]["url"])
-        )
-        try:
-            with SecretClient(
-                vault_url=keyvaults[vault]["url"],
-                credential=self.app.vault_creds[vault],
-            ) as secret_client:
-                return secret_client.get_secret(name, version)
-        except ResourceNotFoundError:
-            self.app.log.info("Secret '{}' not found in vault '{}'".format(name, vault))
-        except ClientAuthenticationError as e:
-            self.app.log.error("ClientAuthenticationError: {}".format(str(e)))
-        except HttpResponseError as e:
-            self.app.log.error("HttpResponseError: {}".format(str(e)))
-        except ServiceRequestError as e:
-            self.app.log.error("ServiceRequestError: {}".format(str(e)))
-        else:
-            return None
-
     def _get_vaults(self, param_name: str = "undefined") -> List[str]:
         """Get the list of applicable Azure Key Vaults.
 
@@ -101,35 +65,15 @@ class Secrets(Controller):
             List of Azure Key Vault names scoped through CLI or config.
 
         """
-        # get key vaults from config
-        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
-        # get key vault short names from config
-        keyvault_names: KeysView[str] = keyvaults.keys()
-
-        vault_list: List[str] = []
-
         # check if expected CLI parameter is present and get corresponding value
         try:
-            vault_param = getattr(self.app.pargs, param_name)
+            vault_param: Optional[List[str]] = getattr(self.app.pargs, param_name)
         except AttributeError:
             self.app.log.error("CLI parameter '{}' does not exist".format(param_name))
-        else:
-            # get list of scoped vault names, if specified
-            if vault_param is not None:
-                dirty_vault_list = vault_param
-
-                # verify that provided vault names exist in config
-                for vault in dirty_vault_list:
-                    if vault not in keyvault_names:
-                        self.app.log.error("Unknown Key Vault '{}'".format(vault))
-                    else:
-                        vault_list.append(vault)
-
-            # otherwise, use all available vault names
-            else:
-                vault_list = list(keyvault_names)
 
-        return vault_list
+            return []
+
+        return SecretFetcher(self.app).get_vaults(vault_param)
 
     @ex(
         help="download secret from first available Azure Key Vault",
@@ -181,6 +125,16 @@ class Secrets(Controller):
                     "dest": "pfx_password",
                 },
             ),
+            (
+                ["--pfx-output", "-o"],
+                {
+                    "help": "Output to write in 'pfx-split-pem' conversion \
+                        (could be repeated, 'key-pem' and 'cert-pem' by default)",
+                    "choices": list(PFX_OUTPUTS),
+                    "action": "append",
+                    "dest": "pfx_outputs",
+                },
+            ),
             (
                 ["--post-hook", "-s"],
                 {
@@ -191,6 +145,17 @@ class Secrets(Controller):
                     "dest": "post_hook",
                 },
             ),
+            (
+                ["--hook"],
+                {
+                    "help": "Name of the action from 'hooks' config section to \
+                        be run after the secret has been created or updated \
+                        (could be repeated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "dest": "hooks",
+                },
+            ),
             (
                 ["--vault", "-kv"],
                 {
@@ -201,6 +166,37 @@ class Secrets(Controller):
                     "dest": "vault_list",
                 },
             ),
+            (
+                ["--hedge-delay"],
+                {
+                    "help": "Query the next Azure Key Vault if there is no response \
+                        within SECONDS (or right away on failure), and use the \
+                        secret from the first vault in order holding it",
+                    "action": "store",
+                    "type": float,
+                    "metavar": "SECONDS",
+                    "dest": "hedge_delay",
+                },
+            ),
+            (
+                ["--version"],
+                {
+                    "help": "Version of the secret to save, instead of the latest \
+                        one (see 'secrets versions')",
+                    "action": "store",
+                    "metavar": "VERSION",
+                    "dest": "secret_version",
+                },
+            ),
+            (
+                ["--force"],
+                {
+                    "help": "Process the secret even if its version has not changed \
+                        since it was last saved",
+                    "action": "store_true",
+                    "dest": "force",
+                },
+            ),
         ],
     )
     def save(self) -> None:
@@ -213,222 +209,786 @@ class Secrets(Controller):
         match is found. Alternatively, the list could be scoped to specific
         Key Vaults with the CLI option ``--vault NAME`` mentioned multiple times.
 
+        With the CLI option ``--hedge-delay SECONDS``, the next Key Vault is
+        queried without waiting for a slow or failed one, and the secret is taken
+        from the first Key Vault in order holding it, once the Key Vaults before
+        it have failed to return it.
+
+        With the CLI option ``--version VERSION``, the specified version of the
+        secret is saved instead of the latest one, e.g. to roll it back.
+
+        Processing stops early if the version of the secret has not changed since
+        it was last saved to the file, unless the CLI option ``--force`` is set.
+
         """
-        secret_name: str = self.app.pargs.secret_name
+        entry = SaveEntry(
+            name=self.app.pargs.secret_name,
+            file=self.app.pargs.file_path_secret,
+            b64decode=self.app.pargs.b64decode,
+            convert_action=self.app.pargs.convert_action,
+            pfx_password=self.app.pargs.pfx_password,
+            pfx_outputs=self.app.pargs.pfx_outputs,
+            post_hook=self.app.pargs.post_hook,
+            hooks=self.app.pargs.hooks,
+            vaults=self.app.pargs.vault_list,
+            hedge_delay=self.app.pargs.hedge_delay,
+            force=self.app.pargs.force,
+            version=self.app.pargs.secret_version,
+        )
+
+        pipeline = SavePipeline(self.app)
+        pipeline.post_hooks.check(entry.hooks or [])
+
+        pipeline.save(entry)
+        pipeline.post_hooks.flush()
+
+    @ex(
+        help="download secrets listed in the manifest file",
+        arguments=[
+            (
+                ["--manifest", "-m"],
+                {
+                    "help": "YAML file with the list of secrets to save, \
+                        each defined by 'name', 'file' and optional \
+                        'b64decode', 'post_convert', 'post_convert_pfx_pwd', \
+                        'pfx_outputs', 'post_hook', 'hooks', 'vaults' and \
+                        'version' properties",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "required": True,
+                    "dest": "manifest_path",
+                },
+            ),
+            (
+                ["--hedge-delay"],
+                {
+                    "help": "Query the next Azure Key Vault if there is no response \
+                        within SECONDS (or right away on failure), and use the \
+                        secret from the first vault in order holding it",
+                    "action": "store",
+                    "type": float,
+                    "metavar": "SECONDS",
+                    "dest": "hedge_delay",
+                },
+            ),
+            (
+                ["--force"],
+                {
+                    "help": "Process secrets even if their version has not changed \
+                        since they were last saved",
+                    "action": "store_true",
+                    "dest": "force",
+                },
+            ),
+        ],
+    )
+    def save_many(self) -> None:
+        """Fetch secrets listed in the manifest file.
 
-        file_path_secret: Path = Path(self.app.pargs.file_path_secret)
+        Runs the ``save`` pipeline for every entry of the manifest concurrently,
+        bounded by the ``concurrency`` config option, and reports the outcome
+        for each entry. Post-hooks shared by several updated secrets run once,
+        after all entries have been processed. Exits with non-zero code if any
+        secret has not been found or failed to be processed.
 
-        file_path_secret_tmp: Path = file_path_secret.with_suffix(".tmp")
+        """
+        entries: List[SaveEntry] = load_manifest(
+            self.app.pargs.manifest_path,
+            self.app.pargs.hedge_delay,
+            self.app.pargs.force,
+        )
+
+        self.app.log.info(
+            "Saving {} secret(s) from manifest '{}'".format(
+                len(entries), self.app.pargs.manifest_path
+            )
+        )
+
+        results: List[SaveResult] = []
 
-        file_secret_updated: bool = False
+        if len(entries) > 0:
+            pipeline = SavePipeline(self.app)
+            pipeline.post_hooks.check(hook for e in entries for hook in e.hooks or [])
 
-        base64_decode: bool = self.app.pargs.b64decode
+            concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+            with ThreadPoolExecutor(
+                max_workers=min(concurrency, len(entries))
+            ) as executor:
+                results = list(executor.map(pipeline.save, entries))
+
+            # run each post-hook once, after all of its secrets have been saved
+            failed_files: Set[str] = pipeline.post_hooks.flush()
+
+            results = [
+                result._replace(status=STATUS_FAILED)
+                if result.file in failed_files
+                else result
+                for result in results
+            ]
+
+        output_data: Dict[str, List[Dict[str, str]]] = {"results": []}
+
+        for result in results:
+            output_data["results"].append(
+                {
+                    "name": result.name,
+                    "file": result.file,
+                    "status": result.status,
+                    "vault_name": result.vault or "",
+                }
+            )
 
-        convert_action: str = self.app.pargs.convert_action
+            if result.status in (STATUS_NOT_FOUND, STATUS_FAILED):
+                self.app.exit_code = 1
 
-        pfx_password: str = self.app.pargs.pfx_password
+        self.app.render(output_data, "secrets_save_many.j2")
+
+    @ex(
+        label="list",
+        help="list secrets in Azure Key Vaults without fetching their values",
+        arguments=[
+            (
+                ["--prefix"],
+                {
+                    "help": "list only secrets with names starting with PREFIX",
+                    "action": "store",
+                    "metavar": "PREFIX",
+                    "dest": "prefix",
+                },
+            ),
+            (
+                ["--match"],
+                {
+                    "help": "list only secrets with names matching glob PATTERN",
+                    "action": "store",
+                    "metavar": "PATTERN",
+                    "dest": "pattern",
+                },
+            ),
+            (
+                ["--tag"],
+                {
+                    "help": "list only secrets with tag NAME (and VALUE, if set) \
+                        (could be repeated)",
+                    "action": "append",
+                    "metavar": "NAME[=VALUE]",
+                    "dest": "tags",
+                },
+            ),
+            (
+                ["--vault", "-kv"],
+                {
+                    "help": "Azure Key Vault name to list the secrets in \
+                        (could be repetated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "dest": "vault_list",
+                },
+            ),
+        ],
+    )
+    def list_secrets(self) -> None:
+        """List secrets in Azure Key Vaults.
 
-        post_hook: str = self.app.pargs.post_hook
+        Pages through properties of secrets in all available Key Vaults
+        concurrently, or in Key Vaults specified with the CLI option
+        ``--vault NAME`` mentioned multiple times, and outputs the secrets
+        matching the filters as each page arrives (or all at once with
+        ``--output json``). Values of the secrets are not fetched.
 
-        secret: Optional[KeyVaultSecret] = None
+        """
+        tags: Dict[str, Optional[str]] = {}
 
-        secret_output: bytes = ""
+        for tag in self.app.pargs.tags or []:
+            key, separator, value = tag.partition("=")
+            tags[key] = value if separator else None
 
         # get list of applicable key vaults
         vault_list: List[str] = self._get_vaults("vault_list")
 
-        if len(vault_list) > 0:
-            self.app.log.info(
-                "Fetching secret '{}' from '{}'".format(
-                    secret_name, ", ".join(vault_list)
+        fetcher = SecretFetcher(self.app)
+
+        # JSON output is a single document, so it is rendered after the last page
+        document: bool = self.app.output._meta.label == OUTPUT_JSON
+        document_data: Dict[str, Any] = {"header": True, "secrets": []}
+
+        header: bool = True
+
+        for vault, page in fetcher.list_secrets(
+            vault_list, self.app.pargs.prefix, self.app.pargs.pattern, tags
+        ):
+            output_data: Dict[str, Any] = (
+                document_data if document else {"header": header, "secrets": []}
+            )
+
+            for properties in page:
+                output_data["secrets"].append(
+                    {
+                        "vault_name": vault,
+                        "name": properties.name,
+                        "updated_on": properties.updated_on.strftime(
+                            "%Y-%m-%dT%H:%M:%SZ%z"
+                        )
+                        if properties.updated_on
+                        else "Undefined",
+                        "expires_on": properties.expires_on.strftime(
+                            "%Y-%m-%dT%H:%M:%SZ%z"
+                        )
+                        if properties.expires_on
+                        else "Undefined",
+                    }
                 )
+
+            if not document:
+                self._render_streamed(output_data, "secrets_list.j2")
+
+            header = False
+
+        if document:
+            self.app.render(document_data, "secrets_list.j2")
+
+    @ex(
+        help="list versions of a secret in Azure Key Vaults",
+        arguments=[
+            (
+                ["--name", "-n"],
+                {
+                    "help": "name of the secret",
+                    "action": "store",
+                    "metavar": "SECRET_NAME",
+                    "required": True,
+                    "dest": "secret_name",
+                },
+            ),
+            (
+                ["--vault", "-kv"],
+                {
+                    "help": "Azure Key Vault name to list the versions in \
+                        (could be repetated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "dest": "vault_list",
+                },
+            ),
+            (
+                ["--with-values"],
+                {
+                    "help": "Fetch values of the versions to report their SHA-256 \
+                        digests and versions with the same value",
+                    "action": "store_true",
+                    "dest": "with_values",
+                },
+            ),
+        ],
+    )
+    def versions(self) -> None:
+        """List versions of a secret in Azure Key Vaults.
+
+        Pages through versions of the secret in all available Key Vaults
+        concurrently, or in Key Vaults specified with the CLI option
+        ``--vault NAME`` mentioned multiple times, and lists them by Key Vault,
+        newest first.
+
+        With the CLI option ``--with-values``, values of the versions are fetched
+        in a thread pool bounded by the ``concurrency`` config option, and each
+        version is reported with the digest of its value and the newer version
+        of the same Key Vault it duplicates, if any.
+
+        """
+        secret_name: str = self.app.pargs.secret_name
+
+        # get list of applicable key vaults
+        vault_list: List[str] = self._get_vaults("vault_list")
+
+        fetcher = SecretFetcher(self.app)
+
+        found: List[Tuple[str, Any]] = [
+            (vault, properties)
+            for vault, page in fetcher.list_secret_versions(vault_list, secret_name)
+            for properties in page
+        ]
+
+        if len(found) == 0:
+            self.app.log.error("No versions of secret '{}' found".format(secret_name))
+            self.app.exit_code = 1
+
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+
+        # by vault in config order, newest first
+        found.sort(
+            key=lambda item: (
+                vault_list.index(item[0]),
+                -(item[1].created_on or oldest).timestamp(),
             )
-            for vault in vault_list:
-                secret = self._get_secret(vault, secret_name)
+        )
 
-                if secret:
-                    break
+        digests: List[str] = [""] * len(found)
 
-            if secret:
-                if base64_decode:
-                    self.app.log.info("Base64-decoding secret '{}'".format(secret_name))
+        if self.app.pargs.with_values and len(found) > 0:
+            concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
 
-                    try:
-                        secret_output = standard_b64decode(secret.value)
+            def digest(item: Tuple[str, Any]) -> str:
+                vault, properties = item
+                secret = fetcher.get_secret(vault, secret_name, properties.version)
 
-                    except BinAsciiError as e:
-                        self.app.log.error("Base64 decoding error: {}".format(str(e)))
+                if secret is None or secret.value is None:
+                    return ""
 
-                        secret_output = secret.value.encode()
+                return sha256(secret.value.encode()).hexdigest()
 
-                else:
-                    secret_output = secret.value.encode()
+            with ThreadPoolExecutor(
+                max_workers=min(concurrency, len(found))
+            ) as executor:
+                digests = list(executor.map(digest, found))
 
-                self.app.log.info(
-                    "Saving secret '{}' to temporary file '{}'".format(
-                        secret_name, file_path_secret_tmp
-                    )
+        output_data: Dict[str, Any] = {
+            "with_values": self.app.pargs.with_values,
+            "versions": [],
+        }
+
+        # newest version of each vault with the digest
+        newest: Dict[Tuple[str, str], str] = {}
+
+        for (vault, properties), value_digest in zip(found, digests):
+            duplicate_of: str = ""
+
+            if value_digest:
+                duplicate_of = newest.setdefault(
+                    (vault, value_digest), properties.version
                 )
-                with open(file_path_secret_tmp, "wb") as f:
-                    f.write(secret_output)
 
-                file_path_secret_tmp.chmod(0o600)
+                if duplicate_of == properties.version:
+                    duplicate_of = ""
 
-                if not file_path_secret.exists():
-                    self.app.log.info(
-                        "Target file '{}' does not exist, renaming '{}' as target".format(  # noqa: E501
-                            file_path_secret, file_path_secret_tmp
-                        )
+            output_data["versions"].append(
+                {
+                    "vault_name": vault,
+                    "name": properties.name,
+                    "version": properties.version,
+                    "enabled": bool(properties.enabled),
+                    "created_on": properties.created_on.strftime(
+                        "%Y-%m-%dT%H:%M:%SZ%z"
+                    )
+                    if properties.created_on
+                    else "Undefined",
+                    "expires_on": properties.expires_on.strftime(
+                        "%Y-%m-%dT%H:%M:%SZ%z"
                     )
-                    file_path_secret_tmp.rename(file_path_secret)
+                    if properties.expires_on
+                    else "Undefined",
+                    "digest": value_digest,
+                    "duplicate_of": duplicate_of,
+                }
+            )
 
-                    file_secret_updated = True
+        self.app.render(output_data, "secrets_versions.j2")
 
-                else:
-                    self.app.log.info(
-                        "Target file '{}' exists, checking against '{}'".format(
-                            file_path_secret, file_path_secret_tmp
-                        )
-                    )
+    @ex(
+        help="export all secrets of Azure Key Vaults to an encrypted archive",
+        arguments=[
+            (
+                ["--vault", "-kv"],
+                {
+                    "help": "Azure Key Vault name to export the secrets of \
+                        (could be repetated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "required": True,
+                    "dest": "vault_list",
+                },
+            ),
+            (
+                ["--out"],
+                {
+                    "help": "File path to write the archive to \
+                        (ensures file mode is '0600')",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "required": True,
+                    "dest": "archive_path",
+                },
+            ),
+            (
+                ["--passphrase-file"],
+                {
+                    "help": "File with the passphrase to encrypt the archive with \
+                        (if not set, read from 'AZKV_ARCHIVE_PASSPHRASE' environment \
+                        variable)",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "dest": "passphrase_file",
+                },
+            ),
+        ],
+    )
+    def export(self) -> None:
+        """Export latest versions of all secrets of Azure Key Vaults.
 
-                    hash_tmp = sha256()
-                    with open(file_path_secret_tmp, "rb") as f:
-                        hash_tmp.update(f.read())
-                    self.app.log.info(
-                        "Temporary file '{}' digest: '{}:{}'".format(
-                            file_path_secret_tmp, hash_tmp.name, hash_tmp.hexdigest()
-                        )
-                    )
+        Lists secrets of Key Vaults specified with the CLI option ``--vault NAME``
+        mentioned multiple times, fetches their values in a thread pool bounded
+        by the ``concurrency`` config option, and streams them into the archive
+        encrypted with AES-256-GCM under the key derived from the passphrase.
+        The archive replaces the file atomically once all secrets are written.
+        Exits with non-zero code if any secret failed to be fetched.
 
-                    hash_target = sha256()
-                    with open(file_path_secret, "rb") as f:
-                        hash_target.update(f.read())
-                    self.app.log.info(
-                        "Target file '{}' digest: '{}:{}'".format(
-                            file_path_secret, hash_target.name, hash_target.hexdigest()
-                        )
+        """
+        passphrase: bytes = load_passphrase(self.app.pargs.passphrase_file)
+
+        vault_list: List[str] = self._get_vaults("vault_list")
+
+        if len(vault_list) == 0:
+            raise AzKVError("No Azure Key Vaults to export")
+
+        fetcher = SecretFetcher(self.app)
+
+        counts: Dict[str, Dict[str, Any]] = {
+            vault: {"vault_name": vault, "exported": 0, "failed": 0}
+            for vault in vault_list
+        }
+
+        try:
+            with open_atomic(Path(self.app.pargs.archive_path)) as f:
+                writer = ArchiveWriter(f, passphrase)
+
+                for vault, _, secret in fetcher.export_secrets(vault_list):
+                    if secret is None:
+                        counts[vault]["failed"] += 1
+                        self.app.exit_code = 1
+
+                        continue
+
+                    writer.write(secret_record(vault, secret))
+                    counts[vault]["exported"] += 1
+
+                writer.close()
+        except OSError as e:
+            raise AzKVError("Unable to write archive: {}".format(str(e)))
+
+        self.app.log.info(
+            "Exported {} secret(s) to '{}'".format(
+                writer.count, self.app.pargs.archive_path
+            )
+        )
+
+        self.app.render({"results": list(counts.values())}, "secrets_export.j2")
+
+    @ex(
+        label="import",
+        help="verify or restore secrets from an encrypted archive",
+        arguments=[
+            (
+                ["--archive"],
+                {
+                    "help": "File path to read the archive from",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "required": True,
+                    "dest": "archive_path",
+                },
+            ),
+            (
+                ["--passphrase-file"],
+                {
+                    "help": "File with the passphrase to decrypt the archive with \
+                        (if not set, read from 'AZKV_ARCHIVE_PASSPHRASE' environment \
+                        variable)",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "dest": "passphrase_file",
+                },
+            ),
+            (
+                ["--vault", "-kv"],
+                {
+                    "help": "Azure Key Vault name to restore the secrets to \
+                        (if not set, restores to the vaults they were exported from)",
+                    "action": "store",
+                    "metavar": "NAME",
+                    "dest": "vault",
+                },
+            ),
+            (
+                ["--verify"],
+                {
+                    "help": "Only decrypt and verify the archive, without \
+                        restoring the secrets",
+                    "action": "store_true",
+                    "dest": "verify",
+                },
+            ),
+            (
+                ["--force"],
+                {
+                    "help": "Restore secrets even if their latest version in the \
+                        Azure Key Vault has the same value",
+                    "action": "store_true",
+                    "dest": "force",
+                },
+            ),
+        ],
+    )
+    def import_secrets(self) -> None:
+        """Verify or restore secrets from an encrypted archive.
+
+        Decrypts records of the archive written by ``secrets export`` one by one,
+        and sets each secret with its properties in the Key Vault it was exported
+        from, or in the Key Vault specified with the CLI option ``--vault NAME``,
+        in a thread pool bounded by the ``concurrency`` config option. Secrets
+        whose latest version has the same value are left unchanged, unless the
+        CLI option ``--force`` is set.
+
+        With the CLI option ``--verify``, the archive is only decrypted and
+        checked for corruption and truncation, without querying Key Vaults.
+
+        """
+        passphrase: bytes = load_passphrase(self.app.pargs.passphrase_file)
+
+        fetcher = SecretFetcher(self.app)
+
+        if self.app.pargs.vault and not fetcher.get_vaults([self.app.pargs.vault]):
+            raise AzKVError("No Azure Key Vault to restore to")
+        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
+
+        counts: Dict[str, Dict[str, Any]] = {}
+
+        def restore(record: Dict[str, Any]) -> Tuple[str, str]:
+            vault: str = self.app.pargs.vault or record["vault"]
+
+            if self.app.pargs.verify:
+                return vault, "verified"
+
+            if vault not in keyvaults:
+                self.app.log.error("Unknown Key Vault '{}'".format(vault))
+
+                return vault, STATUS_FAILED
+
+            if not self.app.pargs.force:
+                current = fetcher.get_secret(vault, record["name"])
+
+                if current is not None and current.value == record["value"]:
+                    return vault, STATUS_UNCHANGED
+
+            restored: bool = fetcher.set_secret(
+                vault, record["name"], record["value"], **record_properties(record)
+            )
+
+            return vault, "restored" if restored else STATUS_FAILED
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        try:
+            with open(self.app.pargs.archive_path, "rb") as f:
+                for _, (vault, status) in map_bounded(
+                    restore, ArchiveReader(f, passphrase), concurrency
+                ):
+                    count = counts.setdefault(
+                        vault,
+                        {"vault_name": vault, "verified": 0}
+                        if self.app.pargs.verify
+                        else {
+                            "vault_name": vault,
+                            "restored": 0,
+                            STATUS_UNCHANGED: 0,
+                            STATUS_FAILED: 0,
+                        },
                     )
+                    count[status] += 1
+
+                    if status == STATUS_FAILED:
+                        self.app.exit_code = 1
+        except OSError as e:
+            raise AzKVError("Unable to read archive: {}".format(str(e)))
+        except ValueError as e:
+            raise AzKVError(
+                "Invalid archive '{}': {}".format(self.app.pargs.archive_path, str(e))
+            )
 
-                    if hash_target.digest() == hash_tmp.digest():
-                        self.app.log.info(
-                            "Target and temporary files are identical, stop processing"
-                        )
-                        self.app.log.info(
-                            "Removing temporary file '{}'".format(file_path_secret_tmp)
-                        )
+        self.app.render(
+            {"verify": self.app.pargs.verify, "results": list(counts.values())},
+            "secrets_import.j2",
+        )
 
-                        file_path_secret_tmp.unlink()
+    @ex(
+        help="copy missing or changed secrets from one Azure Key Vault to others",
+        arguments=[
+            (
+                ["--from"],
+                {
+                    "help": "Azure Key Vault name to copy the secrets from",
+                    "action": "store",
+                    "metavar": "NAME",
+                    "required": True,
+                    "dest": "source_vault",
+                },
+            ),
+            (
+                ["--to"],
+                {
+                    "help": "Azure Key Vault name to copy the secrets to \
+                        (could be repetated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "required": True,
+                    "dest": "target_list",
+                },
+            ),
+            (
+                ["--dry-run"],
+                {
+                    "help": "Only output the plan of changes, without writing them",
+                    "action": "store_true",
+                    "dest": "dry_run",
+                },
+            ),
+        ],
+    )
+    def sync(self) -> None:
+        """Copy missing or changed secrets between Azure Key Vaults.
 
-                        file_secret_updated = False
+        Compares listings of the Key Vault specified with the CLI option
+        ``--from NAME`` and Key Vaults specified with the CLI option ``--to NAME``
+        mentioned multiple times, and copies secrets missing in the targets or
+        changed in the source since they were last synced. Secrets unchanged
+        since are skipped without fetching their values. With the CLI option
+        ``--dry-run``, changes are only listed.
 
-                    else:
-                        self.app.log.info(
-                            "Target and temporary files are different, continue processing"  # noqa: E501
-                        )
-                        self.app.log.info(
-                            "Renaming temporary file '{}' as target file '{}'".format(
-                                file_path_secret_tmp, file_path_secret
-                            )
-                        )
-                        file_path_secret_tmp.rename(file_path_secret)
+        Exits with non-zero code if any secret failed to be copied.
 
-                        file_secret_updated = True
+        """
+        source: List[str] = SecretFetcher(self.app).get_vaults(
+            [self.app.pargs.source_vault]
+        )
+        targets: List[str] = [
+            vault for vault in self._get_vaults("target_list") if vault not in source
+        ]
 
-                if file_secret_updated:
-                    if convert_action == "pfx-split-pem":
-                        private_key: RSAPrivateKey
-                        certificate: Certificate
-                        additional_certificates: List[Certificate]
+        if len(source) == 0 or len(targets) == 0:
+            raise AzKVError("Specify distinct Key Vaults with '--from' and '--to'")
 
-                        file_path_key_pem: Path = file_path_secret.with_name(
-                            "{}_key".format(file_path_secret.stem)
-                        ).with_suffix(".pem")
+        results, in_sync = VaultSync(self.app).sync(
+            source[0], targets, self.app.pargs.dry_run
+        )
 
-                        file_path_cert_pem: Path = file_path_secret.with_name(
-                            "{}_cert".format(file_path_secret.stem)
-                        ).with_suffix(".pem")
+        self.app.log.info(
+            "{} replica(s) changed, {} in sync".format(len(results), in_sync)
+        )
 
-                        self.app.log.info(
-                            "Applying '{}' conversion to secret '{}'".format(
-                                convert_action, secret_name
-                            )
-                        )
-                        try:
-                            (
-                                private_key,
-                                certificate,
-                                additional_certificates,
-                            ) = pkcs12.load_key_and_certificates(
-                                secret_output, pfx_password, default_backend()
-                            )
-
-                        except ValueError as e:
-                            self.app.log.error("ValueError: {}".format(str(e)))
-
-                        else:
-                            self.app.log.info(
-                                "Saving private key from '{}' as PEM to '{}'".format(
-                                    secret_name, file_path_key_pem
-                                )
-                            )
-                            private_key_pem = private_key.private_bytes(
-                                encoding=serialization.Encoding.PEM,
-                                format=serialization.PrivateFormat.PKCS8,
-                                encryption_algorithm=serialization.NoEncryption(),
-                            )
-                            with open(file_path_key_pem, "wb") as f:
-                                f.write(private_key_pem)
-
-                            file_path_key_pem.chmod(0o600)
-
-                            self.app.log.info(
-                                "Saving certificate from '{}' as PEM to '{}'".format(
-                                    secret_name, file_path_cert_pem
-                                )
-                            )
-                            certificate_pem = certificate.public_bytes(
-                                encoding=serialization.Encoding.PEM
-                            )
-                            with open(file_path_cert_pem, "wb") as f:
-                                f.write(certificate_pem)
-
-                                for intermediate_cert in additional_certificates:
-                                    intermediate_cert_pem = intermediate_cert.public_bytes(  # noqa: E501
-                                        encoding=serialization.Encoding.PEM
-                                    )
-
-                                    f.write(intermediate_cert_pem)
-
-                            file_path_cert_pem.chmod(0o600)
-
-                    if post_hook:
-                        self.app.log.info(
-                            "Executing post-hook shell command '{}'".format(post_hook)
-                        )
-                        stdout, stderr, exitcode = shell.cmd(post_hook)
-
-                        if exitcode == 0:
-                            self.app.log.info(
-                                "Post-hook shell command executed successfully"
-                            )
-
-                        else:
-                            self.app.log.error(
-                                "Post-hook shell command exited with code '{}'".format(
-                                    exitcode
-                                )
-                            )
-                            self.app.log.error(
-                                "Post-hook shell command error message '{}'".format(
-                                    stderr.decode().rstrip()
-                                )
-                            )
-
-                        self.app.log.info(
-                            "Post-hook shell command output '{}'".format(
-                                stdout.decode().rstrip()
-                            )
-                        )
+        output_data: Dict[str, List[Dict[str, str]]] = {"results": []}
+
+        for result in results:
+            output_data["results"].append(
+                {
+                    "name": result.name,
+                    "vault_name": result.vault,
+                    "action": result.action,
+                    "status": result.status,
+                }
+            )
+
+            if result.status == SYNC_FAILED:
+                self.app.exit_code = 1
+
+        self.app.render(output_data, "secrets_sync.j2")
+
+    @ex(
+        help="plan next refresh of secrets from their expiry and update times",
+        arguments=[
+            (
+                ["--name", "-n"],
+                {
+                    "help": "name of the secret (could be repeated)",
+                    "action": "append",
+                    "metavar": "SECRET_NAME",
+                    "dest": "secret_names",
+                },
+            ),
+            (
+                ["--manifest", "-m"],
+                {
+                    "help": "YAML file with the list of secrets, as accepted by \
+                        'secrets save-many'",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "dest": "manifest_path",
+                },
+            ),
+            (
+                ["--vault", "-kv"],
+                {
+                    "help": "Azure Key Vault name to fetch the secrets named with \
+                        '--name' from (could be repetated)",
+                    "action": "append",
+                    "metavar": "NAME",
+                    "dest": "vault_list",
+                },
+            ),
+        ],
+    )
+    def next_refresh(self) -> None:
+        """Plan next refresh of secrets.
+
+        Fetches secrets named with the CLI option ``--name`` or listed in the
+        manifest file from the first available Azure Key Vault, and computes
+        the time of their next refresh from expiry and update times according
+        to ``schedule`` config section (or ``interval`` of manifest entries).
+
+        Times are listed in UTC in the format accepted by ``OnCalendar`` option
+        of systemd timers.
+
+        """
+        entries: List[SaveEntry] = [
+            SaveEntry(name=name, file="", vaults=self.app.pargs.vault_list)
+            for name in self.app.pargs.secret_names or []
+        ]
+
+        if self.app.pargs.manifest_path:
+            entries.extend(load_manifest(self.app.pargs.manifest_path))
+
+        if len(entries) == 0:
+            raise AzKVError("Specify secrets with '--name' or '--manifest'")
+
+        fetcher = SecretFetcher(self.app)
+
+        scheduler = RefreshScheduler.from_config(
+            self.app.config.get("azkv", "schedule")
+        )
+
+        def plan(entry: SaveEntry) -> Dict[str, str]:
+            vault, secret = fetcher.get_first_secret(
+                fetcher.get_vaults(entry.vaults), entry.name, entry.hedge_delay
+            )
+
+            if secret is None:
+                self.app.exit_code = 1
+
+                return {"name": entry.name, "vault_name": "", "next_refresh": ""}
+
+            now = datetime.now(timezone.utc)
+
+            if entry.interval:
+                refresh_on = now + timedelta(seconds=entry.interval)
+            else:
+                refresh_on = scheduler.next_refresh(
+                    secret.properties.updated_on, secret.properties.expires_on, now
+                )
+
+            return {
+                "name": entry.name,
+                "vault_name": vault or "",
+                "next_refresh": refresh_on.astimezone(timezone.utc).strftime(
+                    "%Y-%m-%d %H:%M:%S UTC"
+                ),
+            }
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(entries))) as executor:
+            output_data: Dict[str, List[Dict[str, str]]] = {
+                "secrets": list(executor.map(plan, entries))
+            }
+
+        self.app.render(output_data, "secrets_next_refresh.j2")
 
     @ex(
         help="search secret in all available Azure Key Vaults",
@@ -436,7 +996,8 @@ class Secrets(Controller):
             (
                 ["--name", "-n"],
                 {
-                    "help": "name of the secret",
+                    "help": "name of the secret (or the pattern to match \
+                        names against with '--match')",
                     "action": "store",
                     "metavar": "SECRET_NAME",
                     "required": True,
@@ -453,6 +1014,26 @@ class Secrets(Controller):
                     "dest": "vault_list",
                 },
             ),
+            (
+                ["--match"],
+                {
+                    "help": "Match names of secrets in the local index as \
+                        case-insensitive substring, glob pattern or regular \
+                        expression, without fetching their values",
+                    "choices": [MATCH_SUBSTRING, MATCH_GLOB, MATCH_REGEX],
+                    "action": "store",
+                    "dest": "match",
+                },
+            ),
+            (
+                ["--refresh"],
+                {
+                    "help": "Refresh the local index of secrets before searching, \
+                        even if it is not older than 'index.max_age'",
+                    "action": "store_true",
+                    "dest": "refresh",
+                },
+            ),
         ],
     )
     def search(self) -> None:
@@ -461,9 +1042,22 @@ class Secrets(Controller):
         Expects CLI positional argument to contain the name of the secret
         to be searched.
 
-        By default, iterates through all available Key Vaults. Alternatively,
+        By default, queries all available Key Vaults concurrently. Alternatively,
         the list could be scoped to specific Key Vaults with the CLI option
-        ``--vault NAME`` mentioned multiple times.
+        ``--vault NAME`` mentioned multiple times. Results are listed in the
+        order of Key Vaults in config, or by priority and health, skipping Key Vaults
+        with open circuit breaker, if health tracking is enabled in config.
+
+        If the local index is enabled in config, Key Vaults known to hold
+        the secret are queried first, and the other ones only if it is not found
+        there. With the CLI option ``--match`` secrets are looked up in the index
+        only, refreshing it from every Key Vault if nothing matches, as secrets
+        created since the last refresh are not indexed yet. The index is
+        refreshed first if it is older than ``index.max_age`` seconds or the CLI
+        option ``--refresh`` is set.
+
+        With ``--output ndjson``, every secret found is output as soon as its
+        Key Vault responds, in order of arrival.
 
         """
         # get secret's name from CLI params
@@ -479,28 +1073,128 @@ class Secrets(Controller):
                 )
             )
 
-            output_data: Dict[str, List[KeyVaultSecret]] = {"secrets": []}
+            fetcher = SecretFetcher(self.app)
 
-            for vault in vault_list:
-                secret = self._get_secret(vault, secret_name)
+            # vaults refreshed since then are not refreshed again on fallback
+            started: float = time()
 
-                if secret is not None:
-                    output_data["secrets"].append(
-                        {
-                            "vault_name": vault,
-                            "name": secret.properties.name,
-                            "created_on": secret.properties.created_on.strftime(
-                                "%Y-%m-%dT%H:%M:%SZ%z"
-                            )
-                            if secret.properties.created_on
-                            else "Undefined",
-                            "expires_on": secret.properties.expires_on.strftime(
-                                "%Y-%m-%dT%H:%M:%SZ%z"
-                            )
-                            if secret.properties.expires_on
-                            else "Undefined",
-                            "version": secret.properties.version,
-                        }
+            if self.app.secret_index is not None:
+                index_config: Dict[str, Any] = self.app.config.get("azkv", "index")
+
+                fetcher.refresh_index(
+                    self.app.secret_index,
+                    vault_list,
+                    None if self.app.pargs.refresh else index_config.get("max_age"),
+                )
+
+            elif self.app.pargs.match:
+                raise AzKVError("Matching names requires 'index' enabled in config")
+
+            # with NDJSON output, secrets are rendered as soon as each vault responds
+            streaming: bool = self.app.output._meta.label == OUTPUT_NDJSON
+
+            # pairs of vault name and properties of the secret found in it
+            found: Iterable[Tuple[str, Any]] = []
+
+            if self.app.pargs.match:
+                found = self._match_indexed(secret_name, vault_list)
+
+                if not found and not self.app.pargs.refresh:
+                    self.app.log.info(
+                        "No match in index, refreshing it from vaults not refreshed yet"
                     )
 
-            self.app.render(output_data, "secrets_search.j2")
+                    # secrets created since the last refresh are not indexed yet
+                    fetcher.refresh_index(
+                        self.app.secret_index, vault_list, time() - started
+                    )
+
+                    found = self._match_indexed(secret_name, vault_list)
+
+            else:
+                vault_list = fetcher.order_vaults(vault_list)
+
+                # query vaults known to hold the secret first, and the rest of
+                # them if it is not found there
+                indexed_vaults: List[str] = fetcher.get_indexed_vaults(
+                    vault_list, secret_name
+                )
+                remaining_vaults: List[str] = [
+                    vault for vault in vault_list if vault not in indexed_vaults
+                ]
+
+                found = self._find_secret(
+                    fetcher,
+                    secret_name,
+                    [indexed_vaults, remaining_vaults]
+                    if indexed_vaults
+                    else [vault_list],
+                    streaming,
+                )
+
+            records = (self._search_record(vault, props) for vault, props in found)
+
+            if streaming:
+                for record in records:
+                    self._render_streamed({"secrets": [record]}, "secrets_search.j2")
+            else:
+                self.app.render({"secrets": list(records)}, "secrets_search.j2")
+
+    def _match_indexed(self, term: str, vault_list: List[str]) -> List[Tuple[str, Any]]:
+        """Get secrets in the vaults with names matching ``--match`` from the index."""
+        try:
+            return [
+                (secret.vault, secret)
+                for secret in self.app.secret_index.search(
+                    term, self.app.pargs.match, vault_list
+                )
+            ]
+        except ValueError as e:
+            raise AzKVError(str(e))
+
+    @staticmethod
+    def _find_secret(
+        fetcher: SecretFetcher,
+        name: str,
+        vault_lists: List[List[str]],
+        streaming: bool,
+    ) -> Iterator[Tuple[str, Any]]:
+        """Get properties of the secret from the first of vault lists holding it."""
+        for vault_list in vault_lists:
+            found: bool = False
+
+            for vault, secret in (
+                fetcher.iter_secrets if streaming else fetcher.get_secrets
+            )(vault_list, name):
+                if secret is not None:
+                    found = True
+
+                    yield vault, secret.properties
+
+            if found:
+                return
+
+    def _render_streamed(self, data: Dict[str, Any], template: str) -> None:
+        """Render part of the output, flushing it so that consumers get it at once.
+
+        Standard output is block-buffered when piped, e.g. to ``jq``.
+        """
+        self.app.render(data, template, out=sys.stdout)
+
+        sys.stdout.flush()
+
+    @staticmethod
+    def _search_record(vault: str, properties: Any) -> Dict[str, str]:
+        """Get output record of the secret found by ``search``."""
+        return {
+            "vault_name": vault,
+            "name": properties.name,
+            "created_on": properties.created_on.strftime("%Y-%m-%dT%H:%M:%SZ%z")
+            if properties.created_on
+            else "Undefined",
+            "expires_on": properties.expires_on.strftime("%Y-%m-%dT%H:%M:%SZ%z")
+            if properties.expires_on
+            else "Undefined",
+            # secrets matched in the index carry no version, as listings do not
+            "version": getattr(properties, "version", None) or "Undefined",
+        }
@@ -0,0 +1,84 @@
+"""Serve controller module."""
+from typing import Any, Dict
+
+from cement import Controller, ex
+
+from ..core.server import SERVE_MAX_SIZE, SERVE_SOCKET, SERVE_TTL, SecretServer
+
+
+class Serve(Controller):
+    """ Class implementing controller for the ``serve`` command."""
+
+    class Meta:
+        """Controller meta-data."""
+
+        label: str = "serve"
+        stacked_on: str = "base"
+        stacked_type: str = "embedded"
+
+    @ex(
+        help="serve secrets to local processes over a Unix socket",
+        arguments=[
+            (
+                ["--socket"],
+                {
+                    "help": "Path to the Unix socket to listen on \
+                        (overrides 'serve.socket' config)",
+                    "action": "store",
+                    "metavar": "PATH",
+                    "dest": "socket_path",
+                },
+            ),
+            (
+                ["--ttl"],
+                {
+                    "help": "Seconds to cache secrets in memory for \
+                        (overrides 'serve.ttl' config)",
+                    "action": "store",
+                    "type": float,
+                    "metavar": "SECONDS",
+                    "dest": "ttl",
+                },
+            ),
+            (
+                ["--max-size"],
+                {
+                    "help": "Maximum number of secrets to cache in memory \
+                        (overrides 'serve.max_size' config)",
+                    "action": "store",
+                    "type": int,
+                    "metavar": "COUNT",
+                    "dest": "max_size",
+                },
+            ),
+        ],
+    )
+    def serve(self) -> None:
+        """Serve secrets to local processes over a Unix socket.
+
+        Runs in foreground as a long-lived process, answering newline-delimited
+        JSON requests like ``{"name": "foo"}`` with the secret looked up across
+        Key Vaults and cached in memory. Access is controlled by ``serve.acl``
+        config option against user and group IDs of the peer process.
+
+        Stops on ``SIGINT`` or ``SIGTERM``.
+
+        """
+        serve_config: Dict[str, Any] = self.app.config.get("azkv", "serve") or {}
+
+        def option(name: str, default: Any) -> Any:
+            value = getattr(self.app.pargs, name)
+            if value is None:
+                value = serve_config.get(name)
+
+            return default if value is None else value
+
+        server = SecretServer(
+            self.app,
+            option("socket_path", serve_config.get("socket") or SERVE_SOCKET),
+            ttl=option("ttl", SERVE_TTL),
+            max_size=option("max_size", SERVE_MAX_SIZE),
+            acl=serve_config.get("acl"),
+        )
+
+        server.serve_forever()
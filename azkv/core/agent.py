@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""Long-running refresh agent module."""
+import random
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from threading import Event
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cement import App
+
+from .exc import AzKVError
+from .hooks import reload_vault_clients, write_metrics
+from .pipeline import (
+    STATUS_FAILED,
+    SaveEntry,
+    SavePipeline,
+    SaveResult,
+    load_manifest,
+)
+from .posthooks import PostHookRunner
+from .schedule import RefreshScheduler
+
+# maximum seconds to sleep between checks for reload or stop requests
+POLL_INTERVAL = 5.0
+
+AGENT_JITTER = 600
+
+
+class RefreshAgent:
+    """Class implementing agent refreshing secrets from the manifest.
+
+    Runs the ``secrets save`` pipeline for each entry of the manifest on its
+    own interval with random jitter, reusing Azure credentials and Key Vault
+    clients of the app between refreshes. Unless the interval is set, it is
+    derived from the lifecycle of the secret by :class:`RefreshScheduler`.
+    Post-hooks of secrets refreshed close together run once, after the debounce
+    window of :class:`PostHookRunner`.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    manifest_path
+        Path to the manifest file, as accepted by ``secrets save-many``.
+
+    interval
+        (optional) Seconds between refreshes of secrets without ``interval`` in
+        the manifest. Overrides ``agent.interval`` config option. If neither is
+        set, refreshes are scheduled according to ``schedule`` config section.
+
+    jitter
+        (optional) Upper bound of the random delay in seconds added to refreshes.
+        Overrides ``agent.jitter`` config option.
+
+    """
+
+    def __init__(
+        self,
+        app: App,
+        manifest_path: str,
+        interval: float = None,
+        jitter: float = None,
+    ) -> None:
+        """Initialize agent for the manifest."""
+        self.app = app
+        self.manifest_path = manifest_path
+
+        # options set on the command line survive reloads of the config
+        self._overrides: Dict[str, Optional[float]] = {
+            "interval": interval,
+            "jitter": jitter,
+        }
+
+        self.post_hooks = PostHookRunner.from_app(app)
+        self.pipeline = SavePipeline(app, self.post_hooks)
+        self.scheduler = RefreshScheduler.from_config(
+            self.app.config.get("azkv", "schedule")
+        )
+
+        # entries and their next refresh times, keyed by secret name and file
+        self._entries: Dict[Tuple[str, str], SaveEntry] = {}
+        self._schedule: Dict[Tuple[str, str], float] = {}
+
+        self._reload_requested = Event()
+        self._stop_requested = Event()
+        self._wakeup = Event()
+
+    def reload(self) -> None:
+        """Request the agent to re-read app config and the manifest."""
+        self._reload_requested.set()
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """Request the agent to stop after refreshes in progress."""
+        self._stop_requested.set()
+        self._wakeup.set()
+
+    def _config(self, key: str, default: Any) -> Any:
+        """Get the option of the ``agent`` config section."""
+        if self._overrides.get(key) is not None:
+            return self._overrides[key]
+
+        agent_config: Dict[str, Any] = self.app.config.get("azkv", "agent") or {}
+
+        value = agent_config.get(key)
+
+        return default if value is None else value
+
+    def _load_manifest(self) -> None:
+        """Load the manifest, keeping schedule of entries still listed in it."""
+        entries: List[SaveEntry] = load_manifest(self.manifest_path)
+
+        self.post_hooks.check(hook for e in entries for hook in e.hooks or [])
+
+        self._entries = {(entry.name, entry.file): entry for entry in entries}
+
+        jitter: float = self._config("jitter", AGENT_JITTER)
+
+        now = monotonic()
+
+        # drop schedule of removed entries and spread first refresh of new ones
+        self._schedule = {
+            key: self._schedule.get(key, now + random.uniform(0, jitter))  # noqa: S311
+            for key in self._entries
+        }
+
+        self.app.log.info(
+            "Loaded {} secret(s) from manifest '{}'".format(
+                len(self._entries), self.manifest_path
+            )
+        )
+
+    def _reload(self) -> None:
+        """Re-read app config and the manifest."""
+        self.app.log.info("Reloading config and manifest")
+
+        for config_file in self.app._meta.config_files:
+            self.app.config.parse_file(config_file)
+
+        reload_vault_clients(self.app)
+
+        # run hooks of secrets already updated before actions are redefined
+        self.post_hooks.flush()
+
+        self.post_hooks = PostHookRunner.from_app(self.app)
+        self.pipeline = SavePipeline(self.app, self.post_hooks)
+        self.scheduler = RefreshScheduler.from_config(
+            self.app.config.get("azkv", "schedule")
+        )
+
+        try:
+            self._load_manifest()
+        except AzKVError as e:
+            self.app.log.error(
+                "Keeping previous manifest: {}".format(e.args[0])  # noqa: G001
+            )
+
+    def next_interval(self, entry: SaveEntry, result: SaveResult) -> float:
+        """Get seconds until the next refresh of the entry.
+
+        Parameters
+        ----------
+        entry
+            Secret just refreshed.
+
+        result
+            Outcome of the refresh.
+
+        Returns
+        -------
+        float
+            Interval of the entry (or the default one) with random jitter.
+
+        """
+        interval: Optional[float] = entry.interval or self._config("interval", None)
+
+        if interval is None:
+            if result.vault is None:
+                # retry soon if the secret could not be fetched at all
+                interval = self.scheduler.min_interval
+            else:
+                interval = self.scheduler.next_interval(
+                    result.updated_on, result.expires_on
+                )
+
+        jitter: float = self._config("jitter", AGENT_JITTER)
+
+        return interval + random.uniform(0, jitter)  # noqa: S311
+
+    def _busy_hooks(self, keys: Iterable[Tuple[str, str]]) -> List[str]:
+        """Get post-hooks of the entries being refreshed."""
+        return [
+            hook
+            for key in keys
+            if key in self._entries
+            for hook in self.post_hooks.keys(
+                self._entries[key].hooks, self._entries[key].post_hook
+            )
+        ]
+
+    def run(self) -> None:
+        """Refresh secrets until stop is requested.
+
+        Waits for refreshes in progress and runs pending post-hooks before
+        returning, also if interrupted by an exception.
+        """
+        try:
+            self._run()
+        finally:
+            # pending post-hooks run also when stopped by a signal, e.g. SIGTERM
+            # raising ``CaughtSignal``, as their secrets are saved already
+            self.post_hooks.flush()
+
+    def _run(self) -> None:
+        """Refresh secrets until stop is requested, or an exception is raised."""
+        self._load_manifest()
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        running: Dict[Future, Tuple[str, str]] = {}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while not self._stop_requested.is_set():
+                if self._reload_requested.is_set() and not running:
+                    self._reload_requested.clear()
+                    self._reload()
+
+                now = monotonic()
+
+                # refresh due entries, unless reload is pending
+                if not self._reload_requested.is_set():
+                    for key, due in list(self._schedule.items()):
+                        if due <= now:
+                            del self._schedule[key]
+
+                            future = executor.submit(
+                                self.pipeline.save, self._entries[key]
+                            )
+                            running[future] = key
+
+                timeout = POLL_INTERVAL
+                if self._schedule:
+                    timeout = max(0.0, min(timeout, min(self._schedule.values()) - now))
+
+                hooks_due: Optional[float] = self.post_hooks.next_due(
+                    self._busy_hooks(running.values())
+                )
+                if hooks_due is not None:
+                    timeout = max(0.0, min(timeout, hooks_due - now))
+
+                if running:
+                    done, _ = wait(
+                        running, timeout=timeout, return_when=FIRST_COMPLETED
+                    )
+                else:
+                    done = set()
+
+                    self._wakeup.wait(timeout)
+                    self._wakeup.clear()
+
+                for future in done:
+                    key = running.pop(future)
+
+                    # skip entries removed from manifest while being refreshed
+                    if key not in self._entries:
+                        continue
+
+                    entry = self._entries[key]
+
+                    try:
+                        result: SaveResult = future.result()
+                    except Exception as e:  # noqa: B902
+                        # keep the agent running whatever happens to one secret
+                        self.app.log.error(
+                            "Refresh of secret '{}' failed: {!r}".format(entry.name, e)
+                        )
+                        result = SaveResult(entry.name, entry.file, STATUS_FAILED)
+
+                    interval = self.next_interval(entry, result)
+
+                    self._schedule[key] = monotonic() + interval
+
+                    self.app.log.info(
+                        "Secret '{}' refresh {}, next refresh in {:.0f}s".format(
+                            entry.name, result.status, interval
+                        )
+                    )
+
+                # hooks of secrets being refreshed wait for the refresh to finish
+                self.post_hooks.run_due(self._busy_hooks(running.values()))
+
+                # keep the textfile of metrics current between refreshes
+                if done:
+                    write_metrics(self.app, summary=False)
+
+            self.app.log.info("Stopping, waiting for refreshes in progress")
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Encrypted archive of secrets module."""
+import json
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, Optional, TYPE_CHECKING
+
+from .exc import AzKVError
+from .times import from_timestamp, to_timestamp
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import KeyVaultSecret
+
+# `cryptography` is imported by the functions using it, so that the app starts
+# fast if no archive is processed
+
+# environment variable with the passphrase, unless read from a file
+PASSPHRASE_ENV = "AZKV_ARCHIVE_PASSPHRASE"
+
+# header of the archive: magic and the salt of the key derivation
+ARCHIVE_MAGIC = b"AZKVARC1"
+SALT_SIZE = 16
+
+# scrypt parameters of the key derivation from the passphrase
+SCRYPT_N = 1 << 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# frame of a record: whether it is the last one and size of the ciphertext,
+# followed by the nonce and the ciphertext itself
+FRAME_HEADER = struct.Struct(">?I")
+NONCE_SIZE = 12
+
+# records are authenticated along with their index and whether they are the last
+RECORD_AAD = struct.Struct(">Q?")
+
+# secrets in Azure Key Vault are limited to 25k, so larger frames are corrupted
+MAX_FRAME_SIZE = 1 << 20
+
+
+def load_passphrase(path: Optional[str] = None) -> bytes:
+    """Load passphrase of the archive from the file or environment.
+
+    Parameters
+    ----------
+    path
+        (optional) Path to the file with the passphrase. If unspecified, the
+        passphrase is read from ``AZKV_ARCHIVE_PASSPHRASE`` environment variable.
+
+    Returns
+    -------
+    bytes
+        Passphrase without trailing newline.
+
+    Raises
+    ------
+    AzKVError
+        If the passphrase could not be read or is empty.
+
+    """
+    if path:
+        try:
+            with open(path, "rb") as f:
+                passphrase = f.read().rstrip(b"\r\n")
+        except OSError as e:
+            raise AzKVError("Unable to read passphrase: {}".format(str(e)))
+    else:
+        passphrase = os.environ.get(PASSPHRASE_ENV, "").encode()
+
+    if not passphrase:
+        raise AzKVError(
+            "Set passphrase of the archive with '--passphrase-file' or '{}'".format(
+                PASSPHRASE_ENV
+            )
+        )
+
+    return passphrase
+
+
+def _derive_key(passphrase: bytes, salt: bytes) -> Any:
+    """Derive AES-256-GCM cipher of the archive from the passphrase."""
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+    kdf = Scrypt(
+        salt=salt,
+        length=32,
+        n=SCRYPT_N,
+        r=SCRYPT_R,
+        p=SCRYPT_P,
+        backend=default_backend(),
+    )
+
+    return AESGCM(kdf.derive(passphrase))
+
+
+def secret_record(vault: str, secret: "KeyVaultSecret") -> Dict[str, Any]:
+    """Get archive record of the secret fetched from the vault."""
+    properties = secret.properties
+
+    return {
+        "vault": vault,
+        "name": secret.name,
+        "version": properties.version,
+        "value": secret.value,
+        "content_type": properties.content_type,
+        "tags": properties.tags,
+        "enabled": properties.enabled,
+        "not_before": to_timestamp(properties.not_before),
+        "expires_on": to_timestamp(properties.expires_on),
+    }
+
+
+def record_properties(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Get keyword arguments of ``SecretClient.set_secret`` from the record."""
+    return {
+        "content_type": record.get("content_type"),
+        "tags": record.get("tags"),
+        "enabled": record.get("enabled"),
+        "not_before": from_timestamp(record.get("not_before")),
+        "expires_on": from_timestamp(record.get("expires_on")),
+    }
+
+
+class ArchiveWriter:
+    """Class implementing writer of the encrypted archive of secrets.
+
+    The archive starts with a header holding the salt, which the key is derived
+    from the passphrase with, and continues with frames of records, each a JSON
+    object encrypted with AES-256-GCM under a random nonce. Every record is
+    authenticated along with its index, so that records could not be reordered,
+    and the archive ends with a record holding the count of records, so that
+    truncation is detected. Records are written as they come, so memory use does
+    not depend on the size of the archive.
+
+    Parameters
+    ----------
+    f
+        File opened for writing in binary mode.
+
+    passphrase
+        Passphrase of the archive.
+
+    """
+
+    def __init__(self, f: BinaryIO, passphrase: bytes) -> None:
+        """Initialize writer and write header of the archive."""
+        self.f = f
+        self.count = 0
+
+        salt = os.urandom(SALT_SIZE)
+        self._cipher = _derive_key(passphrase, salt)
+
+        self.f.write(ARCHIVE_MAGIC + salt)
+
+    def _write(self, data: Dict[str, Any], last: bool) -> None:
+        """Encrypt and write the frame of the record."""
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext: bytes = self._cipher.encrypt(
+            nonce, json.dumps(data).encode(), RECORD_AAD.pack(self.count, last)
+        )
+
+        self.f.write(FRAME_HEADER.pack(last, len(ciphertext)) + nonce + ciphertext)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Write the record to the archive."""
+        self._write(record, last=False)
+        self.count += 1
+
+    def close(self) -> None:
+        """Write the last record of the archive."""
+        self._write({"count": self.count}, last=True)
+
+
+class ArchiveReader:
+    """Class implementing reader of the encrypted archive of secrets.
+
+    Iterating over the reader decrypts and yields records one by one, as
+    written by :class:`ArchiveWriter`.
+
+    Parameters
+    ----------
+    f
+        File opened for reading in binary mode.
+
+    passphrase
+        Passphrase of the archive.
+
+    Raises
+    ------
+    ValueError
+        If the file is not an archive, or the archive has been tampered with,
+        truncated or encrypted with another passphrase.
+
+    """
+
+    def __init__(self, f: BinaryIO, passphrase: bytes) -> None:
+        """Initialize reader and read header of the archive."""
+        self.f = f
+
+        header = self.f.read(len(ARCHIVE_MAGIC) + SALT_SIZE)
+
+        if len(header) != len(ARCHIVE_MAGIC) + SALT_SIZE or not header.startswith(
+            ARCHIVE_MAGIC
+        ):
+            raise ValueError("Not an archive of secrets")
+
+        self._cipher = _derive_key(passphrase, header[-SALT_SIZE:])
+
+    def _read_exact(self, size: int) -> bytes:
+        """Read exactly ``size`` bytes of the archive."""
+        data = self.f.read(size)
+
+        if len(data) != size:
+            raise ValueError("Archive is truncated")
+
+        return data
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over records of the archive."""
+        from cryptography.exceptions import InvalidTag
+
+        count = 0
+
+        while True:
+            last, size = FRAME_HEADER.unpack(self._read_exact(FRAME_HEADER.size))
+
+            if size > MAX_FRAME_SIZE:
+                raise ValueError("Archive is corrupted")
+
+            nonce = self._read_exact(NONCE_SIZE)
+            ciphertext = self._read_exact(size)
+
+            try:
+                plaintext: bytes = self._cipher.decrypt(
+                    nonce, ciphertext, RECORD_AAD.pack(count, last)
+                )
+            except InvalidTag:
+                raise ValueError(
+                    "Archive is corrupted or encrypted with another passphrase"
+                )
+
+            data: Dict[str, Any] = json.loads(plaintext.decode())
+
+            if last:
+                if data.get("count") != count or self.f.read(1):
+                    raise ValueError("Archive is corrupted")
+
+                return
+
+            yield data
+
+            count += 1
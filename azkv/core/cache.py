@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""In-memory cache module."""
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Class implementing thread-safe in-memory cache with TTL and LRU eviction.
+
+    Entries expire ``ttl`` seconds after being stored. Once the cache holds
+    ``max_size`` entries, storing a new one evicts the least recently used.
+
+    Parameters
+    ----------
+    ttl
+        Seconds to keep entries for.
+
+    max_size
+        Maximum number of entries.
+
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Initialize empty cache."""
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+        # per-key locks to load missing entries once for concurrent readers
+        self._loading: Dict[Hashable, Lock] = {}
+
+    def __len__(self) -> int:
+        """Get number of entries, including expired ones not yet evicted."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get the value stored for ``key``.
+
+        Returns ``None`` if there is no such entry or it has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires, value = entry
+
+            if expires <= monotonic():
+                del self._entries[key]
+
+                return None
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:  # noqa: A003
+        """Store ``value`` for ``key``, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Optional[Any]:
+        """Get the value stored for ``key``, loading and storing it if missing.
+
+        Concurrent calls for the same missing ``key`` wait for a single call of
+        ``loader``. Values of ``None`` returned by ``loader`` are not stored.
+
+        Parameters
+        ----------
+        key
+            Key of the entry.
+
+        loader
+            Function returning the value of the entry.
+
+        Returns
+        -------
+        :obj:`~typing.Optional` [Any]
+            Value of the entry.
+
+        """
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, Lock())
+
+        with key_lock:
+            try:
+                # the value might have been loaded while waiting for the lock
+                value = self.get(key)
+
+                if value is None:
+                    value = loader()
+
+                    if value is not None:
+                        self.set(key, value)
+
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Key Vault clients module."""
+from threading import Lock
+from typing import Any, Dict, Mapping, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from azure.core.credentials import TokenCredential
+    from azure.keyvault.secrets import SecretClient
+
+    from requests import Session
+
+    from .throttle import VaultThrottle
+
+
+class VaultClients:
+    """Class implementing registry of long-lived Key Vault clients.
+
+    Keeps one :class:`~azure.keyvault.secrets.SecretClient` per vault, created on
+    first use. All clients share a single HTTP session, so connections and TLS
+    sessions are pooled and kept alive across vaults and across requests.
+    Azure SDK and HTTP session are set up on first use as well, so that the app
+    starts fast if no vault is queried.
+
+    Parameters
+    ----------
+    keyvaults
+        Key Vaults from config, keyed by short name.
+
+    vault_creds
+        Azure credentials, keyed by short name of the vault.
+
+    timeout
+        Timeout in seconds to connect to and to read a response from a vault.
+
+    pool_size
+        Maximum number of connections kept alive per vault.
+
+    throttle
+        (optional) Client-side throttle of requests to the vaults.
+
+    """
+
+    def __init__(
+        self,
+        keyvaults: Mapping[str, Any],
+        vault_creds: Mapping[str, "TokenCredential"],
+        timeout: int,
+        pool_size: int,
+        throttle: Optional["VaultThrottle"] = None,
+    ) -> None:
+        """Initialize registry with a shared HTTP session."""
+        self._keyvaults = keyvaults
+        self._vault_creds = vault_creds
+        self._timeout = timeout
+        self._throttle = throttle
+
+        self._clients: Dict[str, "SecretClient"] = {}
+        self._lock = Lock()
+
+        self._pool_size = max(1, pool_size)
+        self._session: Optional["Session"] = None
+
+    def _get_session(self) -> "Session":
+        """Get the HTTP session shared by all clients, creating it if necessary."""
+        if self._session is None:
+            from requests import Session
+            from requests.adapters import HTTPAdapter
+
+            from urllib3.util.retry import Retry
+
+            # mimic the session set up by azure-core, which leaves retries to the
+            # pipeline policies, but keep more connections alive for each host
+            adapter = HTTPAdapter(
+                pool_connections=max(1, len(self._keyvaults)),
+                pool_maxsize=self._pool_size,
+                max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+            )
+
+            self._session = Session()
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+
+        return self._session
+
+    def get(self, vault: str) -> "SecretClient":
+        """Get a client for the specific Azure Key Vault.
+
+        Parameters
+        ----------
+        vault
+            Short name of the Key Vault from config file.
+
+        Returns
+        -------
+        :obj:`~azure.keyvault.secrets.SecretClient`
+            Client bound to the vault, shared by all callers.
+
+        """
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.keyvault.secrets import SecretClient
+
+        from .policies import ThrottlePolicy
+
+        with self._lock:
+            if vault not in self._clients:
+                self._clients[vault] = SecretClient(
+                    vault_url=self._keyvaults[vault]["url"],
+                    credential=self._vault_creds[vault],
+                    transport=RequestsTransport(
+                        session=self._get_session(),
+                        session_owner=False,
+                        connection_timeout=self._timeout,
+                        read_timeout=self._timeout,
+                    ),
+                    per_retry_policies=[ThrottlePolicy(vault, self._throttle)]
+                    if self._throttle is not None
+                    else [],
+                )
+
+            return self._clients[vault]
+
+    def close(self) -> None:
+        """Close all clients and the underlying HTTP session."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+
+            self._clients.clear()
+
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Secret conversion module."""
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .files import write_atomic
+
+# `cryptography` is imported by the functions using it, so that the app starts
+# fast if no conversion is needed
+
+
+class PFXBundle(NamedTuple):
+    """Class describing the content of a PKCS12 archive."""
+
+    private_key: Any
+    certificate: Any
+    additional_certificates: List[Any]
+
+
+def load_pfx(data: bytes, password: Optional[str] = None) -> PFXBundle:
+    """Parse PKCS12 archive.
+
+    Parameters
+    ----------
+    data
+        DER-encoded PKCS12 archive.
+
+    password
+        (optional) Password of the archive.
+
+    Returns
+    -------
+    PFXBundle
+        Private key, certificate and additional certificates of the archive.
+
+    Raises
+    ------
+    ValueError
+        If the archive could not be parsed or has no key or certificate.
+
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.serialization import pkcs12
+
+    (
+        private_key,
+        certificate,
+        additional_certificates,
+    ) = pkcs12.load_key_and_certificates(
+        data, password.encode() if password else None, default_backend()
+    )
+
+    if private_key is None or certificate is None:
+        raise ValueError("PKCS12 archive has no private key or certificate")
+
+    return PFXBundle(private_key, certificate, list(additional_certificates or []))
+
+
+def _private_key(bundle: PFXBundle, pem: bool) -> bytes:
+    """Serialize the private key of the bundle as unencrypted PKCS8."""
+    from cryptography.hazmat.primitives import serialization
+
+    return bundle.private_key.private_bytes(
+        encoding=serialization.Encoding.PEM if pem else serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def _certificates(certificates: List[Any], pem: bool = True) -> bytes:
+    """Serialize the certificates in order."""
+    from cryptography.hazmat.primitives import serialization
+
+    encoding = serialization.Encoding.PEM if pem else serialization.Encoding.DER
+
+    return b"".join(cert.public_bytes(encoding=encoding) for cert in certificates)
+
+
+# outputs of PKCS12 conversion: suffix appended to the stem of the target file
+# and the function rendering the output from the parsed archive
+PFX_OUTPUTS: Dict[str, Tuple[str, Callable[[PFXBundle], bytes]]] = {
+    # PKCS8 private key
+    "key-pem": ("_key.pem", lambda b: _private_key(b, pem=True)),
+    "key-der": ("_key.der", lambda b: _private_key(b, pem=False)),
+    # certificate followed by the chain of additional certificates
+    "cert-pem": (
+        "_cert.pem",
+        lambda b: _certificates([b.certificate] + b.additional_certificates),
+    ),
+    "cert-der": ("_cert.der", lambda b: _certificates([b.certificate], pem=False)),
+    # certificate alone, and the chain alone
+    "leaf-pem": ("_leaf.pem", lambda b: _certificates([b.certificate])),
+    "chain-pem": ("_chain.pem", lambda b: _certificates(b.additional_certificates)),
+    # private key, certificate and the chain in one file, e.g. for HAProxy
+    "combined-pem": (
+        "_combined.pem",
+        lambda b: _private_key(b, pem=True)
+        + _certificates([b.certificate] + b.additional_certificates),
+    ),
+}
+
+# outputs of ``pfx-split-pem`` conversion, unless requested otherwise
+PFX_SPLIT_PEM_OUTPUTS = ["key-pem", "cert-pem"]
+
+
+def pfx_output_path(file_path: Path, output: str) -> Path:
+    """Get path to the output of PKCS12 conversion of the target file."""
+    suffix, _ = PFX_OUTPUTS[output]
+
+    return file_path.with_name(file_path.stem + suffix)
+
+
+def convert_pfx(
+    data: bytes,
+    file_path: Path,
+    outputs: List[str],
+    password: Optional[str] = None,
+    changed: bool = True,
+) -> List[Path]:
+    """Convert PKCS12 archive to the requested outputs.
+
+    Parses the archive once for all outputs, and replaces each output file
+    atomically with mode ``0600``. Unless the archive has ``changed``, only
+    missing outputs are written, and the archive is not parsed at all if
+    there are none.
+
+    Parameters
+    ----------
+    data
+        DER-encoded PKCS12 archive.
+
+    file_path
+        Path to the target file of the archive, next to which outputs are saved.
+
+    outputs
+        Names of the outputs from :data:`PFX_OUTPUTS`.
+
+    password
+        (optional) Password of the archive.
+
+    changed
+        (optional) Whether the archive differs from the one the outputs
+        have been written from.
+
+    Returns
+    -------
+    List[Path]
+        Paths to the written outputs.
+
+    Raises
+    ------
+    ValueError
+        If the archive could not be parsed.
+
+    """
+    pending: List[Tuple[Path, Callable[[PFXBundle], bytes]]] = [
+        (pfx_output_path(file_path, output), PFX_OUTPUTS[output][1])
+        for output in dict.fromkeys(outputs)
+    ]
+
+    if not changed:
+        pending = [(path, render) for path, render in pending if not path.exists()]
+
+    if not pending:
+        return []
+
+    bundle = load_pfx(data, password)
+
+    for path, render in pending:
+        write_atomic(path, render(bundle))
+
+    return [path for path, _ in pending]
@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+"""Azure credentials module."""
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+)
+from urllib.parse import urlparse
+
+from .files import write_atomic
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from azure.core.credentials import AccessToken, TokenCredential
+
+    from cryptography import fernet
+
+    from .metrics import Metrics
+
+# heavy modules like `azure.identity` and `cryptography` are imported by the
+# methods using them, so that the app starts fast if none of them is needed
+
+TOKEN_CACHE_PATH = "~/.azkv/token_cache.json"
+TOKEN_CACHE_REFRESH_MARGIN = 300
+
+
+def vault_scope(url: str) -> str:
+    """Get scope of access tokens for the Key Vault at ``url``.
+
+    E.g. ``https://vault.azure.net/.default`` for ``https://foo.vault.azure.net/``,
+    so that vaults in sovereign clouds get tokens for their own resource.
+    """
+    host: str = urlparse(url).hostname or ""
+
+    return "https://{}/.default".format(host.split(".", 1)[-1])
+
+
+class TokenCache:
+    """Class implementing file-backed cache of access tokens.
+
+    Tokens are kept in a JSON file with mode ``0600``, optionally encrypted
+    with the Fernet key read from ``key_file``. The file is replaced atomically
+    on every update, so concurrent invocations never read a partial file.
+
+    Parameters
+    ----------
+    path
+        Path to the cache file.
+
+    key_file
+        (optional) Path to the file with the Fernet key to encrypt the cache with.
+        The key is generated if the file does not exist.
+
+    """
+
+    def __init__(self, path: str, key_file: str = None) -> None:
+        """Initialize cache stored at ``path``."""
+        self.path = Path(path).expanduser()
+
+        self._fernet: Optional["fernet.Fernet"] = None
+        if key_file:
+            from cryptography.fernet import Fernet
+
+            self._fernet = Fernet(self._load_key(Path(key_file).expanduser()))
+
+        self._lock = Lock()
+
+    @staticmethod
+    def _load_key(key_path: Path) -> bytes:
+        """Read the encryption key, generating it if necessary."""
+        from cryptography.fernet import Fernet
+
+        if not key_path.exists():
+            key_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+            fd = os.open(str(key_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(Fernet.generate_key())
+
+        return key_path.read_bytes().strip()
+
+    def _read(self) -> Dict[str, Any]:
+        """Read all cached tokens, ignoring missing or unreadable file."""
+        from cryptography.fernet import InvalidToken
+
+        try:
+            data = self.path.read_bytes()
+
+            if self._fernet is not None:
+                data = self._fernet.decrypt(data)
+
+            tokens = json.loads(data.decode())
+        except (OSError, ValueError, InvalidToken):
+            return {}
+
+        return tokens if isinstance(tokens, dict) else {}
+
+    def _write(self, tokens: Dict[str, Any]) -> None:
+        """Replace the cache file with ``tokens``."""
+        data = json.dumps(tokens).encode()
+
+        if self._fernet is not None:
+            data = self._fernet.encrypt(data)
+
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        write_atomic(self.path, data)
+
+    def get(self, key: str) -> Optional["AccessToken"]:
+        """Get the cached token.
+
+        Parameters
+        ----------
+        key
+            Cache key of the token.
+
+        Returns
+        -------
+        :obj:`~typing.Optional` [:obj:`~azure.core.credentials.AccessToken`]
+            Cached token, if any. Tokens are returned even if expired.
+
+        """
+        with self._lock:
+            token = self._read().get(key)
+
+        if not token:
+            return None
+
+        from azure.core.credentials import AccessToken
+
+        return AccessToken(token["token"], int(token["expires_on"]))
+
+    def set(self, key: str, token: "AccessToken") -> None:  # noqa: A003
+        """Cache the token, dropping any expired tokens.
+
+        Parameters
+        ----------
+        key
+            Cache key of the token.
+
+        token
+            Token to be cached.
+
+        """
+        with self._lock:
+            now = time()
+
+            tokens = {
+                k: v for k, v in self._read().items() if v.get("expires_on", 0) > now
+            }
+            tokens[key] = {"token": token.token, "expires_on": token.expires_on}
+
+            try:
+                self._write(tokens)
+            except OSError:
+                # the cache is an optimization, so a read-only location or
+                # a full disk should not stop the app from getting secrets
+                pass
+
+
+class CachedCredential:
+    """Class implementing credential wrapper serving tokens from the cache.
+
+    Returns tokens from :class:`TokenCache` until ``refresh_margin`` seconds
+    before their expiry, and requests new tokens from the wrapped credential
+    otherwise.
+
+    Parameters
+    ----------
+    credential
+        Azure credential to be wrapped.
+
+    cache
+        Cache of access tokens shared between credentials.
+
+    cache_key
+        Identity of the credential, e.g. its type and client ID.
+
+    refresh_margin
+        Seconds before expiry when the cached token is no longer used.
+
+    """
+
+    def __init__(
+        self,
+        credential: "TokenCredential",
+        cache: TokenCache,
+        cache_key: str,
+        refresh_margin: int = TOKEN_CACHE_REFRESH_MARGIN,
+    ) -> None:
+        """Initialize wrapper of the ``credential``."""
+        self.credential = credential
+        self.cache = cache
+        self.cache_key = cache_key
+        self.refresh_margin = refresh_margin
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> "AccessToken":
+        """Request an access token for ``scopes``.
+
+        Tokens for requests with ``claims`` (e.g. Continuous Access Evaluation
+        challenges) bypass the cache.
+        """
+        if kwargs.get("claims"):
+            return self.credential.get_token(*scopes, **kwargs)
+
+        key = "{}|{}|{}".format(
+            self.cache_key, kwargs.get("tenant_id") or "", " ".join(sorted(scopes))
+        )
+
+        token = self.cache.get(key)
+        if token is not None and token.expires_on - self.refresh_margin > time():
+            return token
+
+        token = self.credential.get_token(*scopes, **kwargs)
+
+        self.cache.set(key, token)
+
+        return token
+
+    def close(self) -> None:
+        """Close the wrapped credential."""
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self) -> "CachedCredential":
+        """Enter the runtime context of the wrapped credential."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the runtime context, closing the wrapped credential."""
+        self.close()
+
+
+class SingleFlightCredential:
+    """Class implementing credential wrapper coalescing token requests.
+
+    Token requests of all processes using the same identity at once are
+    coalesced with :class:`~.singleflight.SingleFlight`, so that many
+    invocations started together, e.g. by timers on boot, make a single
+    request to the Instance Metadata Service or Azure AD.
+
+    Parameters
+    ----------
+    credential
+        Azure credential to be wrapped.
+
+    single_flight
+        Coordinator of requests across processes.
+
+    identity
+        Identity of the credential, e.g. its type and client ID.
+
+    """
+
+    def __init__(
+        self, credential: "TokenCredential", single_flight: SingleFlight, identity: str,
+    ) -> None:
+        """Initialize wrapper of the ``credential``."""
+        self.credential = credential
+        self.single_flight = single_flight
+        self.identity = identity
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> "AccessToken":
+        """Request an access token for ``scopes``.
+
+        Requests with ``claims`` (e.g. Continuous Access Evaluation challenges)
+        are not coalesced.
+        """
+        from azure.core.credentials import AccessToken
+
+        if kwargs.get("claims"):
+            return self.credential.get_token(*scopes, **kwargs)
+
+        key = "token|{}|{}|{}".format(
+            self.identity, kwargs.get("tenant_id") or "", " ".join(sorted(scopes))
+        )
+
+        def request() -> Dict[str, Any]:
+            token = self.credential.get_token(*scopes, **kwargs)
+
+            return {"token": token.token, "expires_on": token.expires_on}
+
+        token: Dict[str, Any] = self.single_flight.do(key, request)
+
+        return AccessToken(token["token"], int(token["expires_on"]))
+
+    def close(self) -> None:
+        """Close the wrapped credential."""
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self) -> "SingleFlightCredential":
+        """Enter the runtime context of the wrapped credential."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the runtime context, closing the wrapped credential."""
+        self.close()
+
+
+class TimedCredential:
+    """Class implementing credential wrapper timing token requests.
+
+    Parameters
+    ----------
+    credential
+        Azure credential to be wrapped.
+
+    metrics
+        Metrics of the run to record durations to.
+
+    creds_type
+        Credentials type to label durations with.
+
+    """
+
+    def __init__(
+        self, credential: "TokenCredential", metrics: "Metrics", creds_type: str,
+    ) -> None:
+        """Initialize wrapper of the ``credential``."""
+        self.credential = credential
+        self.metrics = metrics
+        self.creds_type = creds_type
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> "AccessToken":
+        """Request an access token for ``scopes``."""
+        with self.metrics.timer("credentials", type=self.creds_type):
+            return self.credential.get_token(*scopes, **kwargs)
+
+    def close(self) -> None:
+        """Close the wrapped credential."""
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self) -> "TimedCredential":
+        """Enter the runtime context of the wrapped credential."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the runtime context, closing the wrapped credential."""
+        self.close()
+
+
+class VaultCredentials(Mapping):
+    """Class implementing lazy mapping of Key Vaults to Azure credentials.
+
+    Credentials are created on first access to the vault, so commands not
+    talking to Key Vaults never pay for importing and setting up
+    ``azure.identity``. Credentials are shared by all vaults using the same
+    identity, i.e. credentials type and client ID, so that each identity gets
+    its tokens once.
+
+    Tokens might be requested ahead of the first access with :meth:`prefetch`.
+
+    Parameters
+    ----------
+    identities
+        Pairs of credentials type and client ID, keyed by short name of the vault.
+
+    token_cache
+        (optional) Cache to wrap all credentials with.
+
+    refresh_margin
+        Seconds before expiry when the cached token is no longer used.
+
+    metrics
+        (optional) Metrics of the run to record durations of token requests to.
+
+    single_flight
+        (optional) Coordinator to coalesce token requests across processes with.
+
+    """
+
+    def __init__(
+        self,
+        identities: Dict[str, Tuple[str, Optional[str]]],
+        token_cache: TokenCache = None,
+        refresh_margin: int = TOKEN_CACHE_REFRESH_MARGIN,
+        metrics: "Metrics" = None,
+        single_flight: SingleFlight = None,
+    ) -> None:
+        """Initialize mapping for vaults from ``identities``."""
+        self.identities = identities
+        self.token_cache = token_cache
+        self.refresh_margin = refresh_margin
+        self.metrics = metrics
+        self.single_flight = single_flight
+
+        self._creds: Dict[str, "TokenCredential"] = {}
+        self._prefetches: Dict[str, "Future[Any]"] = {}
+        self._prefetch_timeout: Optional[float] = None
+        self._lock = Lock()
+
+    def _identity(self, vault: str) -> str:
+        """Get identity of the credentials for the vault."""
+        creds_type, creds_client_id = self.identities[vault]
+
+        return "{}|{}".format(creds_type, creds_client_id or "")
+
+    def __getitem__(self, vault: str) -> "TokenCredential":
+        """Get credentials for the vault, creating them on first access.
+
+        Waits for the tokens of the identity being prefetched, up to the timeout
+        of :meth:`prefetch`, so that the first request to the vault is not made
+        with a token requested twice.
+        """
+        creds = self._get(vault)
+
+        prefetch: Optional["Future[Any]"] = self._prefetches.get(self._identity(vault))
+        if prefetch is not None:
+            # failures are left for the request to the vault to report, and
+            # tokens taking too long are requested as usual
+            try:
+                prefetch.exception(timeout=self._prefetch_timeout)
+            except FutureTimeout:
+                pass
+
+        return creds
+
+    def _get(self, vault: str) -> "TokenCredential":
+        """Get credentials for the vault, creating them if not created yet."""
+        creds_type, creds_client_id = self.identities[vault]
+
+        identity = self._identity(vault)
+
+        with self._lock:
+            if identity not in self._creds:
+                creds = self._create(creds_type, creds_client_id)
+
+                # coalesced behind the cache, so that processes served from
+                # the cache do not wait for each other
+                if self.single_flight is not None:
+                    creds = SingleFlightCredential(creds, self.single_flight, identity)
+
+                if self.token_cache is not None:
+                    creds = CachedCredential(
+                        creds, self.token_cache, identity, self.refresh_margin
+                    )
+
+                if self.metrics is not None:
+                    creds = TimedCredential(creds, self.metrics, creds_type)
+
+                self._creds[identity] = creds
+
+            return self._creds[identity]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over short names of the vaults."""
+        return iter(self.identities)
+
+    def __len__(self) -> int:
+        """Get number of the vaults."""
+        return len(self.identities)
+
+    def prefetch(self, scopes: Mapping[str, str], timeout: float = None) -> None:
+        """Request tokens of all distinct identities in parallel, in background.
+
+        Parameters
+        ----------
+        scopes
+            Scopes of tokens, keyed by short name of the vault to get the token for.
+
+        timeout
+            (optional) Seconds to wait for the prefetch on first access to the
+            credentials, before requesting the token as usual.
+
+        """
+        self._prefetch_timeout = timeout
+
+        # a vault to get credentials of each identity for, and scopes of its tokens
+        identities: Dict[str, Tuple[str, List[str]]] = {}
+
+        for vault, scope in scopes.items():
+            _, identity_scopes = identities.setdefault(
+                self._identity(vault), (vault, [])
+            )
+
+            if scope not in identity_scopes:
+                identity_scopes.append(scope)
+
+        if not identities:
+            return
+
+        def get_tokens(vault: str, identity_scopes: List[str]) -> None:
+            creds = self._get(vault)
+
+            for scope in identity_scopes:
+                creds.get_token(scope)
+
+        executor = ThreadPoolExecutor(
+            max_workers=len(identities), thread_name_prefix="azkv-prefetch"
+        )
+
+        for identity, (vault, identity_scopes) in identities.items():
+            self._prefetches[identity] = executor.submit(
+                get_tokens, vault, identity_scopes
+            )
+
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _create(creds_type: str, creds_client_id: Optional[str]) -> "TokenCredential":
+        """Create credentials of the type."""
+        from azure.identity import EnvironmentCredential, ManagedIdentityCredential
+
+        if creds_type == "SystemManagedIdentity":
+            return ManagedIdentityCredential()
+
+        if creds_type == "UserManagedIdentity":
+            return ManagedIdentityCredential(client_id=creds_client_id)
+
+        return EnvironmentCredential()
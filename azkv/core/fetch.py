@@ -0,0 +1,972 @@
+# -*- coding: utf-8 -*-
+"""Secret lookups module."""
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from fnmatch import fnmatchcase
+from queue import Full, Queue
+from threading import Event
+from time import monotonic, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    KeysView,
+    List,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+    TypeVar,
+)
+
+from cement import App
+
+from .exc import AzKVError
+from .singleflight import SingleFlight, dump_secret, load_secret
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import KeyVaultSecret, SecretClient, SecretProperties
+
+    from .health import VaultHealth
+    from .index import SecretIndex
+    from .metrics import Metrics
+
+# seconds to wait for the consumer to take a page before checking for cancellation
+QUEUE_POLL_INTERVAL = 0.1
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_bounded(
+    fn: Callable[[T], R], items: Iterable[T], concurrency: int,
+) -> Iterator[Tuple[T, R]]:
+    """Apply the function to items in a thread pool, as results are consumed.
+
+    Unlike :meth:`concurrent.futures.Executor.map`, items are taken lazily and at
+    most ``2 * concurrency`` of them are in flight, so memory use does not
+    depend on the number of items.
+
+    Parameters
+    ----------
+    fn
+        Function to apply.
+
+    items
+        Items to apply the function to.
+
+    concurrency
+        Number of threads to apply the function in.
+
+    Returns
+    -------
+    Iterator[Tuple[T, R]]
+        Pairs of the item and the result of the function, in order of completion.
+
+    """
+    pending: Dict[Future, T] = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for item in items:
+                pending[executor.submit(fn, item)] = item
+
+                while len(pending) >= 2 * concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        yield pending.pop(future), future.result()
+
+            for future in as_completed(list(pending)):
+                yield pending.pop(future), future.result()
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class SecretFetcher:
+    """Class implementing lookups of secrets across Azure Key Vaults.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    """
+
+    def __init__(self, app: App) -> None:
+        """Initialize fetcher for the app."""
+        self.app = app
+
+    def get_vaults(self, names: Optional[List[str]] = None) -> List[str]:
+        """Get the list of applicable Azure Key Vaults.
+
+        Parameters
+        ----------
+        names
+            (optional) Short names of the Key Vaults to scope the list to. If
+            unspecified, returns the full list of configured Azure Key Vaults.
+
+        Returns
+        -------
+        List[str]
+            List of Azure Key Vault names scoped through ``names`` or config.
+
+        """
+        # get key vaults from config
+        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
+        # get key vault short names from config
+        keyvault_names: KeysView[str] = keyvaults.keys()
+
+        vault_list: List[str] = []
+
+        # get list of scoped vault names, if specified
+        if names is not None:
+            # verify that provided vault names exist in config
+            for vault in names:
+                if vault not in keyvault_names:
+                    self.app.log.error("Unknown Key Vault '{}'".format(vault))
+                else:
+                    vault_list.append(vault)
+
+        # otherwise, use all available vault names
+        else:
+            vault_list = list(keyvault_names)
+
+        return vault_list
+
+    def get_indexed_vaults(self, vault_list: List[str], name: str) -> List[str]:
+        """Get the Azure Key Vaults holding a secret according to the local index.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        name
+            The name of the secret.
+
+        Returns
+        -------
+        List[str]
+            Vaults from ``vault_list`` known to hold the secret, in the same order,
+            or empty list if the index is disabled or unavailable.
+
+        """
+        secret_index: Optional["SecretIndex"] = getattr(self.app, "secret_index", None)
+
+        if secret_index is None:
+            return []
+
+        try:
+            indexed = {secret.vault for secret in secret_index.search(name)}
+        except AzKVError as e:
+            self.app.log.warning(str(e))
+
+            return []
+
+        return [vault for vault in vault_list if vault in indexed]
+
+    def get_secret(
+        self, vault: str, name: str, version: str = None,
+    ) -> Optional["KeyVaultSecret"]:
+        """Get a secret from the specific Azure Key Vault.
+
+        Fetches secret from ``vault`` with the specified ``name`` and ``version``.
+
+        Parameters
+        ----------
+        vault
+            Short name of the Key Vault form config file.
+
+        name
+            The name of the secret.
+
+        version
+            (optional) Version of the secret to get. If unspecified, gets
+            the latest version.
+
+        Returns
+        -------
+        :obj:`~typing.Optional` [:obj:`~azure.keyvault.secrets.KeyVaultSecret`]
+            If found, all of a secret’s properties, and its value. Otherwise returns
+            ``None``.
+
+        """
+        from azure.core.exceptions import (
+            ClientAuthenticationError,
+            HttpResponseError,
+            ResourceNotFoundError,
+            ServiceRequestError,
+        )
+
+        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
+
+        vault_health: Optional["VaultHealth"] = getattr(self.app, "vault_health", None)
+        metrics: Optional["Metrics"] = getattr(self.app, "metrics", None)
+        single_flight: Optional[SingleFlight] = getattr(self.app, "single_flight", None)
+
+        self.app.log.info(
+            "Querying vault '{}' through '{}'".format(vault, keyvaults[vault]["url"])
+        )
+
+        # whether the vault has responded, failed or neither (e.g. on auth errors)
+        responded: bool = False
+        failed: bool = False
+
+        # outcome of the request counted in metrics
+        outcome: str = "error"
+
+        started = monotonic()
+        try:
+            secret_client: "SecretClient" = self.app.vault_clients.get(vault)
+
+            if single_flight is not None:
+                # concurrent invocations fetching the same secret share the result
+                secret = load_secret(
+                    single_flight.do(
+                        "secret|{}|{}|{}".format(
+                            keyvaults[vault]["url"], name, version or ""
+                        ),
+                        lambda: dump_secret(secret_client.get_secret(name, version)),
+                    )
+                )
+            else:
+                secret = secret_client.get_secret(name, version)
+
+            responded = True
+            outcome = "found"
+
+            return secret
+        except ResourceNotFoundError:
+            responded = True
+            outcome = "not-found"
+
+            self.app.log.info("Secret '{}' not found in vault '{}'".format(name, vault))
+        except ClientAuthenticationError as e:
+            self.app.log.error("ClientAuthenticationError: {}".format(str(e)))
+        except HttpResponseError as e:
+            # server errors count against the vault, client errors do not
+            if e.status_code is None or e.status_code >= 500:
+                failed = True
+            else:
+                responded = True
+
+            if e.status_code == 429:
+                self.app.log.error(
+                    "Vault '{}' is throttling requests, retries exhausted".format(
+                        vault
+                    )
+                )
+            else:
+                self.app.log.error("HttpResponseError: {}".format(str(e)))
+        except ServiceRequestError as e:
+            failed = True
+
+            self.app.log.error("ServiceRequestError: {}".format(str(e)))
+        finally:
+            elapsed = monotonic() - started
+
+            if metrics is not None:
+                metrics.observe("fetch", elapsed, vault=vault, secret=name)
+                metrics.count("requests", vault=vault, outcome=outcome)
+
+            if vault_health is not None:
+                if responded:
+                    vault_health.record_success(vault, elapsed)
+                elif failed and vault_health.record_failure(vault):
+                    self.app.log.warning(
+                        "Opened circuit breaker of vault '{}'".format(vault)
+                    )
+
+        return None
+
+    def set_secret(self, vault: str, name: str, value: str, **kwargs: Any) -> bool:
+        """Set a secret in the specific Azure Key Vault, creating a new version.
+
+        Parameters
+        ----------
+        vault
+            Short name of the Key Vault from config file.
+
+        name
+            The name of the secret.
+
+        value
+            The value of the secret.
+
+        kwargs
+            Properties of the secret, as accepted by ``SecretClient.set_secret``.
+
+        Returns
+        -------
+        bool
+            Whether the secret has been set.
+
+        """
+        self.app.log.info("Setting secret '{}' in vault '{}'".format(name, vault))
+
+        return self._write(
+            vault, lambda client: client.set_secret(name, value, **kwargs)
+        )
+
+    def update_secret_properties(self, vault: str, name: str, **kwargs: Any) -> bool:
+        """Update properties of the latest version of a secret in Azure Key Vault.
+
+        Parameters
+        ----------
+        vault
+            Short name of the Key Vault from config file.
+
+        name
+            The name of the secret.
+
+        kwargs
+            Properties of the secret, as accepted by
+            ``SecretClient.update_secret_properties``.
+
+        Returns
+        -------
+        bool
+            Whether the properties have been updated.
+
+        """
+        self.app.log.info(
+            "Updating properties of secret '{}' in vault '{}'".format(name, vault)
+        )
+
+        return self._write(
+            vault, lambda client: client.update_secret_properties(name, **kwargs)
+        )
+
+    def _write(self, vault: str, request: Callable[["SecretClient"], Any]) -> bool:
+        """Send the write request to Azure Key Vault, logging its errors."""
+        from azure.core.exceptions import (
+            ClientAuthenticationError,
+            HttpResponseError,
+            ServiceRequestError,
+        )
+
+        metrics: Optional["Metrics"] = getattr(self.app, "metrics", None)
+
+        outcome: str = "error"
+
+        try:
+            request(self.app.vault_clients.get(vault))
+
+            outcome = "written"
+
+            return True
+        except ClientAuthenticationError as e:
+            self.app.log.error("ClientAuthenticationError: {}".format(str(e)))
+        except HttpResponseError as e:
+            self.app.log.error("HttpResponseError: {}".format(str(e)))
+        except ServiceRequestError as e:
+            self.app.log.error("ServiceRequestError: {}".format(str(e)))
+        finally:
+            if metrics is not None:
+                metrics.count("requests", vault=vault, outcome=outcome)
+
+        return False
+
+    def order_vaults(self, vault_list: List[str]) -> List[str]:
+        """Order Azure Key Vaults by priority and health.
+
+        Skips vaults with open circuit breaker and orders the rest by
+        ``priority`` of the vault in config, and by rolling latency within
+        the same priority if ``health.prefer_latency`` config option is set.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        Returns
+        -------
+        List[str]
+            Ordered Key Vaults, or ``vault_list`` as is if health tracking
+            is disabled.
+
+        """
+        vault_health: Optional["VaultHealth"] = getattr(self.app, "vault_health", None)
+
+        if vault_health is None:
+            return vault_list
+
+        keyvaults: Dict[str, Any] = self.app.config.get("azkv", "keyvaults")
+        health_config: Dict[str, Any] = self.app.config.get("azkv", "health") or {}
+
+        ordered: List[str] = vault_health.order(
+            vault_list,
+            {vault: keyvaults[vault].get("priority", 0) or 0 for vault in vault_list},
+            bool(health_config.get("prefer_latency", False)),
+        )
+
+        skipped = [vault for vault in vault_list if vault not in ordered]
+        if skipped:
+            self.app.log.warning(
+                "Skipping vaults with open circuit breaker: '{}'".format(
+                    ", ".join(skipped)
+                )
+            )
+
+        return ordered
+
+    def get_secrets(
+        self, vault_list: List[str], name: str, version: str = None,
+    ) -> List[Tuple[str, Optional["KeyVaultSecret"]]]:
+        """Get a secret from several Azure Key Vaults concurrently.
+
+        Queries every vault from ``vault_list`` in a thread pool bounded by
+        the ``concurrency`` config option, so the overall latency is defined
+        by the slowest vault rather than the sum of all of them.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        name
+            The name of the secret.
+
+        version
+            (optional) Version of the secret to get. If unspecified, gets
+            the latest version.
+
+        Returns
+        -------
+        List[Tuple[str, Optional[KeyVaultSecret]]]
+            Pairs of vault name and the secret found in it (or ``None``), in the
+            same order as ``vault_list``.
+
+        """
+        if len(vault_list) == 0:
+            return []
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        with ThreadPoolExecutor(
+            max_workers=min(concurrency, len(vault_list))
+        ) as executor:
+            futures = [
+                executor.submit(self.get_secret, vault, name, version)
+                for vault in vault_list
+            ]
+
+            return [
+                (vault, future.result()) for vault, future in zip(vault_list, futures)
+            ]
+
+    def iter_secrets(
+        self, vault_list: List[str], name: str, version: str = None,
+    ) -> Iterator[Tuple[str, Optional["KeyVaultSecret"]]]:
+        """Get a secret from several Azure Key Vaults concurrently, as they respond.
+
+        Same as :meth:`get_secrets`, but yields the result of every vault as
+        soon as it arrives, so that callers could output it without waiting
+        for the slowest vault.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        name
+            The name of the secret.
+
+        version
+            (optional) Version of the secret to get. If unspecified, gets
+            the latest version.
+
+        Returns
+        -------
+        Iterator[Tuple[str, Optional[KeyVaultSecret]]]
+            Pairs of vault name and the secret found in it (or ``None``), in
+            order of arrival.
+
+        """
+        if len(vault_list) == 0:
+            return
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        with ThreadPoolExecutor(
+            max_workers=min(concurrency, len(vault_list))
+        ) as executor:
+            futures: Dict[Future, str] = {
+                executor.submit(self.get_secret, vault, name, version): vault
+                for vault in vault_list
+            }
+
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def get_secret_hedged(
+        self, vault_list: List[str], name: str, delay: float, version: str = None,
+    ) -> Tuple[Optional[str], Optional["KeyVaultSecret"]]:
+        """Get a secret from the first Azure Key Vault holding it, racing them.
+
+        Queries vaults from ``vault_list`` in their order, starting the next
+        vault either after ``delay`` seconds without a response from the vaults
+        already queried, or right away when one of them fails to return the secret.
+        The secret from the vault listed first wins, so a secret received from
+        another vault is returned only once requests to all vaults listed before
+        it have failed to return it. Requests that have not started yet are
+        cancelled. Each vault is queried in its own thread, regardless of the
+        ``concurrency`` config option.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file, in priority order.
+
+        name
+            The name of the secret.
+
+        delay
+            Seconds to wait for a response before querying the next vault.
+
+        version
+            (optional) Version of the secret to get. If unspecified, gets
+            the latest version.
+
+        Returns
+        -------
+        Tuple[Optional[str], Optional[KeyVaultSecret]]
+            Name of the vault and the secret found in it, or ``(None, None)``
+            if none of the vaults returned the secret.
+
+        """
+        if len(vault_list) == 0:
+            return None, None
+
+        # a worker per vault rather than ``concurrency``, so that a hedged request
+        # never waits in the queue behind the slow one it races
+        executor = ThreadPoolExecutor(max_workers=len(vault_list))
+
+        vault_index: Dict[Future, int] = {}
+        pending: Set[Future] = set()
+        next_index: int = 0
+
+        # secrets received, by index of their vault
+        hits: Dict[int, "KeyVaultSecret"] = {}
+
+        def query_next_vault() -> None:
+            nonlocal next_index
+
+            vault = vault_list[next_index]
+
+            future = executor.submit(self.get_secret, vault, name, version)
+
+            vault_index[future] = next_index
+            pending.add(future)
+
+            next_index += 1
+
+        try:
+            while pending or next_index < len(vault_list):
+                if not pending:
+                    query_next_vault()
+
+                done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+
+                for future in done:
+                    secret = future.result()
+                    if secret is not None:
+                        hits[vault_index[future]] = secret
+
+                if hits:
+                    index = min(hits)
+
+                    # the vaults listed before it have failed, if none is pending
+                    if all(vault_index[future] > index for future in pending):
+                        return vault_list[index], hits[index]
+
+                    continue
+
+                if not done:
+                    if next_index < len(vault_list):
+                        self.app.log.info(
+                            "No response within {}s, hedging with vault '{}'".format(
+                                delay, vault_list[next_index]
+                            )
+                        )
+                        query_next_vault()
+
+                    continue
+
+                if next_index < len(vault_list):
+                    query_next_vault()
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+            executor.shutdown(wait=False)
+
+        return None, None
+
+    def get_first_secret(
+        self,
+        vault_list: List[str],
+        name: str,
+        hedge_delay: float = None,
+        version: str = None,
+    ) -> Tuple[Optional[str], Optional["KeyVaultSecret"]]:
+        """Get a secret from the first Azure Key Vault holding it.
+
+        Iterates through ``vault_list`` until first match is found, or races
+        the vaults with :meth:`get_secret_hedged` if ``hedge_delay`` is set.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file, in priority order.
+
+        name
+            The name of the secret.
+
+        hedge_delay
+            (optional) Seconds to wait for a response before querying the next
+            vault in parallel.
+
+        version
+            (optional) Version of the secret to get. If unspecified, gets
+            the latest version.
+
+        Returns
+        -------
+        Tuple[Optional[str], Optional[KeyVaultSecret]]
+            Name of the vault and the secret found in it, or ``(None, None)``
+            if none of the vaults returned the secret.
+
+        """
+        if hedge_delay is not None:
+            return self.get_secret_hedged(vault_list, name, hedge_delay, version)
+
+        for vault in vault_list:
+            secret = self.get_secret(vault, name, version)
+
+            if secret:
+                return vault, secret
+
+        return None, None
+
+    def list_secrets(
+        self,
+        vault_list: List[str],
+        prefix: str = None,
+        pattern: str = None,
+        tags: Dict[str, Optional[str]] = None,
+    ) -> Iterator[Tuple[str, List["SecretProperties"]]]:
+        """List properties of secrets across Azure Key Vaults page by page.
+
+        Pages through secrets of every vault from ``vault_list`` in a thread
+        pool bounded by the ``concurrency`` config option, and yields the
+        matching secrets of each page as soon as it arrives. Pages are handed
+        over through a bounded queue, so memory use does not depend on the
+        number of secrets in the vaults.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        prefix
+            (optional) Prefix of names of the secrets to list.
+
+        pattern
+            (optional) Glob pattern of names of the secrets to list.
+
+        tags
+            (optional) Tags of the secrets to list. Tags with ``None`` value
+            only need to be present.
+
+        Returns
+        -------
+        Iterator[Tuple[str, List[SecretProperties]]]
+            Pairs of vault name and matching secrets from a page of its listing,
+            in order of arrival.
+
+        """
+        def matches(properties: "SecretProperties") -> bool:
+            name: str = properties.name or ""
+
+            if prefix and not name.startswith(prefix):
+                return False
+
+            if pattern and not fnmatchcase(name, pattern):
+                return False
+
+            for key, value in (tags or {}).items():
+                secret_tags: Dict[str, str] = properties.tags or {}
+
+                if key not in secret_tags:
+                    return False
+                if value is not None and secret_tags[key] != value:
+                    return False
+
+            return True
+
+        def list_vault(vault: str) -> Iterator[List["SecretProperties"]]:
+            self.app.log.info("Listing secrets in vault '{}'".format(vault))
+
+            secret_client: "SecretClient" = self.app.vault_clients.get(vault)
+
+            for page in secret_client.list_properties_of_secrets().by_page():
+                yield [properties for properties in page if matches(properties)]
+
+        return self._list_pages(vault_list, list_vault)
+
+    def list_secret_versions(
+        self, vault_list: List[str], name: str,
+    ) -> Iterator[Tuple[str, List["SecretProperties"]]]:
+        """List properties of versions of a secret across Azure Key Vaults.
+
+        Pages through versions of the secret in every vault from ``vault_list``
+        concurrently, the same way as :meth:`list_secrets`.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        name
+            The name of the secret.
+
+        Returns
+        -------
+        Iterator[Tuple[str, List[SecretProperties]]]
+            Pairs of vault name and versions from a page of its listing, in order
+            of arrival.
+
+        """
+
+        def list_vault(vault: str) -> Iterator[List["SecretProperties"]]:
+            self.app.log.info(
+                "Listing versions of secret '{}' in vault '{}'".format(name, vault)
+            )
+
+            secret_client: "SecretClient" = self.app.vault_clients.get(vault)
+
+            for page in secret_client.list_properties_of_secret_versions(
+                name
+            ).by_page():
+                yield list(page)
+
+        return self._list_pages(vault_list, list_vault)
+
+    def _list_pages(
+        self,
+        vault_list: List[str],
+        list_vault: Callable[[str], Iterator[List["SecretProperties"]]],
+    ) -> Iterator[Tuple[str, List["SecretProperties"]]]:
+        """Page through listings of Azure Key Vaults concurrently.
+
+        Runs ``list_vault`` for every vault from ``vault_list`` in a thread pool
+        bounded by the ``concurrency`` config option, and yields its non-empty
+        pages as soon as they arrive. Pages are handed over through a bounded
+        queue, and listings are cancelled when the consumer stops iterating.
+        """
+        from azure.core.exceptions import (
+            ClientAuthenticationError,
+            HttpResponseError,
+            ResourceNotFoundError,
+            ServiceRequestError,
+        )
+
+        if len(vault_list) == 0:
+            return
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        # pages of all vaults, each vault ending with ``None``
+        pages: "Queue[Optional[Tuple[str, List[SecretProperties]]]]" = Queue(
+            maxsize=2 * concurrency
+        )
+        cancelled = Event()
+
+        def put(item: Optional[Tuple[str, List["SecretProperties"]]]) -> None:
+            while not cancelled.is_set():
+                try:
+                    pages.put(item, timeout=QUEUE_POLL_INTERVAL)
+
+                    return
+                except Full:
+                    continue
+
+        def consume(vault: str) -> None:
+            try:
+                for rows in list_vault(vault):
+                    if cancelled.is_set():
+                        return
+
+                    if rows:
+                        put((vault, rows))
+
+            except ClientAuthenticationError as e:
+                self.app.log.error("ClientAuthenticationError: {}".format(str(e)))
+            except ResourceNotFoundError:
+                self.app.log.info("Nothing to list in vault '{}'".format(vault))
+            except HttpResponseError as e:
+                self.app.log.error("HttpResponseError: {}".format(str(e)))
+            except ServiceRequestError as e:
+                self.app.log.error("ServiceRequestError: {}".format(str(e)))
+            finally:
+                put(None)
+
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(vault_list)))
+
+        futures: List[Future] = [
+            executor.submit(consume, vault) for vault in vault_list
+        ]
+
+        try:
+            remaining: int = len(vault_list)
+
+            while remaining > 0:
+                item = pages.get()
+
+                if item is None:
+                    remaining -= 1
+                else:
+                    yield item
+
+            # re-raise unexpected errors of the listing threads
+            for future in futures:
+                future.result()
+
+        finally:
+            cancelled.set()
+
+            for future in futures:
+                future.cancel()
+
+            executor.shutdown(wait=False)
+
+    def export_secrets(
+        self, vault_list: List[str],
+    ) -> Iterator[Tuple[str, str, Optional["KeyVaultSecret"]]]:
+        """Get latest versions of all secrets across Azure Key Vaults.
+
+        Pages through secrets of every vault from ``vault_list`` with
+        :meth:`list_secrets`, and fetches values of the enabled ones with
+        :func:`map_bounded` as pages arrive, so memory use is bounded by the
+        secrets in flight rather than the number of secrets in the vaults.
+        Disabled secrets are skipped, as their values could not be fetched.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        Returns
+        -------
+        Iterator[Tuple[str, str, Optional[KeyVaultSecret]]]
+            Triples of vault name, name of the secret and the secret itself
+            (or ``None`` if it could not be fetched), in order of arrival.
+
+        """
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        def enabled_secrets() -> Iterator[Tuple[str, str]]:
+            for vault, page in self.list_secrets(vault_list):
+                for properties in page:
+                    if properties.enabled is False:
+                        self.app.log.warning(
+                            "Skipping disabled secret '{}' in vault '{}'".format(
+                                properties.name, vault
+                            )
+                        )
+                    else:
+                        yield vault, properties.name
+
+        for (vault, name), secret in map_bounded(
+            lambda item: self.get_secret(*item), enabled_secrets(), concurrency
+        ):
+            yield vault, name, secret
+
+    def refresh_index(
+        self, index: "SecretIndex", vault_list: List[str], max_age: float = None,
+    ) -> None:
+        """Refresh the local index of secrets from Azure Key Vaults.
+
+        Lists properties of secrets in every vault from ``vault_list`` refreshed
+        more than ``max_age`` seconds ago, in a thread pool bounded by the
+        ``concurrency`` config option. Errors of the index are logged, so that
+        the vaults are queried directly rather than through it.
+
+        Parameters
+        ----------
+        index
+            Local index of secrets.
+
+        vault_list
+            Short names of the Key Vaults from config file.
+
+        max_age
+            (optional) Seconds since the last refresh of a vault to keep using
+            the index for. If unspecified, refreshes all vaults.
+
+        """
+        from azure.core.exceptions import (
+            ClientAuthenticationError,
+            HttpResponseError,
+            ServiceRequestError,
+        )
+
+        now = time()
+
+        try:
+            stale_vaults: List[str] = [
+                vault
+                for vault in vault_list
+                if max_age is None or now - (index.refreshed_on(vault) or 0) > max_age
+            ]
+        except AzKVError as e:
+            self.app.log.warning(str(e))
+
+            return
+
+        if len(stale_vaults) == 0:
+            return
+
+        def refresh_vault(vault: str) -> None:
+            self.app.log.info("Refreshing index of vault '{}'".format(vault))
+            try:
+                secret_client: "SecretClient" = self.app.vault_clients.get(vault)
+
+                changes = index.update(
+                    vault, secret_client.list_properties_of_secrets()
+                )
+
+                self.app.log.info(
+                    "Index of vault '{}' refreshed with {} change(s)".format(
+                        vault, changes
+                    )
+                )
+            except ClientAuthenticationError as e:
+                self.app.log.error("ClientAuthenticationError: {}".format(str(e)))
+            except HttpResponseError as e:
+                self.app.log.error("HttpResponseError: {}".format(str(e)))
+            except ServiceRequestError as e:
+                self.app.log.error("ServiceRequestError: {}".format(str(e)))
+            except AzKVError as e:
+                self.app.log.warning(str(e))
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        with ThreadPoolExecutor(
+            max_workers=min(concurrency, len(stale_vaults))
+        ) as executor:
+            list(executor.map(refresh_vault, stale_vaults))
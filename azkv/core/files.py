@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""File operations module."""
+import os
+from contextlib import contextmanager
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Any, BinaryIO, Iterator
+
+# size of chunks to read files in while hashing
+CHUNK_SIZE = 1 << 16
+
+
+def file_digest(path: Path) -> Any:
+    """Calculate SHA-256 digest of the file, reading it in chunks.
+
+    Parameters
+    ----------
+    path
+        Path to the file.
+
+    Returns
+    -------
+    :obj:`hashlib.sha256`
+        Hash object of the file content.
+
+    """
+    digest = sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest
+
+
+@contextmanager
+def open_atomic(path: Path, mode: int = 0o600) -> Iterator[BinaryIO]:
+    """Open a temporary file to replace the file with atomically.
+
+    The temporary file is created next to ``path`` exclusively with ``mode``
+    (``0600`` by default), and is flushed to disk and renamed over ``path``
+    when the context exits, so readers see either old or new content in full.
+    If the context exits with an exception, the temporary file is removed and
+    ``path`` is left intact.
+
+    Parameters
+    ----------
+    path
+        Path to the file.
+
+    mode
+        (optional) Permissions of the file.
+
+    Returns
+    -------
+    Iterator[BinaryIO]
+        Temporary file opened for writing in binary mode.
+
+    """
+    fd, path_tmp = mkstemp(dir=str(path.parent), prefix=".{}.".format(path.name))
+    try:
+        os.fchmod(fd, mode)
+
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(path_tmp, str(path))
+    finally:
+        if os.path.exists(path_tmp):
+            os.unlink(path_tmp)
+
+
+def write_atomic(path: Path, data: bytes, mode: int = 0o600) -> None:
+    """Replace the file with ``data`` atomically.
+
+    Writes ``data`` to a temporary file next to ``path``, created exclusively
+    with ``mode`` (``0600`` by default), flushes it to disk and renames it over
+    ``path``, so readers see either old or new content in full.
+
+    Parameters
+    ----------
+    path
+        Path to the file.
+
+    data
+        New content of the file.
+
+    mode
+        (optional) Permissions of the file.
+
+    """
+    with open_atomic(path, mode) as f:
+        f.write(data)
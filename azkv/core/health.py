@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Key Vault health tracking module."""
+import json
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Any, Dict, List, Mapping, Optional
+
+from .files import write_atomic
+
+HEALTH_PATH = "~/.azkv/health.json"
+HEALTH_FAILURE_THRESHOLD = 3
+HEALTH_COOLDOWN = 300
+
+# weight of the latest request in the rolling latency of a vault
+LATENCY_WEIGHT = 0.3
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half-open"
+
+
+class VaultHealth:
+    """Class implementing health tracking and circuit breakers of Key Vaults.
+
+    Keeps rolling latency and the count of consecutive failures of each vault.
+    Once a vault fails ``failure_threshold`` times in a row, its breaker opens
+    and the vault is skipped for ``cooldown`` seconds. Then the breaker is
+    half-open, letting requests through to probe the vault, and the next one
+    either closes the breaker or opens it again.
+
+    Health records are loaded from the JSON file at ``path`` and saved back to
+    it with :meth:`save`, so that they persist between runs of the app.
+
+    Parameters
+    ----------
+    path
+        Path to the file with health records.
+
+    failure_threshold
+        Number of consecutive failures to open the breaker of a vault after.
+
+    cooldown
+        Seconds to skip a vault with open breaker for.
+
+    """
+
+    def __init__(
+        self,
+        path: str,
+        failure_threshold: int = HEALTH_FAILURE_THRESHOLD,
+        cooldown: float = HEALTH_COOLDOWN,
+    ) -> None:
+        """Initialize health records stored at ``path``."""
+        self.path = Path(path).expanduser()
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+
+        self._lock = Lock()
+        self._records: Dict[str, Dict[str, Any]] = self._load()
+        self._changed = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Read health records, ignoring missing or unreadable file."""
+        try:
+            records = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+        return records if isinstance(records, dict) else {}
+
+    def save(self) -> None:
+        """Save health records, if changed, ignoring errors."""
+        with self._lock:
+            if not self._changed:
+                return
+
+            data = json.dumps(self._records).encode()
+
+            self._changed = False
+
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+            write_atomic(self.path, data)
+        except OSError:
+            pass
+
+    def _record(self, vault: str) -> Dict[str, Any]:
+        """Get health record of the vault, creating it if necessary."""
+        return self._records.setdefault(
+            vault,
+            {"state": STATE_CLOSED, "failures": 0, "latency": None, "opened_on": 0},
+        )
+
+    def state(self, vault: str) -> str:
+        """Get the breaker state of the vault."""
+        with self._lock:
+            record = self._record(vault)
+
+            if record["state"] == STATE_OPEN and (
+                time() - record["opened_on"] >= self.cooldown
+            ):
+                record["state"] = STATE_HALF_OPEN
+
+            return record["state"]
+
+    def latency(self, vault: str) -> Optional[float]:
+        """Get rolling latency of the vault in seconds, or ``None`` if unknown."""
+        with self._lock:
+            return self._record(vault)["latency"]
+
+    def record_success(self, vault: str, latency: float) -> None:
+        """Record a request to the vault answered in ``latency`` seconds."""
+        with self._lock:
+            record = self._record(vault)
+
+            if record["latency"] is None:
+                record["latency"] = latency
+            else:
+                record["latency"] += LATENCY_WEIGHT * (latency - record["latency"])
+
+            record["failures"] = 0
+            record["state"] = STATE_CLOSED
+
+            self._changed = True
+
+    def record_failure(self, vault: str) -> bool:
+        """Record a failed request to the vault.
+
+        Returns ``True`` if the breaker of the vault has been opened.
+        """
+        with self._lock:
+            record = self._record(vault)
+
+            record["failures"] += 1
+
+            opened = record["state"] == STATE_HALF_OPEN or (
+                record["state"] == STATE_CLOSED
+                and record["failures"] >= self.failure_threshold
+            )
+
+            if opened:
+                record["state"] = STATE_OPEN
+                record["opened_on"] = time()
+
+            self._changed = True
+
+            return opened
+
+    def order(
+        self,
+        vault_list: List[str],
+        priorities: Mapping[str, int] = None,
+        prefer_latency: bool = False,
+    ) -> List[str]:
+        """Order vaults by priority, skipping vaults with open breaker.
+
+        Parameters
+        ----------
+        vault_list
+            Short names of the Key Vaults in config order.
+
+        priorities
+            (optional) Priority tier of each vault, lower goes first.
+            Vaults without priority are in tier ``0``.
+
+        prefer_latency
+            (optional) Order vaults within each priority tier by rolling
+            latency, rather than by config order.
+
+        Returns
+        -------
+        List[str]
+            Vaults without open breaker, or all of them if every breaker is open.
+
+        """
+        priorities = priorities or {}
+
+        available = [vault for vault in vault_list if self.state(vault) != STATE_OPEN]
+
+        # keep trying all vaults rather than none of them
+        if len(available) == 0:
+            available = list(vault_list)
+
+        def sort_key(vault: str) -> Any:
+            latency = self.latency(vault) if prefer_latency else None
+
+            return (
+                priorities.get(vault, 0),
+                latency is None if prefer_latency else False,
+                latency or 0.0,
+                vault_list.index(vault),
+            )
+
+        return sorted(available, key=sort_key)
@@ -1,17 +1,40 @@
 # -*- coding: utf-8 -*-
 """Framework hooks module."""
-from typing import Any, Dict, Optional, Union
-
-from azure.identity import (
-    EnvironmentCredential,
-    ManagedIdentityCredential,
-)
+import os
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
 
 from cement import App
 
+from .clients import VaultClients
+from .credentials import (
+    TOKEN_CACHE_PATH,
+    TOKEN_CACHE_REFRESH_MARGIN,
+    TokenCache,
+    VaultCredentials,
+    vault_scope,
+)
+from .health import HEALTH_COOLDOWN, HEALTH_FAILURE_THRESHOLD, HEALTH_PATH, VaultHealth
+from .index import INDEX_PATH, SecretIndex
+from .metrics import Metrics
+from .singleflight import (
+    SINGLE_FLIGHT_PATH,
+    SINGLE_FLIGHT_TTL,
+    SINGLE_FLIGHT_WAIT,
+    SingleFlight,
+)
+from .throttle import VaultThrottle
 from .version import get_version
 
 
+def _extend(app: App, member_name: str, member_object: Any) -> None:
+    """Extend app with the member, replacing the existing one on reload."""
+    if hasattr(app, member_name):
+        setattr(app, member_name, member_object)
+    else:
+        app.extend(member_name, member_object)
+
+
 def log_app_version(app: App) -> None:
     """Log the version of the app.
 
@@ -23,10 +46,54 @@ def log_app_version(app: App) -> None:
     app.log.info("AzKV version {}".format(get_version()))  # noqa: G001
 
 
+def extend_metrics(app: App) -> None:
+    """Extend app with metrics of the run.
+
+    Durations of the phases of the run and counts of events are collected in
+    memory, and written out by :func:`write_metrics` when the app closes.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    _extend(app, "metrics", Metrics())
+
+
+def extend_single_flight(app: App) -> None:
+    """Extend app with coalescing of requests across processes, if enabled in config.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    single_flight: Optional[SingleFlight] = None
+
+    single_flight_config: Dict[str, Any] = app.config.get("azkv", "single_flight")
+    if single_flight_config and single_flight_config.get("enabled", False):
+        single_flight_path: str = single_flight_config.get("path") or SINGLE_FLIGHT_PATH
+
+        app.log.info(
+            "Coalescing requests across processes in '{}'".format(  # noqa: G001
+                single_flight_path
+            )
+        )
+
+        single_flight = SingleFlight(
+            path=single_flight_path,
+            ttl=single_flight_config.get("ttl", SINGLE_FLIGHT_TTL),
+            wait=single_flight_config.get("wait", SINGLE_FLIGHT_WAIT),
+        )
+
+    _extend(app, "single_flight", single_flight)
+
+
 def extend_vault_creds(app: App) -> None:
     """Extend app with azure credentials for each vault.
 
     Obtains Azure identity either from Environment Variables or Managed Identity.
+    Credentials are created lazily, when the vault is queried for the first time.
 
     Parameters
     ----------
@@ -35,6 +102,8 @@ def extend_vault_creds(app: App) -> None:
     """
     app.log.info("Extending app object with Azure Key Vault credentials")
 
+    started = monotonic()
+
     common_creds_config: Dict[str, str] = app.config.get("azkv", "credentials")
     if common_creds_config:
         common_type: Optional[str] = common_creds_config.get("type")
@@ -45,10 +114,9 @@ def extend_vault_creds(app: App) -> None:
 
     keyvaults: Dict[str, Any] = app.config.get("azkv", "keyvaults")
 
-    vault_creds: Dict[str, Union[EnvironmentCredential, ManagedIdentityCredential]] = {}
-
-    creds_from_env = EnvironmentCredential()
-    creds_from_mi = ManagedIdentityCredential()
+    # credentials type and client ID of each vault, credentials themselves are
+    # created on first access to the vault
+    vault_identities: Dict[str, Tuple[str, Optional[str]]] = {}
 
     for vault, config in keyvaults.items():
         creds_config = config.get("credentials", None)
@@ -67,14 +135,15 @@ def extend_vault_creds(app: App) -> None:
         )
 
         if creds_type == "EnvironmentVariables":
-            vault_creds[vault] = creds_from_env
+            vault_identities[vault] = (
+                "EnvironmentVariables",
+                os.environ.get("AZURE_CLIENT_ID"),
+            )
 
         elif creds_type == "SystemManagedIdentity":
-            vault_creds[vault] = creds_from_mi
+            vault_identities[vault] = ("SystemManagedIdentity", None)
 
         elif creds_type == "UserManagedIdentity":
-            vault_creds[vault] = ManagedIdentityCredential(client_id=creds_client_id)
-
             app.log.info("  client_id={}".format(creds_client_id))  # noqa: G001
 
             if creds_client_id is None:
@@ -82,6 +151,11 @@ def extend_vault_creds(app: App) -> None:
                     "  no 'client_id' defied, changed to credentials from SystemManagedIdentity"  # noqa: E501
                 )
 
+                vault_identities[vault] = ("SystemManagedIdentity", None)
+
+            else:
+                vault_identities[vault] = ("UserManagedIdentity", creds_client_id)
+
         else:
             # fmt: off
             app.log.warning(
@@ -89,6 +163,230 @@ def extend_vault_creds(app: App) -> None:
             )
             # fmt: on
 
-            vault_creds[vault] = creds_from_env
+            vault_identities[vault] = (
+                "EnvironmentVariables",
+                os.environ.get("AZURE_CLIENT_ID"),
+            )
+
+    token_cache: Optional[TokenCache] = None
+    token_cache_refresh_margin: int = TOKEN_CACHE_REFRESH_MARGIN
+
+    token_cache_config: Dict[str, Any] = app.config.get("azkv", "token_cache")
+    if token_cache_config and token_cache_config.get("enabled", False):
+        token_cache_path: str = token_cache_config.get("path") or TOKEN_CACHE_PATH
+
+        app.log.info(
+            "Caching access tokens in '{}'".format(token_cache_path)  # noqa: G001
+        )
+
+        token_cache = TokenCache(
+            path=token_cache_path, key_file=token_cache_config.get("key_file")
+        )
+        token_cache_refresh_margin = token_cache_config.get(
+            "refresh_margin", TOKEN_CACHE_REFRESH_MARGIN
+        )
+
+    vault_creds = VaultCredentials(
+        vault_identities,
+        token_cache=token_cache,
+        refresh_margin=token_cache_refresh_margin,
+        metrics=getattr(app, "metrics", None),
+        single_flight=getattr(app, "single_flight", None),
+    )
+
+    if common_creds_config and common_creds_config.get("prefetch", False):
+        app.log.info("Prefetching access tokens of all identities in background")
+
+        # tokens are requested while the rest of the app is set up, so that
+        # the first request to a vault does not wait for them
+        vault_creds.prefetch(
+            {vault: vault_scope(config["url"]) for vault, config in keyvaults.items()},
+            timeout=app.config.get("azkv", "timeout"),
+        )
+
+    _extend(app, "vault_creds", vault_creds)
+
+    if getattr(app, "metrics", None) is not None:
+        app.metrics.observe("setup_credentials", monotonic() - started)
+
+
+def extend_vault_clients(app: App) -> None:
+    """Extend app with the registry of Azure Key Vault clients.
+
+    Clients are created on first use and shared by all controllers, so that
+    connections to the vaults are reused across requests. Requests to each
+    vault are throttled according to its ``rate_limit`` config option.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    app.log.info("Extending app object with Azure Key Vault clients")
+
+    vault_throttle = VaultThrottle(app.config.get("azkv", "keyvaults"))
+
+    vault_clients = VaultClients(
+        keyvaults=app.config.get("azkv", "keyvaults"),
+        vault_creds=app.vault_creds,
+        timeout=app.config.get("azkv", "timeout"),
+        pool_size=app.config.get("azkv", "concurrency"),
+        throttle=vault_throttle,
+    )
+
+    _extend(app, "vault_throttle", vault_throttle)
+    _extend(app, "vault_clients", vault_clients)
+
+
+def extend_secret_index(app: App) -> None:
+    """Extend app with the local index of secrets, if enabled in config.
+
+    The index database is opened on first use, so that commands not using it
+    do not touch the file.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    secret_index: Optional[SecretIndex] = None
+
+    index_config: Dict[str, Any] = app.config.get("azkv", "index")
+    if index_config and index_config.get("enabled", False):
+        index_path: str = index_config.get("path") or INDEX_PATH
+
+        app.log.info("Indexing secrets in '{}'".format(index_path))  # noqa: G001
+
+        secret_index = SecretIndex(index_path)
+
+    _extend(app, "secret_index", secret_index)
+
+
+def extend_vault_health(app: App) -> None:
+    """Extend app with health records of Azure Key Vaults, if enabled in config.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    vault_health: Optional[VaultHealth] = None
+
+    health_config: Dict[str, Any] = app.config.get("azkv", "health")
+    if health_config and health_config.get("enabled", False):
+        health_path: str = health_config.get("path") or HEALTH_PATH
+
+        app.log.info(
+            "Tracking health of Key Vaults in '{}'".format(health_path)  # noqa: G001
+        )
+
+        vault_health = VaultHealth(
+            path=health_path,
+            failure_threshold=health_config.get(
+                "failure_threshold", HEALTH_FAILURE_THRESHOLD
+            ),
+            cooldown=health_config.get("cooldown", HEALTH_COOLDOWN),
+        )
+
+    _extend(app, "vault_health", vault_health)
+
+
+def save_vault_health(app: App) -> None:
+    """Save health records of Azure Key Vaults for the next runs of the app.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    if getattr(app, "vault_health", None) is not None:
+        app.vault_health.save()
+
+
+def log_throttled_requests(app: App) -> None:
+    """Log the number of requests throttled by each Azure Key Vault.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    if getattr(app, "vault_throttle", None) is None:
+        return
+
+    for vault, count in app.vault_throttle.throttled.items():
+        app.log.warning(
+            "Vault '{}' throttled {} request(s)".format(vault, count)  # noqa: G001
+        )
+
+
+def write_metrics(app: App, summary: bool = True) -> None:
+    """Write metrics of the run as JSON and as Prometheus textfile, if requested.
+
+    JSON summary is written to the file (or stderr) from ``--metrics-json``
+    argument, and the textfile for ``node_exporter`` to ``metrics.textfile``
+    config option. Errors are logged rather than raised, so that the outcome
+    of the run is not affected.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    summary
+        (optional) Write JSON summary too, rather than the textfile only,
+        e.g. to skip it while long-running commands are in progress.
+    """
+    metrics: Optional[Metrics] = getattr(app, "metrics", None)
+
+    if metrics is None:
+        return
+
+    if getattr(app, "vault_throttle", None) is not None:
+        for vault, count in app.vault_throttle.throttled.items():
+            metrics.set_count("throttled_requests", count, vault=vault)
+
+    metrics_json: Optional[str] = getattr(app.pargs, "metrics_json", None)
+
+    metrics_config: Dict[str, Any] = app.config.get("azkv", "metrics") or {}
+    textfile: Optional[str] = metrics_config.get("textfile")
+
+    try:
+        if summary and metrics_json:
+            metrics.write_json(metrics_json)
+
+        if textfile:
+            metrics.write_textfile(textfile)
+    except OSError as e:
+        app.log.error("Unable to write metrics: {}".format(str(e)))  # noqa: G001
+
+
+def close_vault_clients(app: App) -> None:
+    """Close Azure Key Vault clients and their connections.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    if hasattr(app, "vault_clients"):
+        app.vault_clients.close()
+
+
+def reload_vault_clients(app: App) -> None:
+    """Re-create Azure Key Vault credentials, clients and index from the app config.
+
+    Closes existing clients, so it is intended to be called between operations,
+    e.g. by long-running commands after the config has been re-read.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+    """
+    close_vault_clients(app)
 
-    app.extend("vault_creds", vault_creds)
+    extend_single_flight(app)
+    extend_vault_creds(app)
+    extend_vault_clients(app)
+    extend_secret_index(app)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""Local index of secret properties module."""
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import time
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TYPE_CHECKING,
+)
+
+from .exc import AzKVError
+from .times import from_timestamp, to_timestamp
+
+if TYPE_CHECKING:
+    import sqlite3
+
+    from azure.keyvault.secrets import SecretProperties
+
+INDEX_PATH = "~/.azkv/index.sqlite"
+INDEX_MAX_AGE = 3600
+
+MATCH_SUBSTRING = "substring"
+MATCH_GLOB = "glob"
+MATCH_REGEX = "regex"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS secrets (
+    vault TEXT NOT NULL,
+    name TEXT NOT NULL,
+    enabled INTEGER,
+    tags TEXT,
+    created_on REAL,
+    updated_on REAL,
+    expires_on REAL,
+    PRIMARY KEY (vault, name)
+);
+CREATE INDEX IF NOT EXISTS secrets_name ON secrets (name);
+CREATE TABLE IF NOT EXISTS vaults (
+    vault TEXT PRIMARY KEY,
+    watermark REAL,
+    refreshed_on REAL NOT NULL
+);
+"""
+
+# columns of secrets written and read, named explicitly, as indexes created by
+# earlier releases have the column of versions, which listings do not carry
+_COLUMNS = "vault, name, enabled, tags, created_on, updated_on, expires_on"
+
+
+class IndexedSecret(NamedTuple):
+    """Class describing properties of a secret recorded in the index."""
+
+    vault: str
+    name: str
+    enabled: Optional[bool]
+    tags: Dict[str, str]
+    created_on: Optional[datetime]
+    updated_on: Optional[datetime]
+    expires_on: Optional[datetime]
+
+
+def _regexp(pattern: str, value: str) -> bool:
+    """Implement ``REGEXP`` operator of SQLite."""
+    return re.search(pattern, value) is not None
+
+
+class SecretIndex:
+    """Class implementing local SQLite index of secret properties.
+
+    Records name, enabled flag, tags and times of secrets in each vault, so
+    that vaults holding a secret are found without querying them.
+    Each vault is refreshed from the listing of its secret properties, with
+    the newest ``updated_on`` time seen in the vault as the watermark, so that
+    only secrets created, updated or removed since then are written.
+
+    Parameters
+    ----------
+    path
+        Path to the index database file.
+
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize index stored at ``path``."""
+        self.path = Path(path).expanduser()
+
+        self._initialized = False
+
+    def _connect(self) -> "sqlite3.Connection":
+        """Open connection to the index, creating its schema if necessary."""
+        # imported on first use, so that commands not using the index start fast
+        import sqlite3
+
+        if not self._initialized:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        connection = sqlite3.connect(str(self.path), timeout=30)
+        connection.create_function("REGEXP", 2, _regexp)
+
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+            self.path.chmod(0o600)
+
+            self._initialized = True
+
+        return connection
+
+    @contextmanager
+    def _connection(self, action: str) -> Iterator["sqlite3.Connection"]:
+        """Open connection to the index, closing it when the context exits.
+
+        Errors of the database or its file, e.g. if it is locked by another
+        process, unwritable or corrupt, are raised as :obj:`AzKVError`.
+        """
+        import sqlite3
+
+        try:
+            connection = self._connect()
+            try:
+                yield connection
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            raise AzKVError("Unable to {} index: {}".format(action, str(e)))
+
+    def refreshed_on(self, vault: str) -> Optional[float]:
+        """Get time of the last refresh of the vault, or ``None`` if never.
+
+        Raises
+        ------
+        AzKVError
+            If the index could not be queried.
+
+        """
+        with self._connection("query") as connection:
+            row = connection.execute(
+                "SELECT refreshed_on FROM vaults WHERE vault = ?", (vault,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def update(self, vault: str, properties: Iterable["SecretProperties"]) -> int:
+        """Refresh the vault from the listing of its secret properties.
+
+        Parameters
+        ----------
+        vault
+            Short name of the Key Vault from config file.
+
+        properties
+            Properties of all secrets in the vault.
+
+        Returns
+        -------
+        int
+            Number of secrets created, updated or removed in the index.
+
+        Raises
+        ------
+        AzKVError
+            If the index could not be queried or updated.
+
+        """
+        with self._connection("query") as connection:
+            row = connection.execute(
+                "SELECT watermark FROM vaults WHERE vault = ?", (vault,)
+            ).fetchone()
+            watermark: Optional[float] = row[0] if row else None
+
+            known = {
+                name
+                for (name,) in connection.execute(
+                    "SELECT name FROM secrets WHERE vault = ?", (vault,)
+                )
+            }
+
+        # collect changes while listing, so that the database is not locked
+        # for the time of requests to the vault
+        seen = set()
+        changed: List[Any] = []
+        newest: Optional[float] = watermark
+
+        for item in properties:
+            seen.add(item.name)
+
+            updated_on = to_timestamp(item.updated_on)
+
+            if updated_on is not None:
+                newest = max(newest or updated_on, updated_on)
+
+                if item.name in known and watermark and updated_on <= watermark:
+                    continue
+
+            changed.append(
+                (
+                    vault,
+                    item.name,
+                    item.enabled,
+                    json.dumps(item.tags or {}),
+                    to_timestamp(item.created_on),
+                    updated_on,
+                    to_timestamp(item.expires_on),
+                )
+            )
+
+        removed = [(vault, name) for name in known - seen]
+
+        with self._connection("update") as connection:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO secrets ({}) VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?)".format(_COLUMNS),
+                    changed,
+                )
+                connection.executemany(
+                    "DELETE FROM secrets WHERE vault = ? AND name = ?", removed
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO vaults VALUES (?, ?, ?)",
+                    (vault, newest, time()),
+                )
+
+        return len(changed) + len(removed)
+
+    def search(
+        self, term: str, match: str = None, vaults: List[str] = None,
+    ) -> List[IndexedSecret]:
+        """Find secrets in the index by name.
+
+        Parameters
+        ----------
+        term
+            Name of the secret, or the substring, glob pattern or regular
+            expression to match names against, depending on ``match``.
+
+        match
+            (optional) One of ``substring`` (case-insensitive), ``glob`` or
+            ``regex``. If unspecified, looks up the exact name.
+
+        vaults
+            (optional) Short names of the Key Vaults to scope the search to.
+
+        Returns
+        -------
+        List[IndexedSecret]
+            Matching secrets, ordered by name.
+
+        Raises
+        ------
+        ValueError
+            If the regular expression is invalid.
+
+        AzKVError
+            If the index could not be queried.
+
+        """
+        conditions: Dict[Optional[str], str] = {
+            None: "name = ?",
+            MATCH_SUBSTRING: "instr(lower(name), lower(?)) > 0",
+            MATCH_GLOB: "name GLOB ?",
+            MATCH_REGEX: "name REGEXP ?",
+        }
+
+        query = "SELECT {} FROM secrets WHERE {}".format(_COLUMNS, conditions[match])
+        parameters: List[Any] = [term]
+
+        if vaults is not None:
+            query += " AND vault IN ({})".format(", ".join("?" * len(vaults)))
+            parameters.extend(vaults)
+
+        if match == MATCH_REGEX:
+            try:
+                re.compile(term)
+            except re.error as e:
+                raise ValueError("Invalid pattern '{}': {}".format(term, str(e)))
+
+        with self._connection("query") as connection:
+            rows = connection.execute(query + " ORDER BY name", parameters).fetchall()
+
+        return [
+            IndexedSecret(
+                vault=vault,
+                name=name,
+                enabled=bool(enabled) if enabled is not None else None,
+                tags=json.loads(tags or "{}"),
+                created_on=from_timestamp(created_on),
+                updated_on=from_timestamp(updated_on),
+                expires_on=from_timestamp(expires_on),
+            )
+            for (
+                vault,
+                name,
+                enabled,
+                tags,
+                created_on,
+                updated_on,
+                expires_on,
+            ) in rows
+        ]
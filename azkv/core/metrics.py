@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Run metrics module."""
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .files import write_atomic
+
+# upper bounds of histogram buckets in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_PREFIX = "azkv"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    """Convert labels to hashable form, dropping unset ones."""
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    """Format labels in Prometheus text exposition format."""
+    pairs = list(labels) + sorted(extra.items())
+
+    if not pairs:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{{{}}}".format(
+        ",".join('{}="{}"'.format(name, escape(value)) for name, value in pairs)
+    )
+
+
+class Metrics:
+    """Class implementing thread-safe collection of run metrics.
+
+    Records durations of the phases of the run as histograms, and counts of
+    events, each labelled e.g. by vault and secret name, to be summarized as
+    JSON or written as a textfile for Prometheus ``node_exporter``.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty collection."""
+        self._durations: Dict[Tuple[str, Labels], Dict[str, Any]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = Lock()
+
+    def observe(self, phase: str, seconds: float, **labels: Any) -> None:
+        """Record duration of the phase."""
+        key = (phase, _labels(labels))
+
+        with self._lock:
+            histogram = self._durations.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0,
+                    "buckets": [0] * len(DURATION_BUCKETS),
+                },
+            )
+
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+
+    @contextmanager
+    def timer(self, phase: str, **labels: Any) -> Iterator[None]:
+        """Record duration of the phase run within the context."""
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(phase, monotonic() - started, **labels)
+
+    def count(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increase the counter by ``value``."""
+        key = (name, _labels(labels))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_count(self, name: str, value: float, **labels: Any) -> None:
+        """Set the counter to ``value`` kept elsewhere, e.g. by the throttle."""
+        key = (name, _labels(labels))
+
+        with self._lock:
+            self._counters[key] = value
+
+    def summary(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get summary of the metrics.
+
+        Returns
+        -------
+        Dict[str, List[Dict[str, Any]]]
+            Count, total and maximum duration of each phase under ``phases`` key,
+            and values of counters under ``counters`` key.
+
+        """
+        with self._lock:
+            return {
+                "phases": [
+                    {
+                        "phase": phase,
+                        "labels": dict(labels),
+                        "count": histogram["count"],
+                        "seconds": round(histogram["sum"], 6),
+                        "max_seconds": round(histogram["max"], 6),
+                    }
+                    for (phase, labels), histogram in sorted(self._durations.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+            }
+
+    def write_json(self, path: str) -> None:
+        """Write summary of the metrics as JSON to the file, or stderr if ``-``.
+
+        Standard output is left to the output of the command, e.g. JSON documents
+        of ``--output json``, so that the two are not mixed.
+        """
+        data = json.dumps(self.summary(), indent=2)
+
+        if path == "-":
+            sys.stderr.write(data + "\n")
+            sys.stderr.flush()
+        else:
+            write_atomic(Path(path).expanduser(), data.encode() + b"\n")
+
+    def textfile(self) -> str:
+        """Format the metrics in Prometheus text exposition format."""
+        lines: List[str] = []
+
+        with self._lock:
+            durations = sorted(self._durations.items())
+            counters = sorted(self._counters.items())
+
+        duration_name = "{}_phase_duration_seconds".format(METRICS_PREFIX)
+
+        if durations:
+            lines.append(
+                "# HELP {} Duration of phases of the run.".format(duration_name)
+            )
+            lines.append("# TYPE {} histogram".format(duration_name))
+
+        for (phase, labels), histogram in durations:
+            labels = (("phase", phase),) + labels
+
+            for bound, bucket in zip(DURATION_BUCKETS, histogram["buckets"]):
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        duration_name, _format_labels(labels, le=str(bound)), bucket
+                    )
+                )
+            lines.append(
+                "{}_bucket{} {}".format(
+                    duration_name, _format_labels(labels, le="+Inf"), histogram["count"]
+                )
+            )
+            lines.append(
+                "{}_sum{} {}".format(
+                    duration_name, _format_labels(labels), histogram["sum"]
+                )
+            )
+            lines.append(
+                "{}_count{} {}".format(
+                    duration_name, _format_labels(labels), histogram["count"]
+                )
+            )
+
+        described = set()
+
+        for (name, labels), value in counters:
+            counter_name = "{}_{}_total".format(METRICS_PREFIX, name)
+
+            if counter_name not in described:
+                lines.append("# TYPE {} counter".format(counter_name))
+                described.add(counter_name)
+
+            lines.append("{}{} {}".format(counter_name, _format_labels(labels), value))
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Write the metrics to a textfile for Prometheus ``node_exporter``.
+
+        The file is replaced atomically, so the collector never reads it
+        partially written, and is readable by all users, as the collector
+        usually runs as another user.
+        """
+        write_atomic(Path(path).expanduser(), self.textfile().encode(), mode=0o644)
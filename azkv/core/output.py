@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Output handler module."""
+import json
+from typing import Any, Dict, List, Optional
+
+from cement.core.output import OutputHandler
+
+
+class AzKVOutputHandler(OutputHandler):
+    """Class implementing output handler rendering ``jinja2`` templates.
+
+    This class is a proxy to :class:`cement.ext.ext_jinja2.Jinja2OutputHandler`,
+    which loads the ``jinja2`` extension on first render, so that commands
+    producing no output do not pay for importing ``jinja2``.
+
+    """
+
+    class Meta:
+        """Handler meta-data."""
+
+        label = "jinja2_lazy"
+
+    def __init__(self, *args: Any, **kw: Any) -> None:
+        """Initialize handler without loading ``jinja2``."""
+        super().__init__(*args, **kw)
+        self._output: Optional[OutputHandler] = None
+
+    def render(self, data: Dict[str, Any], template: str = None, **kw: Any) -> str:
+        """Render ``data`` using the given template file.
+
+        Parameters
+        ----------
+        data
+            The data dictionary to render.
+
+        template
+            The path to the template, after the ``template_module`` or
+            ``template_dirs`` prefix as defined in the application.
+
+        Returns
+        -------
+        str
+            The rendered template text.
+
+        """
+        if self._output is None:
+            self.app.ext.load_extension("jinja2")
+
+            self._output = self.app.handler.resolve("output", "jinja2", setup=True)
+
+        return self._output.render(data, template, **kw)
+
+
+# labels of the machine-readable output handlers, selected with ``--output``
+OUTPUT_JSON = "json"
+OUTPUT_NDJSON = "ndjson"
+
+
+def _records(data: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Get lists of records from ``data``, leaving out flags such as ``header``."""
+    return {key: value for key, value in data.items() if isinstance(value, list)}
+
+
+class AzKVJsonOutputHandler(OutputHandler):
+    """Class implementing output handler rendering data as a JSON document.
+
+    Templates are ignored. Commands producing output page by page render
+    the whole result at once with this handler.
+
+    """
+
+    class Meta:
+        """Handler meta-data."""
+
+        label = OUTPUT_JSON
+        overridable = True
+
+    def render(self, data: Dict[str, Any], template: str = None, **kw: Any) -> str:
+        """Render lists of records of ``data`` as a JSON object."""
+        return json.dumps(_records(data), default=str) + "\n"
+
+
+class AzKVNdjsonOutputHandler(OutputHandler):
+    """Class implementing output handler rendering records as NDJSON.
+
+    Every record of the lists in data is rendered as a JSON object on its
+    own line, so that commands could stream records as they arrive and
+    consumers could process them one by one. Templates are ignored.
+
+    """
+
+    class Meta:
+        """Handler meta-data."""
+
+        label = OUTPUT_NDJSON
+        overridable = True
+
+    def render(self, data: Dict[str, Any], template: str = None, **kw: Any) -> str:
+        """Render every record of ``data`` as a line of JSON."""
+        return "".join(
+            json.dumps(record, default=str) + "\n"
+            for records in _records(data).values()
+            for record in records
+        )
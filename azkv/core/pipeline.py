@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""Secret saving pipeline module."""
+from base64 import standard_b64decode
+from binascii import Error as BinAsciiError
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, List, NamedTuple, Optional
+
+from cement import App
+
+import yaml
+
+from .convert import PFX_OUTPUTS, PFX_SPLIT_PEM_OUTPUTS, convert_pfx, pfx_output_path
+from .exc import AzKVError
+from .fetch import SecretFetcher
+from .files import file_digest, write_atomic
+from .metrics import Metrics
+from .posthooks import PostHookRunner
+from .state import SaveState, StateStore
+
+STATUS_UPDATED = "updated"
+STATUS_UNCHANGED = "unchanged"
+STATUS_NOT_FOUND = "not-found"
+STATUS_FAILED = "failed"
+
+
+class SaveEntry(NamedTuple):
+    """Class describing a secret to be saved to a file."""
+
+    name: str
+    file: str
+    b64decode: bool = False
+    convert_action: Optional[str] = None
+    pfx_password: Optional[str] = None
+    post_hook: Optional[str] = None
+    vaults: Optional[List[str]] = None
+    hedge_delay: Optional[float] = None
+    force: bool = False
+    interval: Optional[float] = None
+    pfx_outputs: Optional[List[str]] = None
+    hooks: Optional[List[str]] = None
+    version: Optional[str] = None
+
+
+class SaveResult(NamedTuple):
+    """Class describing the outcome of saving a secret to a file."""
+
+    name: str
+    file: str
+    status: str
+    vault: Optional[str] = None
+    updated_on: Optional[datetime] = None
+    expires_on: Optional[datetime] = None
+
+
+def load_manifest(
+    path: str, hedge_delay: float = None, force: bool = False,
+) -> List[SaveEntry]:
+    """Load the list of secrets to be saved from a YAML manifest.
+
+    The manifest is a YAML list of mappings with the ``name`` and ``file`` keys,
+    and optional ``b64decode``, ``post_convert``, ``post_convert_pfx_pwd``,
+    ``post_hook``, ``hooks``, ``vaults``, ``hedge_delay``, ``pfx_outputs`` and
+    ``version`` keys mirroring the CLI options of ``secrets save``, and ``interval``
+    key with seconds between refreshes of the secret by ``azkv agent``.
+
+    Parameters
+    ----------
+    path
+        Path to the manifest file.
+
+    hedge_delay
+        (optional) Default for entries without ``hedge_delay`` key.
+
+    force
+        (optional) Save all entries even if their version has not changed.
+
+    Returns
+    -------
+    List[SaveEntry]
+        Entries in the order of the manifest.
+
+    Raises
+    ------
+    AzKVError
+        If the manifest could not be read or is malformed.
+
+    """
+    try:
+        with open(path) as f:
+            manifest: Any = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        raise AzKVError("Unable to load manifest '{}': {}".format(path, str(e)))
+
+    if not isinstance(manifest, list):
+        raise AzKVError("Manifest '{}' must contain a list of secrets".format(path))
+
+    entries: List[SaveEntry] = []
+
+    for index, item in enumerate(manifest):
+        if not isinstance(item, dict) or not item.get("name") or not item.get("file"):
+            raise AzKVError(
+                "Manifest '{}' entry #{} must define 'name' and 'file'".format(
+                    path, index + 1
+                )
+            )
+
+        vaults = item.get("vaults")
+        if isinstance(vaults, str):
+            vaults = [vaults]
+
+        pfx_outputs = item.get("pfx_outputs")
+        if isinstance(pfx_outputs, str):
+            pfx_outputs = [pfx_outputs]
+
+        hooks = item.get("hooks")
+        if isinstance(hooks, str):
+            hooks = [hooks]
+
+        for output in pfx_outputs or []:
+            if output not in PFX_OUTPUTS:
+                raise AzKVError(
+                    "Manifest '{}' entry #{} has unknown PFX output '{}'".format(
+                        path, index + 1, output
+                    )
+                )
+
+        entries.append(
+            SaveEntry(
+                name=str(item["name"]),
+                file=str(item["file"]),
+                b64decode=bool(item.get("b64decode", False)),
+                convert_action=item.get("post_convert"),
+                pfx_password=item.get("post_convert_pfx_pwd"),
+                post_hook=item.get("post_hook"),
+                vaults=vaults,
+                hedge_delay=item.get("hedge_delay", hedge_delay),
+                force=force,
+                interval=item.get("interval"),
+                pfx_outputs=pfx_outputs,
+                hooks=hooks,
+                version=str(item["version"]) if item.get("version") else None,
+            )
+        )
+
+    return entries
+
+
+class SavePipeline:
+    """Class implementing the pipeline to save a secret to a file.
+
+    Fetches the secret from the first available Azure Key Vault, optionally
+    Base64-decodes it, updates the target file if its content has changed,
+    and then applies post-conversion and queues post-hooks, which are run by
+    the caller through :attr:`post_hooks` once for all updated secrets.
+
+    Key Vaults are tried in order of priority and health, if health tracking
+    is enabled. If the local index of secrets is enabled, Key Vaults known to
+    hold the secret are tried first, followed by the rest of them.
+
+    If ``state_dir`` config option is set, the version of the secret saved to
+    the target file is recorded, and processing stops early when the same
+    version is fetched again and the target file has not changed locally.
+
+    Durations of fetching, decoding, writing and conversion of each secret are
+    recorded to the metrics of the run.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    post_hooks
+        (optional) Runner to queue post-hooks of updated secrets to. If
+        unspecified, it is created from the app config.
+
+    """
+
+    def __init__(self, app: App, post_hooks: PostHookRunner = None) -> None:
+        """Initialize pipeline for the app."""
+        self.app = app
+        self.fetcher = SecretFetcher(app)
+        self.metrics: Metrics = getattr(app, "metrics", None) or Metrics()
+        self.post_hooks = post_hooks or PostHookRunner.from_app(app)
+
+        state_dir: Optional[str] = self.app.config.get("azkv", "state_dir")
+
+        self.states: Optional[StateStore] = StateStore(state_dir) if state_dir else None
+
+    def save(self, entry: SaveEntry) -> SaveResult:
+        """Fetch secret from first available Azure Key Vault and save it.
+
+        Parameters
+        ----------
+        entry
+            Secret to be fetched and the file to save it to.
+
+        Returns
+        -------
+        SaveResult
+            Outcome of the pipeline for the ``entry``.
+
+        """
+        with self.metrics.timer("save", secret=entry.name):
+            result = self._save(entry)
+
+        self.metrics.count("secrets", status=result.status)
+
+        return result
+
+    def _save(self, entry: SaveEntry) -> SaveResult:
+        """Run the pipeline for the entry."""
+        secret_name: str = entry.name
+
+        file_path_secret: Path = Path(entry.file)
+
+        file_secret_updated: bool = False
+
+        # get list of applicable key vaults
+        vault_list: List[str] = self.fetcher.get_vaults(entry.vaults)
+
+        if len(vault_list) == 0:
+            return SaveResult(entry.name, entry.file, STATUS_NOT_FOUND)
+
+        vault_list = self.fetcher.order_vaults(vault_list)
+
+        # try vaults known to hold the secret first, keeping the rest as fallback
+        indexed_vaults: List[str] = self.fetcher.get_indexed_vaults(
+            vault_list, secret_name
+        )
+        vault_list = indexed_vaults + [
+            vault for vault in vault_list if vault not in indexed_vaults
+        ]
+
+        self.app.log.info(
+            "Fetching secret '{}' from '{}'".format(secret_name, ", ".join(vault_list))
+        )
+        vault, secret = self.fetcher.get_first_secret(
+            vault_list, secret_name, entry.hedge_delay, entry.version
+        )
+
+        if not secret:
+            return SaveResult(entry.name, entry.file, STATUS_NOT_FOUND)
+
+        version: str = secret.properties.version or ""
+
+        # lifecycle of the secret to schedule its next refresh
+        lifecycle = (secret.properties.updated_on, secret.properties.expires_on)
+
+        # options changing the content of the target file for the same version
+        options: str = "b64decode={};post_convert={}".format(
+            entry.b64decode, entry.convert_action or ""
+        )
+        if entry.pfx_outputs:
+            options += ";pfx_outputs={}".format(",".join(entry.pfx_outputs))
+
+        # files converted from the target file, to be regenerated if missing
+        outputs: List[Path] = (
+            [
+                pfx_output_path(file_path_secret, output)
+                for output in entry.pfx_outputs or PFX_SPLIT_PEM_OUTPUTS
+            ]
+            if entry.convert_action == "pfx-split-pem"
+            else []
+        )
+
+        if self.states is not None and not entry.force:
+            state: Optional[SaveState] = self.states.load(file_path_secret)
+
+            if (
+                state is not None
+                and state.version == version
+                and state.options == options
+                and self.states.matches(file_path_secret, state, outputs)
+            ):
+                self.app.log.info(
+                    "Secret '{}' version '{}' already saved to '{}', stop processing".format(  # noqa: E501
+                        secret_name, version, file_path_secret
+                    )
+                )
+
+                return SaveResult(
+                    entry.name, entry.file, STATUS_UNCHANGED, vault, *lifecycle
+                )
+
+        with self.metrics.timer("decode", secret=secret_name):
+            secret_output: bytes = self._decode(entry, secret.value)
+
+        try:
+            with self.metrics.timer("write", secret=secret_name):
+                file_secret_updated = self._write(
+                    secret_name, file_path_secret, secret_output
+                )
+
+            updated: bool = file_secret_updated
+            failed: bool = False
+
+            if entry.convert_action == "pfx-split-pem":
+                with self.metrics.timer("convert", secret=secret_name):
+                    converted = self._convert_pfx(
+                        entry, secret_output, file_secret_updated
+                    )
+
+                if converted is None:
+                    failed = True
+                elif converted:
+                    updated = True
+
+            if updated:
+                self.post_hooks.notify(entry.file, entry.hooks, entry.post_hook)
+
+            status: str = STATUS_UPDATED if updated else STATUS_UNCHANGED
+            if failed:
+                status = STATUS_FAILED
+
+        except OSError as e:
+            self.app.log.error("OSError: {}".format(str(e)))
+
+            return SaveResult(entry.name, entry.file, STATUS_FAILED, vault, *lifecycle)
+
+        if self.states is not None and status != STATUS_FAILED:
+            self._store_state(
+                file_path_secret,
+                vault or "",
+                version,
+                sha256(secret_output).hexdigest(),
+                options,
+                outputs,
+            )
+
+        return SaveResult(entry.name, entry.file, status, vault, *lifecycle)
+
+    def _store_state(
+        self,
+        file_path_secret: Path,
+        vault: str,
+        version: str,
+        digest: str,
+        options: str,
+        outputs: List[Path],
+    ) -> None:
+        """Record the version of the secret saved to the file and its outputs."""
+        try:
+            stat = file_path_secret.stat()
+
+            output_stats = {str(path.absolute()): path.stat() for path in outputs}
+
+            self.states.store(
+                file_path_secret,
+                SaveState(
+                    vault=vault,
+                    version=version,
+                    digest=digest,
+                    options=options,
+                    size=stat.st_size,
+                    mtime_ns=stat.st_mtime_ns,
+                    outputs={
+                        path: [output_stat.st_size, output_stat.st_mtime_ns]
+                        for path, output_stat in output_stats.items()
+                    },
+                ),
+            )
+        except OSError as e:
+            self.app.log.warning(
+                "Unable to record state of '{}': {}".format(file_path_secret, str(e))
+            )
+
+    def _decode(self, entry: SaveEntry, value: str) -> bytes:
+        """Optionally Base64-decode the value of the secret."""
+        if entry.b64decode:
+            self.app.log.info("Base64-decoding secret '{}'".format(entry.name))
+
+            try:
+                return standard_b64decode(value)
+
+            except BinAsciiError as e:
+                self.app.log.error("Base64 decoding error: {}".format(str(e)))
+
+        return value.encode()
+
+    def _write(
+        self, secret_name: str, file_path_secret: Path, secret_output: bytes,
+    ) -> bool:
+        """Save the secret to the file, if content differs.
+
+        Compares the secret against the target file in memory, and replaces
+        the file atomically only if the content is different.
+
+        Returns ``True`` if the file has been created or updated.
+        """
+        try:
+            target_size: Optional[int] = file_path_secret.stat().st_size
+        except FileNotFoundError:
+            target_size = None
+
+        if target_size is None:
+            self.app.log.info(
+                "Target file '{}' does not exist, saving secret '{}'".format(
+                    file_path_secret, secret_name
+                )
+            )
+
+        elif target_size != len(secret_output):
+            self.app.log.info(
+                "Target file '{}' differs in size from secret '{}', continue processing".format(  # noqa: E501
+                    file_path_secret, secret_name
+                )
+            )
+
+        else:
+            hash_secret = sha256(secret_output)
+            self.app.log.info(
+                "Secret '{}' digest: '{}:{}'".format(
+                    secret_name, hash_secret.name, hash_secret.hexdigest()
+                )
+            )
+
+            hash_target = file_digest(file_path_secret)
+            self.app.log.info(
+                "Target file '{}' digest: '{}:{}'".format(
+                    file_path_secret, hash_target.name, hash_target.hexdigest()
+                )
+            )
+
+            if hash_target.digest() == hash_secret.digest():
+                self.app.log.info(
+                    "Target file and secret are identical, stop processing"
+                )
+
+                return False
+
+            self.app.log.info(
+                "Target file and secret are different, continue processing"
+            )
+
+        self.app.log.info(
+            "Saving secret '{}' to target file '{}'".format(
+                secret_name, file_path_secret
+            )
+        )
+        write_atomic(file_path_secret, secret_output)
+
+        return True
+
+    def _convert_pfx(
+        self, entry: SaveEntry, secret_output: bytes, changed: bool,
+    ) -> Optional[List[Path]]:
+        """Convert PKCS12 secret to the requested outputs next to the target file.
+
+        Outputs are written if the secret has ``changed`` or they are missing.
+
+        Returns written outputs, or ``None`` if the secret could not be parsed.
+        """
+        outputs: List[str] = entry.pfx_outputs or PFX_SPLIT_PEM_OUTPUTS
+
+        self.app.log.info(
+            "Applying '{}' conversion to secret '{}' ({})".format(
+                entry.convert_action, entry.name, ", ".join(outputs)
+            )
+        )
+        try:
+            written: List[Path] = convert_pfx(
+                secret_output,
+                Path(entry.file),
+                outputs,
+                password=entry.pfx_password,
+                changed=changed,
+            )
+
+        except ValueError as e:
+            self.app.log.error("ValueError: {}".format(str(e)))
+
+            return None
+
+        for path in written:
+            self.app.log.info(
+                "Saved output of '{}' conversion to '{}'".format(
+                    entry.convert_action, path
+                )
+            )
+
+        return written
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Azure SDK pipeline policies module."""
+from azure.core.pipeline import PipelineRequest, PipelineResponse
+from azure.core.pipeline.policies import HTTPPolicy
+
+from .throttle import VaultThrottle, get_retry_after
+
+# this module depends on `azure.core`, so it is imported only along with the SDK
+
+
+class ThrottlePolicy(HTTPPolicy):
+    """Class implementing pipeline policy throttling requests to a Key Vault.
+
+    Waits for :class:`~azkv.core.throttle.VaultThrottle` to let each attempt
+    of a request through, and reports ``429 Too Many Requests`` responses to it,
+    leaving the retries to the retry policy of the pipeline.
+
+    Parameters
+    ----------
+    vault
+        Short name of the Key Vault from config file.
+
+    throttle
+        Throttle shared by all clients of the app.
+
+    """
+
+    def __init__(self, vault: str, throttle: VaultThrottle) -> None:
+        """Initialize policy for the vault."""
+        super().__init__()
+        self._vault = vault
+        self._throttle = throttle
+
+    def send(self, request: PipelineRequest) -> PipelineResponse:
+        """Send the request once the throttle lets it through."""
+        self._throttle.acquire(self._vault)
+
+        response: PipelineResponse = self.next.send(request)
+
+        if response.http_response.status_code == 429:
+            self._throttle.record_throttled(
+                self._vault, get_retry_after(response.http_response.headers)
+            )
+
+        return response
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""Post-hook execution module."""
+import subprocess  # noqa: S404
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from cement import App
+
+from .exc import AzKVError
+from .metrics import Metrics
+
+# defaults of the ``hooks`` config section
+HOOK_DEBOUNCE = 5
+HOOK_TIMEOUT = 300
+
+
+class PostHookRunner:
+    """Class implementing coalesced execution of post-hooks.
+
+    Post-hooks of the secrets written during the run are collected, so that each
+    distinct hook runs once for all of them. Hooks are either named actions from
+    ``hooks.actions`` config section, each with ``command`` and optional
+    ``timeout``, attached to secrets by name, or shell commands set on secrets
+    directly. Hooks are coalesced by the command.
+
+    Batch commands run pending hooks once all secrets are processed. Long-running
+    commands run each hook once ``debounce`` seconds have passed since the last
+    of its secrets was written, and no refresh of its secrets is in progress.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    actions
+        Named actions, each with ``command`` and optional ``timeout`` keys.
+
+    debounce
+        (optional) Seconds to wait after the last update before running a hook.
+
+    timeout
+        (optional) Seconds to let a hook run for, unless set by the action.
+
+    parallel
+        (optional) Run distinct hooks due at the same time in parallel.
+
+    """
+
+    def __init__(
+        self,
+        app: App,
+        actions: Mapping[str, Mapping[str, Any]],
+        debounce: float = HOOK_DEBOUNCE,
+        timeout: float = HOOK_TIMEOUT,
+        parallel: bool = False,
+    ) -> None:
+        """Initialize runner of the actions."""
+        self.app = app
+        self.actions = actions
+        self.debounce = debounce
+        self.timeout = timeout
+        self.parallel = parallel
+
+        self.metrics: Metrics = getattr(app, "metrics", None) or Metrics()
+
+        # pending hooks keyed by command, with the name of the action, timeout,
+        # files of updated secrets and time of the last update
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = Lock()
+
+    @classmethod
+    def from_app(cls, app: App) -> "PostHookRunner":
+        """Create runner from ``hooks`` config section of the app."""
+        hooks_config: Dict[str, Any] = app.config.get("azkv", "hooks") or {}
+
+        return cls(
+            app,
+            actions=hooks_config.get("actions") or {},
+            debounce=hooks_config.get("debounce", HOOK_DEBOUNCE),
+            timeout=hooks_config.get("timeout", HOOK_TIMEOUT),
+            parallel=bool(hooks_config.get("parallel", False)),
+        )
+
+    def check(self, hooks: Iterable[str]) -> None:
+        """Check that named actions are defined in config.
+
+        Raises
+        ------
+        AzKVError
+            If any of the actions is unknown.
+
+        """
+        for hook in hooks:
+            action: Any = self.actions.get(hook)
+
+            if not isinstance(action, Mapping) or not action.get("command"):
+                raise AzKVError("Unknown post-hook action '{}'".format(hook))
+
+    def resolve(
+        self, hooks: Optional[Iterable[str]], post_hook: Optional[str]
+    ) -> List[Tuple[str, str, float]]:
+        """Get name, command and timeout of the actions and the shell command."""
+        resolved: List[Tuple[str, str, float]] = []
+
+        for hook in hooks or []:
+            action: Any = self.actions.get(hook)
+
+            # unknown actions are reported by :meth:`check` and :meth:`notify`
+            if not isinstance(action, Mapping) or not action.get("command"):
+                continue
+
+            resolved.append(
+                (hook, action["command"], action.get("timeout") or self.timeout)
+            )
+
+        if post_hook:
+            resolved.append((post_hook, post_hook, self.timeout))
+
+        return resolved
+
+    def keys(
+        self, hooks: Optional[Iterable[str]], post_hook: Optional[str]
+    ) -> List[str]:
+        """Get commands of the actions and the shell command, as hooks are keyed."""
+        return [command for _, command, _ in self.resolve(hooks, post_hook)]
+
+    def notify(
+        self, file: str, hooks: Optional[Iterable[str]], post_hook: Optional[str],
+    ) -> None:
+        """Record the update of the secret saved to ``file``.
+
+        Parameters
+        ----------
+        file
+            Path to the file of the updated secret.
+
+        hooks
+            Names of the actions attached to the secret.
+
+        post_hook
+            Shell command set on the secret.
+
+        """
+        now = monotonic()
+
+        try:
+            self.check(hooks or [])
+        except AzKVError as e:
+            self.app.log.error("{}, skipped for '{}'".format(e.args[0], file))
+
+        with self._lock:
+            for name, command, timeout in self.resolve(hooks, post_hook):
+                pending = self._pending.setdefault(
+                    command, {"name": name, "timeout": timeout, "files": set()}
+                )
+
+                pending["files"].add(file)
+                pending["updated"] = now
+
+    def next_due(self, busy: Iterable[str] = ()) -> Optional[float]:
+        """Get monotonic time when the next pending hook is due, if any."""
+        busy = set(busy)
+
+        with self._lock:
+            updated: List[float] = [
+                pending["updated"]
+                for key, pending in self._pending.items()
+                if key not in busy
+            ]
+
+        return min(updated) + self.debounce if updated else None
+
+    def run_due(self, busy: Iterable[str] = ()) -> Set[str]:
+        """Run hooks due after the debounce window, skipping ``busy`` ones.
+
+        Returns files of the secrets whose hooks failed.
+        """
+        now = monotonic()
+        busy = set(busy)
+
+        with self._lock:
+            due = [
+                key
+                for key, pending in self._pending.items()
+                if pending["updated"] + self.debounce <= now and key not in busy
+            ]
+
+        return self._run(due)
+
+    def flush(self) -> Set[str]:
+        """Run all pending hooks right away.
+
+        Returns files of the secrets whose hooks failed.
+        """
+        with self._lock:
+            due = list(self._pending)
+
+        return self._run(due)
+
+    def _run(self, keys: List[str]) -> Set[str]:
+        """Run the pending hooks, each once."""
+        with self._lock:
+            hooks: List[Tuple[str, Dict[str, Any]]] = [
+                (key, self._pending.pop(key)) for key in keys
+            ]
+
+        if len(hooks) == 0:
+            return set()
+
+        if self.parallel and len(hooks) > 1:
+            with ThreadPoolExecutor(max_workers=len(hooks)) as executor:
+                succeeded = list(
+                    executor.map(lambda hook: self._run_hook(*hook), hooks)
+                )
+        else:
+            succeeded = [self._run_hook(*hook) for hook in hooks]
+
+        failed: Set[str] = set()
+
+        for (_, pending), ok in zip(hooks, succeeded):
+            if not ok:
+                failed |= pending["files"]
+
+        return failed
+
+    def _run_hook(self, command: str, pending: Dict[str, Any]) -> bool:
+        """Run post-hook shell command.
+
+        Returns ``False`` if the command exited with non-zero code or timed out.
+        """
+        self.app.log.info(
+            "Executing post-hook shell command '{}' for {} secret(s)".format(
+                command, len(pending["files"])
+            )
+        )
+
+        with self.metrics.timer("post_hook", hook=pending["name"]):
+            try:
+                process = subprocess.run(  # noqa: S602
+                    command,
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=pending["timeout"],
+                )
+            except subprocess.TimeoutExpired:
+                self.app.log.error(
+                    "Post-hook shell command timed out after {}s".format(
+                        pending["timeout"]
+                    )
+                )
+
+                return False
+
+        if process.returncode == 0:
+            self.app.log.info("Post-hook shell command executed successfully")
+
+        else:
+            self.app.log.error(
+                "Post-hook shell command exited with code '{}'".format(
+                    process.returncode
+                )
+            )
+            self.app.log.error(
+                "Post-hook shell command error message '{}'".format(
+                    process.stderr.decode().rstrip()
+                )
+            )
+
+        self.app.log.info(
+            "Post-hook shell command output '{}'".format(
+                process.stdout.decode().rstrip()
+            )
+        )
+
+        return process.returncode == 0
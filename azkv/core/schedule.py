@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Secret refresh scheduling module."""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+# defaults of the ``schedule`` config section
+SCHEDULE_MIN_INTERVAL = 300
+SCHEDULE_MAX_INTERVAL = 86400
+SCHEDULE_SAFETY_MARGIN = 86400
+SCHEDULE_BACKOFF = 0.5
+
+
+class RefreshScheduler:
+    """Class implementing expiry-aware schedule of secret refreshes.
+
+    Estimates how often a secret changes from the time since its last update,
+    so that static secrets are polled rarely and recently rotated ones more
+    often, and tightens the schedule as the secret approaches its expiry.
+
+    Parameters
+    ----------
+    min_interval
+        Shortest interval between refreshes in seconds.
+
+    max_interval
+        Longest interval between refreshes in seconds.
+
+    safety_margin
+        Seconds before expiry of the secret by which its rotation is expected.
+        Once within the margin, the secret is refreshed every ``min_interval``.
+
+    backoff
+        Fraction of the time since the last update of the secret to wait
+        before the next refresh.
+
+    """
+
+    def __init__(
+        self,
+        min_interval: float = SCHEDULE_MIN_INTERVAL,
+        max_interval: float = SCHEDULE_MAX_INTERVAL,
+        safety_margin: float = SCHEDULE_SAFETY_MARGIN,
+        backoff: float = SCHEDULE_BACKOFF,
+    ) -> None:
+        """Initialize scheduler with the interval bounds."""
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.safety_margin = float(safety_margin)
+        self.backoff = float(backoff)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "RefreshScheduler":
+        """Create scheduler from the ``schedule`` config section."""
+        options: Dict[str, Any] = {
+            key: value
+            for key, value in (config or {}).items()
+            if key in ("min_interval", "max_interval", "safety_margin", "backoff")
+            and value is not None
+        }
+
+        return cls(**options)
+
+    def next_interval(
+        self,
+        updated_on: Optional[datetime],
+        expires_on: Optional[datetime],
+        now: Optional[datetime] = None,
+    ) -> float:
+        """Get seconds until the next refresh of the secret.
+
+        Parameters
+        ----------
+        updated_on
+            (optional) Time the secret was last updated.
+
+        expires_on
+            (optional) Time the secret expires.
+
+        now
+            (optional) Current time, defaults to the current UTC time.
+
+        Returns
+        -------
+        float
+            Interval between ``min_interval`` and ``max_interval``.
+
+        """
+        now = now or datetime.now(timezone.utc)
+
+        interval: float = self.max_interval
+
+        if updated_on is not None:
+            age = max(0.0, (now - updated_on).total_seconds())
+
+            interval = age * self.backoff
+
+        if expires_on is not None:
+            # time left until rotation is expected at the latest
+            deadline = (expires_on - now).total_seconds() - self.safety_margin
+
+            if deadline <= 0:
+                interval = self.min_interval
+            else:
+                # halve the gap at each refresh to converge on the deadline
+                interval = min(interval, deadline / 2)
+
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def next_refresh(
+        self,
+        updated_on: Optional[datetime],
+        expires_on: Optional[datetime],
+        now: Optional[datetime] = None,
+    ) -> datetime:
+        """Get time of the next refresh of the secret.
+
+        Takes the same parameters as :meth:`next_interval`.
+
+        Returns
+        -------
+        datetime
+            Time of the next refresh in UTC.
+
+        """
+        now = now or datetime.now(timezone.utc)
+
+        return now + timedelta(seconds=self.next_interval(updated_on, expires_on, now))
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Local secret server module."""
+import json
+import os
+import socket
+import struct
+from fnmatch import fnmatchcase
+from pathlib import Path
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from typing import Any, Dict, List, Optional, TYPE_CHECKING, Tuple
+
+from cement import App
+
+from .cache import TTLCache
+from .exc import AzKVError
+from .fetch import SecretFetcher
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import KeyVaultSecret
+
+# defaults of the ``serve`` config section
+SERVE_SOCKET = "/run/azkv.sock"
+SERVE_TTL = 300
+SERVE_MAX_SIZE = 1024
+
+# maximum size of a request line in bytes
+MAX_REQUEST_SIZE = 1 << 16
+
+
+class _ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer):
+    """Unix stream server handling each connection in a thread."""
+
+    daemon_threads = True
+
+
+class SecretServer:
+    """Class implementing server answering secret lookups over a Unix socket.
+
+    Clients send newline-delimited JSON requests with the ``name`` key, and
+    optional ``vaults`` (name or list of names) and ``version`` keys, and get
+    one JSON line in response for each request, either with the ``name``,
+    ``value``, ``version``, ``vault`` and ``expires_on`` keys, or with the
+    ``error`` key.
+
+    Secrets are looked up across Key Vaults in the order of config, as in
+    ``secrets save``, and kept in a :class:`TTLCache`. Each request is checked
+    against the access rules, matched by user and group IDs of the peer
+    process reported by the kernel for the connection (``SO_PEERCRED``).
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    socket_path
+        Path to the Unix socket to listen on.
+
+    ttl
+        Seconds to cache secrets for.
+
+    max_size
+        Maximum number of secrets in the cache.
+
+    acl
+        (optional) List of access rules, each allowing processes with ``uid``
+        or ``gid`` to get secrets with names matching any of ``secrets`` glob
+        patterns (all secrets if unset). Rules with neither ``uid`` nor ``gid``
+        are ignored. By default, allows only processes running as the same user
+        as the server.
+
+    """
+
+    def __init__(
+        self,
+        app: App,
+        socket_path: str,
+        ttl: float = SERVE_TTL,
+        max_size: int = SERVE_MAX_SIZE,
+        acl: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Initialize server for the app."""
+        if not hasattr(socket, "SO_PEERCRED"):
+            raise AzKVError("Peer credentials are not supported on this platform")
+
+        self.app = app
+        self.socket_path = Path(socket_path)
+
+        self.fetcher = SecretFetcher(app)
+        self.cache = TTLCache(ttl, max_size)
+
+        self.acl: List[Dict[str, Any]] = []
+
+        for rule in acl or [{"uid": os.getuid()}]:
+            # the socket is open to all local users, so a rule without
+            # a principal would expose its secrets to any process
+            if rule.get("uid") is None and rule.get("gid") is None:
+                self.app.log.warning(
+                    "Ignoring access rule without 'uid' or 'gid': {}".format(rule)
+                )
+
+                continue
+
+            self.acl.append(rule)
+
+        self._server: Optional[_ThreadingUnixStreamServer] = None
+
+    def _bind(self) -> _ThreadingUnixStreamServer:
+        """Bind the Unix socket, replacing a stale one."""
+        if self.socket_path.is_socket():
+            self.socket_path.unlink()
+
+        secret_server = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self) -> None:
+                secret_server.handle_connection(self.request, self.rfile, self.wfile)
+
+        server = _ThreadingUnixStreamServer(str(self.socket_path), Handler)
+
+        # access is controlled per request with peer credentials
+        self.socket_path.chmod(0o666)
+
+        return server
+
+    def serve_forever(self) -> None:
+        """Answer requests until :meth:`shutdown` is called."""
+        self._server = self._bind()
+
+        self.app.log.info("Serving secrets on '{}'".format(self.socket_path))
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+            if self.socket_path.is_socket():
+                self.socket_path.unlink()
+
+    def shutdown(self) -> None:
+        """Stop serving requests."""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _peer_credentials(self, connection: socket.socket) -> Tuple[int, int, int]:
+        """Get process, user and group IDs of the peer process."""
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+
+        return struct.unpack("3i", credentials)
+
+    def is_allowed(self, uid: int, gid: int, name: str) -> bool:
+        """Check access rules for the peer to get secret ``name``."""
+        for rule in self.acl:
+            if rule.get("uid") is not None and rule["uid"] != uid:
+                continue
+            if rule.get("gid") is not None and rule["gid"] != gid:
+                continue
+
+            patterns: List[str] = rule.get("secrets") or ["*"]
+
+            if any(fnmatchcase(name, pattern) for pattern in patterns):
+                return True
+
+        return False
+
+    def handle_connection(
+        self, connection: socket.socket, rfile: Any, wfile: Any
+    ) -> None:
+        """Answer requests from the connection until it is closed."""
+        pid, uid, gid = self._peer_credentials(connection)
+
+        for line in iter(lambda: rfile.readline(MAX_REQUEST_SIZE), b""):
+            response = self.handle_request(line, pid, uid, gid)
+
+            wfile.write(json.dumps(response).encode() + b"\n")
+            wfile.flush()
+
+    def handle_request(
+        self, line: bytes, pid: int, uid: int, gid: int
+    ) -> Dict[str, Optional[str]]:
+        """Answer a single request from the peer process."""
+        try:
+            request: Any = json.loads(line)
+        except ValueError:
+            return {"error": "malformed request"}
+
+        if not isinstance(request, dict) or not isinstance(request.get("name"), str):
+            return {"error": "request must define 'name'"}
+
+        name: str = request["name"]
+
+        version: Any = request.get("version")
+        if version is not None and not isinstance(version, str):
+            return {"error": "'version' must be a string"}
+
+        vaults: Any = request.get("vaults")
+        if isinstance(vaults, str):
+            vaults = [vaults]
+        elif vaults is not None and not (
+            isinstance(vaults, list) and all(isinstance(v, str) for v in vaults)
+        ):
+            return {"error": "'vaults' must be a name or a list of names"}
+
+        if not self.is_allowed(uid, gid, name):
+            self.app.log.warning(
+                "Denied secret '{}' to process {} (uid={}, gid={})".format(
+                    name, pid, uid, gid
+                )
+            )
+
+            return {"error": "access denied"}
+
+        vault_list: List[str] = self.fetcher.get_vaults(vaults)
+
+        found: Optional[Tuple[str, "KeyVaultSecret"]] = self.cache.get_or_load(
+            (name, version, tuple(vault_list)),
+            lambda: self._fetch(vault_list, name, version),
+        )
+
+        if found is None:
+            return {"error": "secret not found"}
+
+        vault, secret = found
+
+        return {
+            "name": name,
+            "value": secret.value,
+            "version": secret.properties.version,
+            "vault": vault,
+            "expires_on": secret.properties.expires_on.isoformat()
+            if secret.properties.expires_on
+            else None,
+        }
+
+    def _fetch(
+        self, vault_list: List[str], name: str, version: Optional[str]
+    ) -> Optional[Tuple[str, "KeyVaultSecret"]]:
+        """Get a secret from the first Azure Key Vault holding it."""
+        self.app.log.info(
+            "Fetching secret '{}' from '{}'".format(name, ", ".join(vault_list))
+        )
+
+        for vault in self.fetcher.order_vaults(vault_list):
+            secret = self.fetcher.get_secret(vault, name, version)
+
+            if secret:
+                return vault, secret
+
+        return None
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Cross-process single-flight module."""
+import fcntl
+import json
+import os
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from time import monotonic, sleep, time
+from typing import Any, Callable, Dict, NamedTuple, Optional, TYPE_CHECKING
+
+from .files import write_atomic
+from .times import from_timestamp, to_timestamp
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import KeyVaultSecret
+
+SINGLE_FLIGHT_PATH = "/run/azkv"
+SINGLE_FLIGHT_TTL = 30
+SINGLE_FLIGHT_WAIT = 60
+
+# seconds between attempts to take the lock held by another process
+LOCK_POLL_INTERVAL = 0.05
+
+LOCK_SUFFIX = ".lock"
+RESULT_SUFFIX = ".result"
+
+
+class SingleFlight:
+    """Class implementing coalescing of identical requests across processes.
+
+    The first process to request ``key`` takes the lock file for it in ``path``
+    directory and runs the request, while the others wait for the lock. The
+    result is shared through a file with mode ``0600`` next to the lock for
+    ``ttl`` seconds, so the waiting processes read it rather than repeating
+    the request. Failed requests are not shared, and the next process in line
+    runs the request itself.
+
+    The directory is meant to be on ``tmpfs``, e.g. ``/run/azkv``, as results
+    might hold values of secrets. Results older than ``ttl`` are removed by
+    the next process taking a lock.
+
+    Parameters
+    ----------
+    path
+        Path to the directory with lock and result files.
+
+    ttl
+        (optional) Seconds to share results for.
+
+    wait
+        (optional) Seconds to wait for the lock before running the request
+        without coalescing.
+
+    """
+
+    def __init__(
+        self,
+        path: str = SINGLE_FLIGHT_PATH,
+        ttl: float = SINGLE_FLIGHT_TTL,
+        wait: float = SINGLE_FLIGHT_WAIT,
+    ) -> None:
+        """Initialize single-flight in ``path`` directory."""
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+        self.wait = wait
+
+    def _file(self, key: str, suffix: str) -> Path:
+        """Get path to the file of ``key``, named after its digest."""
+        return self.path / (sha256(key.encode()).hexdigest() + suffix)
+
+    def _read(self, result_path: Path) -> Optional[Any]:
+        """Read the shared result, unless missing, expired or not owned by us."""
+        try:
+            stat = result_path.stat()
+
+            if stat.st_uid != os.geteuid() or stat.st_mtime + self.ttl <= time():
+                return None
+
+            return json.loads(result_path.read_bytes().decode())
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self) -> None:
+        """Remove expired results."""
+        now = time()
+
+        for result_path in self.path.glob("*" + RESULT_SUFFIX):
+            try:
+                if result_path.stat().st_mtime + self.ttl <= now:
+                    result_path.unlink()
+            except OSError:
+                continue
+
+    def _lock(self, lock_path: Path) -> Optional[int]:
+        """Take the lock file, waiting up to ``wait`` seconds for other processes.
+
+        Returns descriptor of the lock file, or ``None`` if it could not be taken.
+        """
+        try:
+            self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+            fd = os.open(str(lock_path), os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            return None
+
+        deadline = monotonic() + self.wait
+
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+                return fd
+            except BlockingIOError:
+                if monotonic() >= deadline:
+                    os.close(fd)
+
+                    return None
+
+                sleep(LOCK_POLL_INTERVAL)
+
+    def do(self, key: str, request: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Run the request once for all processes requesting ``key`` at once.
+
+        Parameters
+        ----------
+        key
+            Identity of the request.
+
+        request
+            Function running the request and returning JSON-serializable result,
+            or ``None`` if the result should not be shared.
+
+        Returns
+        -------
+        :obj:`~typing.Optional` [Any]
+            Result of the request, either shared by another process or returned
+            by ``request``.
+
+        """
+        result_path = self._file(key, RESULT_SUFFIX)
+
+        result = self._read(result_path)
+        if result is not None:
+            return result
+
+        fd = self._lock(self._file(key, LOCK_SUFFIX))
+
+        if fd is None:
+            return request()
+
+        try:
+            # the result might have been shared while waiting for the lock
+            result = self._read(result_path)
+            if result is not None:
+                return result
+
+            result = request()
+
+            if result is not None:
+                try:
+                    self._prune()
+
+                    write_atomic(result_path, json.dumps(result).encode())
+                except OSError:
+                    # sharing is an optimization, so a full or read-only
+                    # directory should not stop the app from getting secrets
+                    pass
+
+            return result
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class SharedSecretProperties(NamedTuple):
+    """Class describing properties of the secret shared by another process."""
+
+    name: str
+    version: Optional[str]
+    enabled: Optional[bool]
+    content_type: Optional[str]
+    tags: Optional[Dict[str, str]]
+    created_on: Optional[datetime]
+    updated_on: Optional[datetime]
+    not_before: Optional[datetime]
+    expires_on: Optional[datetime]
+
+
+class SharedSecret(NamedTuple):
+    """Class describing the secret shared by another process.
+
+    Mimics attributes of :obj:`~azure.keyvault.secrets.KeyVaultSecret`
+    used by the app.
+    """
+
+    name: str
+    value: Optional[str]
+    properties: SharedSecretProperties
+
+
+def dump_secret(secret: "KeyVaultSecret") -> Dict[str, Any]:
+    """Get JSON-serializable representation of the secret."""
+    properties = secret.properties
+
+    return {
+        "name": secret.name,
+        "value": secret.value,
+        "version": properties.version,
+        "enabled": properties.enabled,
+        "content_type": properties.content_type,
+        "tags": properties.tags,
+        "created_on": to_timestamp(properties.created_on),
+        "updated_on": to_timestamp(properties.updated_on),
+        "not_before": to_timestamp(properties.not_before),
+        "expires_on": to_timestamp(properties.expires_on),
+    }
+
+
+def load_secret(data: Dict[str, Any]) -> SharedSecret:
+    """Get the secret from its representation by :func:`dump_secret`."""
+    return SharedSecret(
+        name=data["name"],
+        value=data["value"],
+        properties=SharedSecretProperties(
+            name=data["name"],
+            version=data.get("version"),
+            enabled=data.get("enabled"),
+            content_type=data.get("content_type"),
+            tags=data.get("tags"),
+            created_on=from_timestamp(data.get("created_on")),
+            updated_on=from_timestamp(data.get("updated_on")),
+            not_before=from_timestamp(data.get("not_before")),
+            expires_on=from_timestamp(data.get("expires_on")),
+        ),
+    )
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Saved secrets state module."""
+import json
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .files import write_atomic
+
+
+class SaveState(NamedTuple):
+    """Class describing the secret last saved to a target file."""
+
+    vault: str
+    version: str
+    digest: str
+    options: str
+    size: int
+    mtime_ns: int
+    outputs: Optional[Dict[str, List[int]]] = None
+
+
+class StateStore:
+    """Class implementing store of states of the target files.
+
+    Keeps one JSON record with mode ``0600`` per target file in ``path``
+    directory, named after the digest of the absolute path of the target.
+
+    Parameters
+    ----------
+    path
+        Path to the directory with the state records.
+
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize store in ``path`` directory."""
+        self.path = Path(path).expanduser()
+
+    def _record_path(self, target: Path) -> Path:
+        """Get path of the record for the ``target`` file."""
+        key = sha256(str(target.absolute()).encode()).hexdigest()
+
+        return self.path / "{}.json".format(key)
+
+    def load(self, target: Path) -> Optional[SaveState]:
+        """Load the state of the ``target`` file.
+
+        Parameters
+        ----------
+        target
+            Path to the file with the secret.
+
+        Returns
+        -------
+        :obj:`~typing.Optional` [SaveState]
+            State recorded for the target, or ``None`` if there is no valid record.
+
+        """
+        try:
+            with open(self._record_path(target)) as f:
+                return SaveState(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def store(self, target: Path, state: SaveState) -> None:
+        """Store the state of the ``target`` file.
+
+        Parameters
+        ----------
+        target
+            Path to the file with the secret.
+
+        state
+            State to be recorded.
+
+        """
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        write_atomic(self._record_path(target), json.dumps(state._asdict()).encode())
+
+    def matches(
+        self, target: Path, state: SaveState, outputs: Iterable[Path] = (),
+    ) -> bool:
+        """Check that the ``target`` file and its ``outputs`` have not changed.
+
+        Compares size and modification time of the files with ``state``, so that
+        a target file or an output converted from it modified or removed locally,
+        or an output not recorded at all, does not match the recorded state.
+        """
+        recorded: Dict[str, List[int]] = dict(state.outputs or {})
+        recorded[str(target.absolute())] = [state.size, state.mtime_ns]
+
+        for path in [target, *outputs]:
+            try:
+                stat = path.stat()
+            except OSError:
+                return False
+
+            if recorded.get(str(path.absolute())) != [stat.st_size, stat.st_mtime_ns]:
+                return False
+
+        return True
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Secret replication between Key Vaults module."""
+from hashlib import sha256
+from typing import Any, Dict, List, NamedTuple, Optional, TYPE_CHECKING, Tuple
+
+from cement import App
+
+from .archive import record_properties, secret_record
+from .fetch import SecretFetcher, map_bounded
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import SecretProperties
+
+# tags set on replicas: update time of the source secret and digest of its value
+SYNC_UPDATED_TAG = "azkv-sync-updated"
+SYNC_DIGEST_TAG = "azkv-sync-digest"
+
+ACTION_CREATE = "create"
+ACTION_UPDATE = "update"
+ACTION_PROPERTIES = "properties"
+
+STATUS_PLANNED = "planned"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _updated_tag(properties: "SecretProperties") -> str:
+    """Get value of the update time tag for the properties of the secret."""
+    if properties.updated_on is None:
+        return ""
+
+    return str(int(properties.updated_on.timestamp()))
+
+
+class SyncResult(NamedTuple):
+    """Class describing a replica of a secret brought in sync."""
+
+    name: str
+    vault: str
+    action: str
+    status: str
+
+
+class VaultSync:
+    """Class implementing incremental replication of secrets between Key Vaults.
+
+    Listings of the source and target Key Vaults are compared first. Replicas
+    written by the sync carry the update time of the source secret and the
+    digest of its value as tags, so secrets not updated in the source since
+    are skipped without fetching their values.
+
+    For every other secret, the value is fetched from the source once, and each
+    target missing the secret or holding another value gets a new version.
+    Targets holding the same value, e.g. replicas aligned before, only get their
+    properties and tags updated. Secrets are processed with
+    :func:`~.fetch.map_bounded`, bounded by the ``concurrency`` config option,
+    and requests are throttled per Key Vault by the clients. Secrets present
+    only in targets are left intact.
+
+    Parameters
+    ----------
+    app
+        Cement Framework application object.
+
+    """
+
+    def __init__(self, app: App) -> None:
+        """Initialize sync for the app."""
+        self.app = app
+        self.fetcher = SecretFetcher(app)
+
+    def _list(self, vault_list: List[str]) -> Dict[str, Dict[str, "SecretProperties"]]:
+        """Get properties of secrets of the vaults by name."""
+        listing: Dict[str, Dict[str, "SecretProperties"]] = {
+            vault: {} for vault in vault_list
+        }
+
+        for vault, page in self.fetcher.list_secrets(vault_list):
+            for properties in page:
+                listing[vault][properties.name] = properties
+
+        return listing
+
+    def sync(
+        self, source: str, targets: List[str], dry_run: bool = False,
+    ) -> Tuple[List[SyncResult], int]:
+        """Bring secrets of the targets in sync with the source.
+
+        Parameters
+        ----------
+        source
+            Short name of the Key Vault to copy secrets from.
+
+        targets
+            Short names of the Key Vaults to copy secrets to.
+
+        dry_run
+            (optional) Plan the changes without writing them.
+
+        Returns
+        -------
+        Tuple[List[SyncResult], int]
+            Replicas that have been (or would be) changed, ordered by name and
+            target, and the number of replicas already in sync.
+
+        """
+        listing = self._list([source] + targets)
+
+        # targets of each source secret whose update has not been replicated
+        pending: List[Tuple[str, List[str]]] = []
+        in_sync: int = 0
+
+        for name, properties in sorted(listing[source].items()):
+            if properties.enabled is False:
+                self.app.log.warning(
+                    "Skipping disabled secret '{}' in vault '{}'".format(name, source)
+                )
+
+                continue
+
+            updated: str = _updated_tag(properties)
+            stale: List[str] = []
+
+            for target in targets:
+                replica: Optional["SecretProperties"] = listing[target].get(name)
+                tags: Dict[str, str] = (replica.tags or {}) if replica else {}
+
+                if updated and tags.get(SYNC_UPDATED_TAG) == updated:
+                    in_sync += 1
+                else:
+                    stale.append(target)
+
+            if stale:
+                pending.append((name, stale))
+
+        self.app.log.info(
+            "Syncing {} secret(s) from vault '{}', {} replica(s) in sync".format(
+                len(pending), source, in_sync
+            )
+        )
+
+        concurrency: int = max(1, int(self.app.config.get("azkv", "concurrency")))
+
+        results: List[SyncResult] = []
+
+        for _, secret_results in map_bounded(
+            lambda item: self._sync_secret(source, *item, listing, dry_run),
+            pending,
+            concurrency,
+        ):
+            results.extend(secret_results)
+
+        results.sort(key=lambda result: (result.name, targets.index(result.vault)))
+
+        return results, in_sync
+
+    def _sync_secret(
+        self,
+        source: str,
+        name: str,
+        targets: List[str],
+        listing: Dict[str, Dict[str, "SecretProperties"]],
+        dry_run: bool,
+    ) -> List[SyncResult]:
+        """Bring replicas of the secret in the targets in sync with the source."""
+        secret = self.fetcher.get_secret(source, name)
+
+        if secret is None:
+            return [
+                SyncResult(name, target, ACTION_UPDATE, STATUS_FAILED)
+                for target in targets
+            ]
+
+        digest: str = sha256(secret.value.encode()).hexdigest()
+
+        record: Dict[str, Any] = secret_record(source, secret)
+        record["tags"] = dict(record["tags"] or {})
+        record["tags"].update(
+            {SYNC_UPDATED_TAG: _updated_tag(secret.properties), SYNC_DIGEST_TAG: digest}
+        )
+
+        results: List[SyncResult] = []
+
+        for target in targets:
+            replica: Optional["SecretProperties"] = listing[target].get(name)
+
+            if replica is None:
+                action = ACTION_CREATE
+            elif (replica.tags or {}).get(SYNC_DIGEST_TAG) == digest:
+                action = ACTION_PROPERTIES
+            elif SYNC_DIGEST_TAG in (replica.tags or {}):
+                action = ACTION_UPDATE
+            else:
+                # replica not written by the sync, compare its value once
+                current = self.fetcher.get_secret(target, name)
+
+                action = (
+                    ACTION_PROPERTIES
+                    if current is not None and current.value == secret.value
+                    else ACTION_UPDATE
+                )
+
+            if dry_run:
+                results.append(SyncResult(name, target, action, STATUS_PLANNED))
+
+                continue
+
+            if action == ACTION_PROPERTIES:
+                written = self.fetcher.update_secret_properties(
+                    target, name, **record_properties(record)
+                )
+            else:
+                written = self.fetcher.set_secret(
+                    target, name, secret.value, **record_properties(record)
+                )
+
+            results.append(
+                SyncResult(
+                    name, target, action, STATUS_DONE if written else STATUS_FAILED
+                )
+            )
+
+        return results
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Client-side throttling module."""
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Dict, Mapping, Optional
+
+# seconds to back off for if throttled without ``Retry-After`` header
+THROTTLE_BACKOFF = 1.0
+
+# upper bound of random delay added to backoff, as a fraction of it
+THROTTLE_JITTER = 0.5
+
+
+class TokenBucket:
+    """Class implementing thread-safe token bucket.
+
+    Lets through ``rate`` requests per second on average, with bursts of up to
+    ``burst`` requests. Requests can also be held back for a while altogether,
+    e.g. when the server asks to retry later.
+
+    Parameters
+    ----------
+    rate
+        (optional) Requests per second. If unspecified, the rate is unlimited.
+
+    burst
+        (optional) Maximum number of requests let through at once.
+
+    """
+
+    def __init__(self, rate: float = None, burst: int = None) -> None:
+        """Initialize full bucket."""
+        self.rate = rate if rate and rate > 0 else None
+        self.burst = max(1, burst or int(rate or 1))
+
+        self._tokens: float = self.burst
+        self._updated: float = monotonic()
+        self._paused_until: float = 0.0
+        self._lock = Lock()
+
+    def acquire(self) -> float:
+        """Wait for the next request to be let through.
+
+        Returns
+        -------
+        float
+            Seconds waited.
+
+        """
+        with self._lock:
+            now = monotonic()
+
+            # reserve the earliest slot, so waiting threads are served in order
+            start = max(now, self._paused_until)
+
+            if self.rate is not None:
+                self._tokens = min(
+                    self.burst, self._tokens + (start - self._updated) * self.rate
+                )
+                self._updated = start
+
+                self._tokens -= 1
+                if self._tokens < 0:
+                    start += -self._tokens / self.rate
+
+            delay = start - now
+
+        if delay > 0:
+            sleep(delay)
+
+        return max(0.0, delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests for ``seconds``."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+
+def get_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Get seconds to wait before retrying from the headers of the response.
+
+    Parameters
+    ----------
+    headers
+        Headers of the response, with case-insensitive names.
+
+    Returns
+    -------
+    :obj:`~typing.Optional` [float]
+        Seconds from ``retry-after-ms``, ``x-ms-retry-after-ms`` or ``Retry-After``
+        header, or ``None`` if none of them is valid.
+
+    """
+    for header in ("retry-after-ms", "x-ms-retry-after-ms"):
+        try:
+            return float(headers[header]) / 1000
+        except (KeyError, ValueError):
+            continue
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_on = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retry_on - datetime.now(timezone.utc)).total_seconds())
+
+
+class VaultThrottle:
+    """Class implementing client-side throttling of requests to Key Vaults.
+
+    Keeps a :class:`TokenBucket` per vault, limited by ``rate_limit`` of the
+    vault in config, and shared by all requests to the vault. When a vault
+    responds with ``429 Too Many Requests``, all requests to it are held back
+    for the time from ``Retry-After`` header with random jitter, and the
+    response is counted.
+
+    Parameters
+    ----------
+    keyvaults
+        Key Vaults from config, keyed by short name.
+
+    """
+
+    def __init__(self, keyvaults: Mapping[str, Any]) -> None:
+        """Initialize token buckets of the vaults."""
+        self._buckets: Dict[str, TokenBucket] = {}
+
+        for vault, vault_config in keyvaults.items():
+            rate_limit: Dict[str, Any] = vault_config.get("rate_limit") or {}
+
+            self._buckets[vault] = TokenBucket(
+                rate=rate_limit.get("rate"), burst=rate_limit.get("burst")
+            )
+
+        self._throttled: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def acquire(self, vault: str) -> float:
+        """Wait for the next request to the vault to be let through."""
+        return self._buckets[vault].acquire()
+
+    def record_throttled(self, vault: str, retry_after: Optional[float]) -> float:
+        """Record a throttled request to the vault and hold back the next ones.
+
+        Returns
+        -------
+        float
+            Seconds the requests to the vault are held back for.
+
+        """
+        delay = retry_after if retry_after is not None else THROTTLE_BACKOFF
+        delay += random.uniform(0, delay * THROTTLE_JITTER)  # noqa: S311
+
+        self._buckets[vault].pause(delay)
+
+        with self._lock:
+            self._throttled[vault] = self._throttled.get(vault, 0) + 1
+
+        return delay
+
+    @property
+    def throttled(self) -> Dict[str, int]:
+        """Number of throttled requests, keyed by short name of the vault."""
+        with self._lock:
+            return dict(self._throttled)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Time conversions module."""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """Convert time to POSIX timestamp, if set.
+
+    Parameters
+    ----------
+    value
+        Time, e.g. of a secret property, or ``None``.
+
+    Returns
+    -------
+    :obj:`~typing.Optional` [float]
+        POSIX timestamp of the time, or ``None`` if unset.
+
+    """
+    return value.timestamp() if value is not None else None
+
+
+def from_timestamp(value: Optional[float]) -> Optional[datetime]:
+    """Convert POSIX timestamp to UTC time, if set.
+
+    Parameters
+    ----------
+    value
+        POSIX timestamp, or ``None``.
+
+    Returns
+    -------
+    :obj:`~typing.Optional` [:obj:`~datetime.datetime`]
+        Timezone-aware UTC time of the timestamp, or ``None`` if unset.
+
+    """
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
@@ -2,17 +2,78 @@
 from cement import App, TestApp, init_defaults
 from cement.core.exc import CaughtSignal
 
+from .controllers.agent import Agent
 from .controllers.base import Base
 from .controllers.keyvaults import Keyvaults
 from .controllers.secrets import Secrets
+from .controllers.serve import Serve
 from .core.exc import AzKVError
-from .core.hooks import extend_vault_creds, log_app_version
+from .core.hooks import (
+    close_vault_clients,
+    extend_metrics,
+    extend_secret_index,
+    extend_single_flight,
+    extend_vault_clients,
+    extend_vault_creds,
+    extend_vault_health,
+    log_app_version,
+    log_throttled_requests,
+    save_vault_health,
+    write_metrics,
+)
 from .core.log import AzKVLogHandler
+from .core.output import (
+    AzKVJsonOutputHandler,
+    AzKVNdjsonOutputHandler,
+    AzKVOutputHandler,
+)
 
 # configuration defaults
 CONFIG = init_defaults("azkv", "azkv.credentials", "azkv.keyvaults")
 CONFIG["azkv"]["credentials"] = {"type": "EnvironmentVariables"}
-CONFIG["azkv"]["keyvaults"] = []
+CONFIG["azkv"]["keyvaults"] = {}
+CONFIG["azkv"]["concurrency"] = 8
+CONFIG["azkv"]["timeout"] = 10
+CONFIG["azkv"]["token_cache"] = {"enabled": False}
+CONFIG["azkv"]["state_dir"] = None
+CONFIG["azkv"]["agent"] = {"interval": None, "jitter": 600}
+CONFIG["azkv"]["schedule"] = {
+    "min_interval": 300,
+    "max_interval": 86400,
+    "safety_margin": 86400,
+    "backoff": 0.5,
+}
+CONFIG["azkv"]["index"] = {
+    "enabled": False,
+    "path": "~/.azkv/index.sqlite",
+    "max_age": 3600,
+}
+CONFIG["azkv"]["health"] = {
+    "enabled": False,
+    "path": "~/.azkv/health.json",
+    "failure_threshold": 3,
+    "cooldown": 300,
+    "prefer_latency": False,
+}
+CONFIG["azkv"]["single_flight"] = {
+    "enabled": False,
+    "path": "/run/azkv",
+    "ttl": 30,
+    "wait": 60,
+}
+CONFIG["azkv"]["serve"] = {
+    "socket": "/run/azkv.sock",
+    "ttl": 300,
+    "max_size": 1024,
+    "acl": None,
+}
+CONFIG["azkv"]["metrics"] = {"textfile": None}
+CONFIG["azkv"]["hooks"] = {
+    "actions": {},
+    "debounce": 5,
+    "timeout": 300,
+    "parallel": False,
+}
 
 
 class AzKV(App):
@@ -32,13 +93,21 @@ class AzKV(App):
         # register functions to hooks
         hooks = [
             ("post_setup", log_app_version),
+            ("post_setup", extend_metrics),
+            ("post_setup", extend_single_flight),
             ("post_setup", extend_vault_creds),
+            ("post_setup", extend_vault_clients),
+            ("post_setup", extend_secret_index),
+            ("post_setup", extend_vault_health),
+            ("pre_close", log_throttled_requests),
+            ("pre_close", write_metrics),
+            ("pre_close", close_vault_clients),
+            ("pre_close", save_vault_health),
         ]
 
         # load additional framework extensions
         extensions = [
             "colorlog",
-            "jinja2",
             "yaml",
         ]
 
@@ -51,11 +120,26 @@ class AzKV(App):
         # set log handler
         log_handler = "colorlog_custom_format"
 
-        # set the output handler
-        output_handler = "jinja2"
+        # set the output handler (loads `jinja2` extension on first render)
+        output_handler = "jinja2_lazy"
+
+        # allow machine-readable output with `--output json|ndjson`
+        handler_override_options = {
+            "output": (["--output"], {"help": "output format (default: table)"}),
+        }
 
         # register handlers
-        handlers = [Base, AzKVLogHandler, Keyvaults, Secrets]
+        handlers = [
+            Base,
+            AzKVLogHandler,
+            AzKVOutputHandler,
+            AzKVJsonOutputHandler,
+            AzKVNdjsonOutputHandler,
+            Agent,
+            Keyvaults,
+            Secrets,
+            Serve,
+        ]
 
 
 class AzKVTest(TestApp, AzKV):
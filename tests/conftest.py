@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 """Module defines common test fixtures."""
+from copy import deepcopy
+from datetime import datetime, timezone
 from logging import getLogger
+from types import SimpleNamespace
+
+from azkv.main import CONFIG
 
 from cement import fs
 
@@ -25,3 +30,35 @@ def tmp(request):
     t = fs.Tmp()
     yield t
     t.remove()
+
+
+@pytest.fixture(scope="function")
+def config_defaults(tmp):
+    """Provide app config defaults with several Key Vaults defined."""
+    config = deepcopy(CONFIG)
+    config["azkv"]["state_dir"] = "{}/state".format(tmp.dir)
+    config["azkv"]["keyvaults"] = {
+        "foo-prod-eastus": {"url": "https://foo-prod-eastus.vault.azure.net/"},
+        "foo-prod-uksouth": {"url": "https://foo-prod-uksouth.vault.azure.net/"},
+        "foo-prod-ukwest": {"url": "https://foo-prod-ukwest.vault.azure.net/"},
+    }
+
+    return config
+
+
+@pytest.fixture(scope="function")
+def make_secret():
+    """Provide factory of objects mimicking ``KeyVaultSecret``."""
+
+    def _make_secret(name, value="value", version="0" * 32):
+        properties = SimpleNamespace(
+            name=name,
+            version=version,
+            created_on=datetime(2020, 1, 1, tzinfo=timezone.utc),
+            expires_on=None,
+            updated_on=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        )
+
+        return SimpleNamespace(name=name, value=value, properties=properties)
+
+    return _make_secret
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Package exports performance benchmarks for the app."""
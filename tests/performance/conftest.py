@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Module defines fixtures of performance benchmarks."""
+from copy import deepcopy
+from pathlib import Path
+
+from azkv.core.clients import VaultClients
+from azkv.main import AzKVTest, CONFIG
+
+import pytest
+
+from .fake_vault import FakeVault, StaticTokenCredential, make_certificate
+
+
+@pytest.fixture(scope="session")
+def certificate(tmp_path_factory):
+    """Provide certificate of fake vaults."""
+    return make_certificate(tmp_path_factory.mktemp("certificate"))
+
+
+@pytest.fixture(scope="function")
+def fake_vaults(monkeypatch, certificate):
+    """Provide factory of running fake vaults, trusted by the app."""
+    monkeypatch.setenv("REQUESTS_CA_BUNDLE", str(certificate[0]))
+
+    vaults = []
+
+    def _fake_vaults(count, secrets, **kwargs):
+        """Start ``count`` vaults, each serving secrets from ``secrets(index)``."""
+        for index in range(count):
+            vaults.append(
+                FakeVault(certificate, secrets(index), seed=index, **kwargs).start()
+            )
+
+        return vaults[-count:]
+
+    yield _fake_vaults
+
+    for vault in vaults:
+        vault.stop()
+
+
+@pytest.fixture(scope="function")
+def bench_config(tmp_path):
+    """Provide factory of app config for the fake vaults."""
+
+    def _bench_config(vaults):
+        config = deepcopy(CONFIG)
+        config["azkv"]["state_dir"] = None
+        config["azkv"]["keyvaults"] = {
+            "vault-{}".format(index): {"url": vault.url}
+            for index, vault in enumerate(vaults)
+        }
+
+        return config
+
+    return _bench_config
+
+
+@pytest.fixture(scope="function")
+def run_app():
+    """Provide runner of the app with credentials replaced by a static token."""
+
+    def _run_app(argv, config):
+        with AzKVTest(argv=argv, config_defaults=config) as app:
+            keyvaults = app.config.get("azkv", "keyvaults")
+
+            app.vault_clients = VaultClients(
+                keyvaults=keyvaults,
+                vault_creds={vault: StaticTokenCredential() for vault in keyvaults},
+                timeout=app.config.get("azkv", "timeout"),
+                pool_size=app.config.get("azkv", "concurrency"),
+                throttle=app.vault_throttle,
+            )
+
+            app.run()
+
+            return app.exit_code
+
+    return _run_app
+
+
+@pytest.fixture(scope="function")
+def target_dir(tmp_path):
+    """Provide directory for secrets saved by benchmarks."""
+    path: Path = tmp_path / "secrets"
+    path.mkdir()
+
+    return path
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""Module implements local stand-in for the Azure Key Vault secrets API."""
+import json
+import random
+import ssl
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ipaddress import IPv4Address
+from pathlib import Path
+from threading import Lock, Thread
+from time import sleep, time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from azure.core.credentials import AccessToken
+
+# secrets per page of the listing, unless requested otherwise
+PAGE_SIZE = 25
+
+
+def make_certificate(directory: Path) -> Tuple[Path, Path]:
+    """Create self-signed certificate for ``127.0.0.1``.
+
+    Returns paths to the certificate and its private key in PEM format. The
+    certificate is its own CA, so it can be trusted via ``REQUESTS_CA_BUNDLE``.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "fake-vault")])
+    now = datetime.now(timezone.utc)
+
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(IPv4Address("127.0.0.1"))]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False
+        )
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_public_key(key.public_key()),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_path = directory / "fake-vault-cert.pem"
+    key_path = directory / "fake-vault-key.pem"
+
+    cert_path.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+
+    return cert_path, key_path
+
+
+class StaticTokenCredential:
+    """Credential handing out the same access token without any requests."""
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Get the static access token."""
+        return AccessToken("fake-token", int(time()) + 3600)
+
+    def close(self) -> None:
+        """Close the credential."""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handler of requests to the secrets API."""
+
+    protocol_version = "HTTP/1.1"
+
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Keep the benchmark output quiet."""
+
+    def _send(self, status: int, body: Any, headers: Dict[str, str] = None) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Answer ``Get Secret`` and ``Get Secrets`` operations."""
+        vault: "FakeVault" = self.server.vault
+
+        if "Authorization" not in self.headers:
+            # the resource is a suffix of the vault host, as the client verifies
+            self._send(
+                401,
+                None,
+                {
+                    "WWW-Authenticate": 'Bearer authorization="{}", resource="{}"'.format(
+                        "https://login.microsoftonline.com/fake-tenant",
+                        "https://0.0.1:{}".format(vault.port),
+                    )
+                },
+            )
+            return
+
+        status = vault.inject()
+
+        if status == 429:
+            self._send(
+                429,
+                {"error": {"code": "Throttled", "message": "Too many requests"}},
+                {"Retry-After": "0"},
+            )
+            return
+
+        if status == 500:
+            self._send(500, {"error": {"code": "InternalError", "message": "Boom"}})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["secrets"]:
+            skip = int(query.get("skip", ["0"])[0])
+            size = int(query.get("maxresults", [str(PAGE_SIZE)])[0])
+
+            self._send(200, vault.list_page(skip, size, query["api-version"][0]))
+            return
+
+        if len(parts) in (2, 3) and parts[0] == "secrets":
+            bundle = vault.bundle(parts[1])
+
+            if bundle is not None:
+                self._send(200, bundle)
+                return
+
+        self._send(
+            404, {"error": {"code": "SecretNotFound", "message": "Secret not found"}}
+        )
+
+
+class _Server(ThreadingHTTPServer):
+    """HTTPS server of a fake vault."""
+
+    daemon_threads = True
+
+    vault: "FakeVault"
+
+
+class FakeVault:
+    """Local HTTPS stand-in for an Azure Key Vault.
+
+    Serves secrets from memory after the authentication challenge, like the
+    real service, with optional latency and randomly injected server errors
+    and ``429 Too Many Requests`` responses.
+
+    Parameters
+    ----------
+    certificate
+        Paths to the certificate and private key to serve HTTPS with.
+
+    secrets
+        (optional) Values of the secrets, keyed by name.
+
+    latency
+        (optional) Seconds to delay each authorized response by.
+
+    error_rate
+        (optional) Fraction of authorized requests answered with server error.
+
+    throttle_rate
+        (optional) Fraction of authorized requests answered with ``429``.
+
+    seed
+        (optional) Seed of injected responses, for repeatable runs.
+
+    """
+
+    def __init__(
+        self,
+        certificate: Tuple[Path, Path],
+        secrets: Dict[str, str] = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        """Initialize vault serving ``secrets``."""
+        self.secrets: Dict[str, str] = dict(secrets or {})
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+
+        self.requests = 0
+
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = Lock()
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(str(certificate[0]), str(certificate[1]))
+
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._server.vault = self
+
+        self._thread: Optional[Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Port the vault listens on."""
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        """URL of the vault."""
+        return "https://127.0.0.1:{}/".format(self.port)
+
+    def inject(self) -> int:
+        """Count the request and pick its injected status, if any."""
+        if self.latency:
+            sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+
+            draw = self._random.random()
+
+        if draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return 500
+
+        return 200
+
+    def _properties(self, name: str) -> Dict[str, Any]:
+        """Get properties of the secret in API format."""
+        return {
+            "id": "{}secrets/{}/{}".format(self.url, name, "0" * 32),
+            "attributes": {
+                "enabled": True,
+                "created": 1577836800,
+                "updated": 1577836800,
+                "recoveryLevel": "Recoverable+Purgeable",
+            },
+            "tags": {"env": "benchmark"},
+        }
+
+    def bundle(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get the secret in API format, or ``None`` if there is no such secret."""
+        if name not in self.secrets:
+            return None
+
+        return dict(self._properties(name), value=self.secrets[name])
+
+    def list_page(self, skip: int, size: int, api_version: str) -> Dict[str, Any]:
+        """Get the page of secret properties in API format."""
+        names = sorted(self.secrets)
+        page = names[skip : skip + size]  # noqa: E203
+
+        next_link = None
+        if skip + size < len(names):
+            next_link = "{}secrets?api-version={}&maxresults={}&skip={}".format(
+                self.url, api_version, size, skip + size
+            )
+
+        return {
+            "value": [self._properties(name) for name in page],
+            "nextLink": next_link,
+        }
+
+    def start(self) -> "FakeVault":
+        """Serve requests in a background thread."""
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        """Stop serving requests."""
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
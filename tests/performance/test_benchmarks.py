@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Module defines performance benchmarks against fake Key Vaults.
+
+Run with ``tox -e performance``, or with ``pytest tests/performance
+--benchmark-only --benchmark-json=PATH`` to get machine-readable results, and
+compare them between releases with ``--benchmark-compare``.
+"""
+import subprocess  # noqa: S404
+import sys
+from base64 import standard_b64encode
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+SECRET_VALUE = "x" * 64
+
+ROUNDS = 5
+
+
+def _secrets(count):
+    """Get factory of ``count`` secrets named after the vault holding them."""
+    return lambda index: {
+        "secret-{}-{}".format(index, n): SECRET_VALUE for n in range(count)
+    }
+
+
+def _make_pfx():
+    """Create PKCS12 archive with a private key and self-signed certificate."""
+    from datetime import datetime, timedelta, timezone
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import NoEncryption, pkcs12
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+    now = datetime.now(timezone.utc)
+
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    return pkcs12.serialize_key_and_certificates(
+        b"benchmark", key, certificate, None, NoEncryption()
+    )
+
+
+@pytest.mark.parametrize("vault_count", [1, 3])
+def test_save(benchmark, fake_vaults, bench_config, run_app, target_dir, vault_count):
+    """Benchmark saving a secret held by the last of the vaults."""
+    vaults = fake_vaults(vault_count, _secrets(1))
+    config = bench_config(vaults)
+
+    file_path = target_dir / "secret"
+    argv = ["secrets", "save", "-n", "secret-{}-0".format(vault_count - 1)]
+    argv += ["-f", str(file_path)]
+
+    def setup():
+        if file_path.exists():
+            file_path.unlink()
+
+    benchmark.extra_info.update(scenario="save", vaults=vault_count)
+
+    exit_code = benchmark.pedantic(
+        run_app, args=(argv, config), setup=setup, rounds=ROUNDS, warmup_rounds=1
+    )
+
+    assert exit_code == 0  # noqa: S101
+    assert file_path.read_text() == SECRET_VALUE  # noqa: S101
+
+
+@pytest.mark.parametrize(
+    "injected",
+    [{}, {"latency": 0.01, "error_rate": 0.05, "throttle_rate": 0.1}],
+    ids=["healthy", "degraded"],
+)
+def test_save_many(
+    benchmark, fake_vaults, bench_config, run_app, target_dir, tmp_path, injected
+):
+    """Benchmark saving secrets from manifest spread across vaults."""
+    vault_count, secret_count = 3, 10
+
+    vaults = fake_vaults(vault_count, _secrets(secret_count), **injected)
+    config = bench_config(vaults)
+
+    manifest = tmp_path / "manifest.yaml"
+    manifest.write_text(
+        "".join(
+            "- name: secret-{0}-{1}\n  file: {2}/secret-{0}-{1}\n".format(
+                index, n, target_dir
+            )
+            for index in range(vault_count)
+            for n in range(secret_count)
+        )
+    )
+
+    def setup():
+        for path in target_dir.iterdir():
+            path.unlink()
+
+    benchmark.extra_info.update(
+        scenario="save-many", vaults=vault_count, secrets=secret_count, **injected
+    )
+
+    benchmark.pedantic(
+        run_app,
+        args=(["secrets", "save-many", "-m", str(manifest)], config),
+        setup=setup,
+        rounds=ROUNDS,
+    )
+
+    assert len(list(target_dir.iterdir())) == vault_count * secret_count  # noqa: S101
+
+
+def test_save_pfx_split_pem(benchmark, fake_vaults, bench_config, run_app, target_dir):
+    """Benchmark saving a PKCS12 secret split into PEM files."""
+    pfx = standard_b64encode(_make_pfx()).decode()
+
+    vaults = fake_vaults(1, lambda index: {"certificate": pfx})
+    config = bench_config(vaults)
+
+    file_path = target_dir / "certificate.pfx"
+    argv = ["secrets", "save", "-n", "certificate", "-f", str(file_path)]
+    argv += ["-b64", "-c", "pfx-split-pem"]
+
+    def setup():
+        for path in target_dir.iterdir():
+            path.unlink()
+
+    benchmark.extra_info.update(scenario="save-pfx-split-pem", vaults=1)
+
+    exit_code = benchmark.pedantic(
+        run_app, args=(argv, config), setup=setup, rounds=ROUNDS
+    )
+
+    assert exit_code == 0  # noqa: S101
+    assert (target_dir / "certificate_key.pem").exists()  # noqa: S101
+    assert (target_dir / "certificate_cert.pem").exists()  # noqa: S101
+
+
+def test_search(benchmark, fake_vaults, bench_config, run_app):
+    """Benchmark searching a secret across all vaults."""
+    vault_count = 3
+
+    vaults = fake_vaults(vault_count, _secrets(1))
+    config = bench_config(vaults)
+
+    benchmark.extra_info.update(scenario="search", vaults=vault_count)
+
+    benchmark.pedantic(
+        run_app, args=(["secrets", "search", "-n", "secret-0-0"], config), rounds=ROUNDS
+    )
+
+    # every round queries every vault, after the authentication challenge
+    assert all(vault.requests == ROUNDS for vault in vaults)  # noqa: S101
+
+
+def test_list(benchmark, fake_vaults, bench_config, run_app):
+    """Benchmark listing paged secret properties across all vaults."""
+    vault_count, secret_count = 3, 200
+
+    vaults = fake_vaults(vault_count, _secrets(secret_count))
+    config = bench_config(vaults)
+
+    benchmark.extra_info.update(
+        scenario="list", vaults=vault_count, secrets=secret_count
+    )
+
+    exit_code = benchmark.pedantic(
+        run_app, args=(["secrets", "list"], config), rounds=ROUNDS
+    )
+
+    assert exit_code == 0  # noqa: S101
+
+
+def test_export(benchmark, monkeypatch, fake_vaults, bench_config, run_app, tmp):
+    """Benchmark exporting all secrets of the vaults to an encrypted archive."""
+    vault_count, secret_count = 3, 200
+
+    vaults = fake_vaults(vault_count, _secrets(secret_count))
+    config = bench_config(vaults)
+
+    monkeypatch.setenv("AZKV_ARCHIVE_PASSPHRASE", "benchmark")
+
+    argv = ["secrets", "export", "--out", "{}/vaults.azkv".format(tmp.dir)]
+    for vault in config["azkv"]["keyvaults"]:
+        argv += ["-kv", vault]
+
+    benchmark.extra_info.update(
+        scenario="export", vaults=vault_count, secrets=secret_count
+    )
+
+    exit_code = benchmark.pedantic(run_app, args=(argv, config), rounds=ROUNDS)
+
+    assert exit_code == 0  # noqa: S101
+
+
+def test_startup(benchmark):
+    """Benchmark starting the app and printing help, in a new interpreter."""
+    argv = [sys.executable, "-m", "azkv.main", "--help"]
+
+    benchmark.extra_info.update(scenario="startup")
+
+    benchmark.pedantic(
+        subprocess.run,  # noqa: S603
+        args=(argv,),
+        kwargs={"check": True, "stdout": subprocess.DEVNULL},
+        rounds=ROUNDS,
+        warmup_rounds=1,
+    )
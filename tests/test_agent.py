@@ -0,0 +1,91 @@
+"""Module defines test cases for the refresh agent."""
+import signal
+from threading import Thread
+from time import sleep
+
+from azkv.core.agent import RefreshAgent
+from azkv.core.fetch import SecretFetcher
+from azkv.main import AzKVTest
+
+from cement.core.exc import CaughtSignal
+
+import pytest
+
+
+def test_agent_refreshes_and_reloads(monkeypatch, config_defaults, make_secret, tmp):
+    """Test that agent refreshes secrets on schedule and picks up new ones."""
+    calls = []
+
+    def fake_get_secret(self, vault, name, version=None):
+        calls.append(name)
+        return make_secret(name, value="{}-{}".format(name, len(calls)))
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    manifest_path = "{}/manifest.yaml".format(tmp.dir)
+    with open(manifest_path, "w") as f:
+        f.write("- name: foo\n  file: {}/foo\n  interval: 0.1\n".format(tmp.dir))
+
+    config_defaults["azkv"]["state_dir"] = None
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        agent = RefreshAgent(app, manifest_path, interval=60, jitter=0)
+
+        thread = Thread(target=agent.run)
+        thread.start()
+        try:
+            sleep(0.5)
+
+            with open(manifest_path, "a") as f:
+                f.write("- name: bar\n  file: {}/bar\n".format(tmp.dir))
+            agent.reload()
+
+            sleep(0.3)
+        finally:
+            agent.stop()
+            thread.join(timeout=5)
+
+    assert not thread.is_alive()  # noqa: S101
+    assert calls.count("foo") >= 3  # noqa: S101
+    assert calls.count("bar") == 1  # noqa: S101
+    with open("{}/bar".format(tmp.dir)) as f:
+        assert f.read().startswith("bar-")  # noqa: S101
+
+
+def test_agent_runs_pending_hooks_on_signal(
+    monkeypatch, config_defaults, make_secret, tmp
+):
+    """Test that hooks waiting out the debounce window run when agent is stopped."""
+    monkeypatch.setattr(
+        SecretFetcher,
+        "get_secret",
+        lambda self, vault, name, version=None: make_secret(name),
+    )
+
+    counter = "{}/counter".format(tmp.dir)
+
+    manifest_path = "{}/manifest.yaml".format(tmp.dir)
+    with open(manifest_path, "w") as f:
+        f.write("- {{name: foo, file: {}/foo, hooks: touch}}\n".format(tmp.dir))
+
+    config_defaults["azkv"]["state_dir"] = None
+    config_defaults["azkv"]["hooks"] = {
+        "actions": {"touch": {"command": "echo >> {}".format(counter)}},
+        "debounce": 60,
+    }
+
+    class Interrupt:
+        """Event raising ``CaughtSignal`` on wait, as on ``SIGTERM``."""
+
+        def wait(self, timeout=None):
+            raise CaughtSignal(signal.SIGTERM, None)
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        agent = RefreshAgent(app, manifest_path, interval=60, jitter=0)
+        agent._wakeup = Interrupt()
+
+        with pytest.raises(CaughtSignal):
+            agent.run()
+
+    with open(counter) as f:
+        assert f.read() == "\n"  # noqa: S101
@@ -0,0 +1,153 @@
+"""Module defines test cases for encrypted archives of secrets."""
+from io import BytesIO
+from types import SimpleNamespace
+
+from azkv.core.archive import FRAME_HEADER, NONCE_SIZE, ArchiveReader, ArchiveWriter
+from azkv.main import AzKVTest
+
+import pytest
+
+
+def test_archive_detects_tampering_and_truncation():
+    """Test that records round-trip, and damaged archives are rejected."""
+    f = BytesIO()
+
+    writer = ArchiveWriter(f, b"secret")
+    for index in range(3):
+        writer.write({"name": "foo-{}".format(index), "value": "bar"})
+    writer.close()
+
+    data = f.getvalue()
+
+    records = list(ArchiveReader(BytesIO(data), b"secret"))
+    assert [r["name"] for r in records] == ["foo-0", "foo-1", "foo-2"]  # noqa: S101
+
+    tampered = bytearray(data)
+    tampered[40] ^= 1
+
+    # the last record with the count, encrypted with 16 bytes of authentication tag
+    last_size = FRAME_HEADER.size + NONCE_SIZE + len(b'{"count": 3}') + 16
+
+    for damaged, passphrase in [
+        (data, b"wrong"),
+        (bytes(tampered), b"secret"),
+        (data[:-1], b"secret"),
+        (data[:-last_size], b"secret"),
+        (b"not an archive", b"secret"),
+    ]:
+        with pytest.raises(ValueError):
+            list(ArchiveReader(BytesIO(damaged), passphrase))
+
+
+def test_export_and_import_round_trip(monkeypatch, config_defaults, tmp):
+    """Test that exported secrets are verified and restored if changed.
+
+    Also restores them to another Key Vault than the ones they were exported from.
+    """
+    vaults = {
+        "foo-prod-eastus": {"foo": "1", "bar": "2", "off": "3"},
+        "foo-prod-uksouth": {"baz": "4"},
+        "foo-prod-ukwest": {},
+    }
+
+    def make_secret(name, value, enabled=True):
+        return SimpleNamespace(
+            name=name,
+            value=value,
+            properties=SimpleNamespace(
+                name=name,
+                version="1",
+                enabled=enabled,
+                content_type="text/plain",
+                tags={"env": "prod"},
+                not_before=None,
+                expires_on=None,
+            ),
+        )
+
+    class FakePager:
+        def __init__(self, vault):
+            self.vault = vault
+
+        def by_page(self):
+            yield iter(
+                make_secret(name, value, name != "off").properties
+                for name, value in vaults[self.vault].items()
+            )
+
+    class FakeClients:
+        def get(self, vault):
+            def get_secret(name, version=None):
+                from azure.core.exceptions import ResourceNotFoundError
+
+                if name not in vaults[vault]:
+                    raise ResourceNotFoundError("not found")
+
+                return make_secret(name, vaults[vault][name])
+
+            def set_secret(name, value, **kwargs):
+                assert kwargs["tags"] == {"env": "prod"}  # noqa: S101
+                vaults[vault][name] = value
+
+            return SimpleNamespace(
+                list_properties_of_secrets=lambda: FakePager(vault),
+                get_secret=get_secret,
+                set_secret=set_secret,
+            )
+
+        def close(self):
+            pass
+
+    monkeypatch.setenv("AZKV_ARCHIVE_PASSPHRASE", "secret")
+
+    archive_path = "{}/vaults.azkv".format(tmp.dir)
+
+    argv = ["secrets", "export", "-kv", "foo-prod-eastus", "-kv", "foo-prod-uksouth"]
+    argv += ["--out", archive_path]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+        data, _ = app.last_rendered
+
+        assert app.exit_code == 0  # noqa: S101
+
+    assert [r["exported"] for r in data["results"]] == [2, 1]  # noqa: S101
+
+    argv = ["secrets", "import", "--archive", archive_path, "--verify"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.run()
+
+        data, _ = app.last_rendered
+
+    assert sum(r["verified"] for r in data["results"]) == 3  # noqa: S101
+
+    vaults["foo-prod-eastus"]["foo"] = "changed"
+    vaults["foo-prod-uksouth"].clear()
+
+    argv = ["secrets", "import", "--archive", archive_path]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+        data, _ = app.last_rendered
+
+    counts = {r["vault_name"]: (r["restored"], r["unchanged"]) for r in data["results"]}
+    expected = {"foo-prod-eastus": (1, 1), "foo-prod-uksouth": (1, 0)}
+    assert counts == expected  # noqa: S101
+    assert vaults["foo-prod-eastus"]["foo"] == "1"  # noqa: S101
+    assert vaults["foo-prod-uksouth"] == {"baz": "4"}  # noqa: S101
+
+    argv = ["secrets", "import", "--archive", archive_path, "-kv", "foo-prod-ukwest"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+        data, _ = app.last_rendered
+
+        assert app.exit_code == 0  # noqa: S101
+
+    assert [(r["vault_name"], r["restored"]) for r in data["results"]] == [  # noqa: S101
+        ("foo-prod-ukwest", 3)
+    ]
+    assert vaults["foo-prod-ukwest"] == {"foo": "1", "bar": "2", "baz": "4"}  # noqa: S101
@@ -1,6 +1,20 @@
 """Module defines app test cases."""
+import json
+import subprocess  # noqa: S404
+import sys
+
 from azkv.main import AzKVTest
 
+# modules to be imported only by the commands using them
+HEAVY_MODULES = [
+    "azure.identity",
+    "azure.keyvault",
+    "cryptography",
+    "jinja2",
+    "requests",
+    "sqlite3",
+]
+
 
 def test_azkv():
     """Test azkv without any subcommands or arguments."""
@@ -15,3 +29,26 @@ def test_azkv_debug():
     with AzKVTest(argv=argv) as app:
         app.run()
         assert app.debug is True  # noqa: S101
+
+
+def test_azkv_startup_is_lazy():
+    """Test that startup and help do not import heavy modules."""
+    script = """
+import json, sys
+from azkv.main import AzKVTest, CONFIG
+CONFIG["azkv"]["keyvaults"] = {"foo": {"url": "https://foo.vault.azure.net/"}}
+with AzKVTest(argv=sys.argv[1:], config_defaults=CONFIG) as app:
+    try:
+        app.run()
+    except SystemExit:
+        pass
+print(json.dumps(list(sys.modules)))
+"""
+    for argv in (["--quiet"], ["--help"], ["secrets", "--help"]):
+        output = subprocess.run(  # noqa: S603
+            [sys.executable, "-c", script] + argv, check=True, stdout=subprocess.PIPE
+        ).stdout
+        modules = json.loads(output.decode().splitlines()[-1])
+
+        for module in HEAVY_MODULES:
+            assert module not in modules, argv  # noqa: S101
@@ -0,0 +1,47 @@
+"""Module defines test cases for the in-memory cache."""
+from threading import Thread
+from time import sleep
+
+from azkv.core.cache import TTLCache
+
+
+def test_cache_evicts_expired_and_least_recently_used():
+    """Test that entries expire after TTL and LRU entries are evicted."""
+    cache = TTLCache(ttl=0.2, max_size=2)
+
+    cache.set("foo", 1)
+    cache.set("bar", 2)
+    assert cache.get("foo") == 1  # noqa: S101
+
+    # "bar" is the least recently used
+    cache.set("baz", 3)
+    assert cache.get("bar") is None  # noqa: S101
+    assert cache.get("foo") == 1  # noqa: S101
+
+    sleep(0.3)
+    assert cache.get("foo") is None  # noqa: S101
+    assert len(cache) == 1  # noqa: S101
+
+
+def test_cache_loads_missing_entry_once():
+    """Test that concurrent readers of a missing entry share a single load."""
+    cache = TTLCache(ttl=60, max_size=10)
+    loads = []
+    results = []
+
+    def loader():
+        loads.append(1)
+        sleep(0.1)
+        return "value"
+
+    threads = [
+        Thread(target=lambda: results.append(cache.get_or_load("foo", loader)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 5  # noqa: S101
+    assert len(loads) == 1  # noqa: S101
@@ -0,0 +1,18 @@
+"""Module defines test cases for the Key Vault clients registry."""
+from azkv.main import AzKVTest
+
+
+def test_vault_clients_are_reused(config_defaults):
+    """Test that the app keeps one client per vault over a shared session."""
+    with AzKVTest(config_defaults=config_defaults) as app:
+        app.run()
+
+        eastus = app.vault_clients.get("foo-prod-eastus")
+        uksouth = app.vault_clients.get("foo-prod-uksouth")
+
+        assert app.vault_clients.get("foo-prod-eastus") is eastus  # noqa: S101
+        assert eastus is not uksouth  # noqa: S101
+
+        app.vault_clients.close()
+
+        assert app.vault_clients.get("foo-prod-eastus") is not eastus  # noqa: S101
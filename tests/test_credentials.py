@@ -0,0 +1,145 @@
+"""Module defines test cases for Azure credentials."""
+from pathlib import Path
+from threading import Event
+from time import monotonic, time
+
+from azkv.core.credentials import (
+    CachedCredential,
+    SingleFlightCredential,
+    TokenCache,
+    VaultCredentials,
+    vault_scope,
+)
+from azkv.core.singleflight import SingleFlight
+
+from azure.core.credentials import AccessToken
+
+
+class CountingCredential:
+    """Credential issuing a new token on every request."""
+
+    def __init__(self, lifetime=3600):
+        """Initialize credential with the token ``lifetime``."""
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        """Issue a new token."""
+        self.calls += 1
+        return AccessToken("token-{}".format(self.calls), int(time()) + self.lifetime)
+
+
+def test_token_cache_is_private_and_encrypted(tmp):
+    """Test that token cache file is readable only by owner and encrypted."""
+    path = "{}/cache/tokens.json".format(tmp.dir)
+    cache = TokenCache(path, key_file="{}/cache/key".format(tmp.dir))
+
+    cache.set("identity", AccessToken("secret-token", int(time()) + 60))
+
+    assert Path(path).stat().st_mode & 0o777 == 0o600  # noqa: S101
+    assert b"secret-token" not in Path(path).read_bytes()  # noqa: S101
+    assert cache.get("identity").token == "secret-token"  # noqa: S101
+
+
+def test_cached_credential_reuses_token_across_instances(tmp):
+    """Test that a valid token is served from cache by a new credential."""
+    path = "{}/tokens.json".format(tmp.dir)
+    scope = "https://vault.azure.net/.default"
+
+    first = CountingCredential()
+    CachedCredential(first, TokenCache(path), "identity").get_token(scope)
+
+    second = CountingCredential()
+    token = CachedCredential(second, TokenCache(path), "identity").get_token(scope)
+
+    assert token.token == "token-1"  # noqa: S101
+    assert second.calls == 0  # noqa: S101
+
+
+def test_cached_credential_refreshes_token_close_to_expiry(tmp):
+    """Test that a token about to expire is not served from cache."""
+    path = "{}/tokens.json".format(tmp.dir)
+    credential = CountingCredential(lifetime=60)
+
+    cached = CachedCredential(credential, TokenCache(path), "identity")
+    cached.get_token("scope")
+    cached.get_token("scope")
+
+    assert credential.calls == 2  # noqa: S101
+
+
+def test_single_flight_credential_shares_token_across_instances(tmp):
+    """Test that a token requested by one process is reused by another one."""
+    path = "{}/run/azkv".format(tmp.dir)
+    scope = "https://vault.azure.net/.default"
+
+    first = CountingCredential()
+    SingleFlightCredential(first, SingleFlight(path), "identity").get_token(scope)
+
+    second = CountingCredential()
+    token = SingleFlightCredential(second, SingleFlight(path), "identity").get_token(
+        scope
+    )
+
+    assert token.token == "token-1"  # noqa: S101
+    assert second.calls == 0  # noqa: S101
+
+
+def test_vault_credentials_prefetch_tokens_once_per_identity(monkeypatch):
+    """Test that vaults of an identity share credentials and a prefetched token."""
+    created = []
+
+    def create(creds_type, creds_client_id):
+        created.append((creds_type, creds_client_id))
+        return CountingCredential()
+
+    monkeypatch.setattr(VaultCredentials, "_create", staticmethod(create))
+
+    vault_creds = VaultCredentials(
+        {
+            "foo-prod-eastus": ("UserManagedIdentity", "foo"),
+            "foo-prod-uksouth": ("UserManagedIdentity", "foo"),
+            "bar-prod-eastus": ("UserManagedIdentity", "bar"),
+        }
+    )
+    vault_creds.prefetch(
+        {
+            vault: vault_scope("https://{}.vault.azure.net/".format(vault))
+            for vault in vault_creds
+        }
+    )
+
+    creds = vault_creds["foo-prod-uksouth"]
+
+    assert creds is vault_creds["foo-prod-eastus"]  # noqa: S101
+    assert creds.calls == 1  # noqa: S101
+    assert vault_creds["bar-prod-eastus"].calls == 1  # noqa: S101
+    assert sorted(created) == [  # noqa: S101
+        ("UserManagedIdentity", "bar"),
+        ("UserManagedIdentity", "foo"),
+    ]
+
+
+def test_vault_credentials_bound_wait_for_hung_prefetch(monkeypatch):
+    """Test that credentials are returned after the timeout if prefetch hangs."""
+    released = Event()
+
+    class HungCredential(CountingCredential):
+        def get_token(self, *scopes, **kwargs):
+            released.wait(5)
+            return super().get_token(*scopes, **kwargs)
+
+    monkeypatch.setattr(
+        VaultCredentials, "_create", staticmethod(lambda *args: HungCredential())
+    )
+
+    vault_creds = VaultCredentials({"foo-prod-eastus": ("SystemManagedIdentity", None)})
+    vault_creds.prefetch({"foo-prod-eastus": "scope"}, timeout=0.1)
+
+    started = monotonic()
+    try:
+        vault_creds["foo-prod-eastus"]
+
+        assert monotonic() - started < 1  # noqa: S101
+    finally:
+        released.set()
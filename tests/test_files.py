@@ -0,0 +1,28 @@
+"""Module defines test cases for file operations."""
+import os
+from hashlib import sha256
+from pathlib import Path
+
+from azkv.core.files import file_digest, write_atomic
+
+
+def test_write_atomic_replaces_file_privately(tmp):
+    """Test that file is replaced with mode '0600' leaving no temporary files."""
+    path = Path(tmp.dir) / "secret"
+    path.write_bytes(b"old")
+    path.chmod(0o644)
+
+    write_atomic(path, b"new")
+
+    assert path.read_bytes() == b"new"  # noqa: S101
+    assert path.stat().st_mode & 0o777 == 0o600  # noqa: S101
+    assert os.listdir(tmp.dir) == ["secret"]  # noqa: S101
+
+
+def test_file_digest_matches_content(tmp):
+    """Test that file digest is calculated over the whole content."""
+    path = Path(tmp.dir) / "secret"
+    content = os.urandom(200000)
+    path.write_bytes(content)
+
+    assert file_digest(path).digest() == sha256(content).digest()  # noqa: S101
@@ -0,0 +1,97 @@
+"""Module defines test cases for Key Vault health tracking."""
+from types import SimpleNamespace
+
+from azkv.core.health import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, VaultHealth
+from azkv.main import AzKVTest
+
+
+def test_breaker_opens_and_recovers(tmp):
+    """Test that breaker opens after consecutive failures and closes on success."""
+    path = "{}/health.json".format(tmp.dir)
+    health = VaultHealth(path, failure_threshold=2, cooldown=0)
+
+    health.record_success("foo", 0.1)
+    assert health.record_failure("foo") is False  # noqa: S101
+    assert health.state("foo") == STATE_CLOSED  # noqa: S101
+    assert health.record_failure("foo") is True  # noqa: S101
+
+    health.save()
+
+    # breaker state persists between runs
+    health = VaultHealth(path, failure_threshold=2, cooldown=60)
+    assert health.state("foo") == STATE_OPEN  # noqa: S101
+    assert health.order(["foo", "bar"]) == ["bar"]  # noqa: S101
+    assert health.order(["foo"]) == ["foo"]  # noqa: S101
+
+    health.cooldown = 0
+    assert health.state("foo") == STATE_HALF_OPEN  # noqa: S101
+    assert health.record_failure("foo") is True  # noqa: S101
+
+    health.record_success("foo", 0.3)
+    assert health.state("foo") == STATE_CLOSED  # noqa: S101
+    assert abs(health.latency("foo") - 0.16) < 1e-9  # noqa: S101
+
+
+def test_order_by_priority_and_latency(tmp):
+    """Test that vaults are ordered by priority tier, then by latency."""
+    health = VaultHealth("{}/health.json".format(tmp.dir))
+
+    for vault, latency in [("a", 0.5), ("b", 0.1), ("c", 0.2), ("d", 0.01)]:
+        health.record_success(vault, latency)
+
+    vaults = ["a", "b", "c", "d", "e"]
+    priorities = {"d": 1}
+
+    assert health.order(vaults, priorities) == ["a", "b", "c", "e", "d"]  # noqa: S101
+    assert health.order(vaults, priorities, prefer_latency=True) == [  # noqa: S101
+        "b",
+        "c",
+        "a",
+        "e",
+        "d",
+    ]
+
+
+def test_save_skips_vault_with_open_breaker(
+    monkeypatch, config_defaults, make_secret, tmp
+):
+    """Test that save does not query a vault after its breaker opens."""
+    from azure.core.exceptions import ServiceRequestError
+
+    queried = []
+
+    def fake_get_secret(vault, name, version=None):
+        queried.append(vault)
+        if vault == "foo-prod-eastus":
+            raise ServiceRequestError("timeout")
+        return make_secret(name)
+
+    class FakeClients:
+        def get(self, vault):
+            return SimpleNamespace(
+                get_secret=lambda *args: fake_get_secret(vault, *args)
+            )
+
+        def close(self):
+            pass
+
+    config_defaults["azkv"]["health"] = {
+        "enabled": True,
+        "path": "{}/health.json".format(tmp.dir),
+        "failure_threshold": 2,
+        "cooldown": 300,
+    }
+
+    for _ in range(3):
+        argv = ["secrets", "save", "-n", "foo", "-f", "{}/secret".format(tmp.dir)]
+        with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+            app.vault_clients = FakeClients()
+            app.run()
+
+    assert queried == [  # noqa: S101
+        "foo-prod-eastus",
+        "foo-prod-uksouth",
+        "foo-prod-eastus",
+        "foo-prod-uksouth",
+        "foo-prod-uksouth",
+    ]
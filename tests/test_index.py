@@ -0,0 +1,205 @@
+"""Module defines test cases for the local index of secrets."""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from azkv.core.exc import AzKVError
+from azkv.core.fetch import SecretFetcher
+from azkv.core.index import SecretIndex
+from azkv.main import AzKVTest
+
+import pytest
+
+UPDATED_ON = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def make_properties(name, updated_on=UPDATED_ON):
+    """Create object mimicking ``SecretProperties``."""
+    return SimpleNamespace(
+        name=name,
+        enabled=True,
+        tags={"env": "prod"},
+        created_on=UPDATED_ON,
+        updated_on=updated_on,
+        expires_on=None,
+    )
+
+
+def test_index_updates_changed_secrets_only(tmp):
+    """Test that refresh writes only secrets changed since the watermark."""
+    index = SecretIndex("{}/index.sqlite".format(tmp.dir))
+
+    assert index.refreshed_on("foo-prod-eastus") is None  # noqa: S101
+
+    secrets = [make_properties(name) for name in ("foo-tls", "foo-db", "bar-db")]
+    assert index.update("foo-prod-eastus", secrets) == 3  # noqa: S101
+    assert index.update("foo-prod-eastus", secrets) == 0  # noqa: S101
+
+    # one secret updated, one removed
+    secrets = [
+        make_properties("foo-tls", UPDATED_ON + timedelta(days=1)),
+        make_properties("foo-db"),
+    ]
+    assert index.update("foo-prod-eastus", secrets) == 2  # noqa: S101
+    assert index.refreshed_on("foo-prod-eastus") is not None  # noqa: S101
+
+    (foo_tls,) = index.search("foo-tls")
+    assert foo_tls.updated_on == UPDATED_ON + timedelta(days=1)  # noqa: S101
+    assert foo_tls.tags == {"env": "prod"}  # noqa: S101
+    assert index.search("bar-db") == []  # noqa: S101
+
+    assert [s.name for s in index.search("DB", "substring")] == [  # noqa: S101
+        "foo-db"
+    ]
+    assert [s.name for s in index.search("foo-*", "glob")] == [  # noqa: S101
+        "foo-db",
+        "foo-tls",
+    ]
+    assert [s.name for s in index.search("t.s$", "regex")] == [  # noqa: S101
+        "foo-tls"
+    ]
+    assert index.search("foo-*", "glob", ["foo-prod-ukwest"]) == []  # noqa: S101
+
+
+def test_search_matches_names_in_index(config_defaults, tmp):
+    """Test that search refreshes the index and matches names in it."""
+    listed = []
+
+    class FakeClients:
+        def get(self, vault):
+            def list_properties_of_secrets():
+                listed.append(vault)
+                return iter([make_properties("{}-tls".format(vault))])
+
+            return SimpleNamespace(
+                list_properties_of_secrets=list_properties_of_secrets
+            )
+
+        def close(self):
+            pass
+
+    config_defaults["azkv"]["index"] = {
+        "enabled": True,
+        "path": "{}/index.sqlite".format(tmp.dir),
+        "max_age": 3600,
+    }
+
+    for _ in range(2):
+        argv = ["secrets", "search", "--name", "*uk*", "--match", "glob"]
+        with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+            app.vault_clients = FakeClients()
+            app.run()
+
+            data, _ = app.last_rendered
+
+        assert [s["name"] for s in data["secrets"]] == [  # noqa: S101
+            "foo-prod-uksouth-tls",
+            "foo-prod-ukwest-tls",
+        ]
+
+    # the index was fresh on the second search
+    assert sorted(listed) == sorted(config_defaults["azkv"]["keyvaults"])  # noqa: S101
+
+
+def test_search_refreshes_index_without_match(config_defaults, tmp):
+    """Test that search refreshes the index for secrets created since last time."""
+    created = set()
+    listed = []
+
+    class FakeClients:
+        def get(self, vault):
+            def list_properties_of_secrets():
+                listed.append(vault)
+                return iter(
+                    [make_properties("{}-tls".format(vault))]
+                    + [
+                        make_properties(name, UPDATED_ON + timedelta(days=1))
+                        for name in created
+                        if name.startswith(vault)
+                    ]
+                )
+
+            return SimpleNamespace(
+                list_properties_of_secrets=list_properties_of_secrets
+            )
+
+        def close(self):
+            pass
+
+    config_defaults["azkv"]["index"] = {
+        "enabled": True,
+        "path": "{}/index.sqlite".format(tmp.dir),
+        "max_age": 3600,
+    }
+    vaults = list(config_defaults["azkv"]["keyvaults"])
+
+    def search(term):
+        argv = ["secrets", "search", "--name", term, "--match", "glob"]
+        with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+            app.vault_clients = FakeClients()
+            app.run()
+
+            data, _ = app.last_rendered
+
+        return [s["name"] for s in data["secrets"]]
+
+    assert search("*-db") == []  # noqa: S101
+    # the index was refreshed once, as nothing was created since then
+    assert sorted(listed) == sorted(vaults)  # noqa: S101
+
+    created.add("{}-db".format(vaults[0]))
+    del listed[:]
+
+    assert search("*-db") == ["{}-db".format(vaults[0])]  # noqa: S101
+    assert sorted(listed) == sorted(vaults)  # noqa: S101
+
+
+def test_broken_index_falls_back_to_vaults(config_defaults, tmp):
+    """Test that errors of the index are raised as such and do not stop fetching."""
+    index_path = "{}/index.sqlite".format(tmp.dir)
+
+    with open(index_path, "wb") as f:
+        f.write(b"not a database" * 1024)
+
+    index = SecretIndex(index_path)
+
+    for call in (
+        lambda: index.refreshed_on("foo-prod-eastus"),
+        lambda: index.update("foo-prod-eastus", [make_properties("foo-tls")]),
+        lambda: index.search("foo-tls"),
+    ):
+        with pytest.raises(AzKVError):
+            call()
+
+    listed = []
+
+    class FakeClients:
+        def get(self, vault):
+            def list_properties_of_secrets():
+                listed.append(vault)
+                return iter([make_properties("{}-tls".format(vault))])
+
+            return SimpleNamespace(
+                list_properties_of_secrets=list_properties_of_secrets
+            )
+
+        def close(self):
+            pass
+
+    config_defaults["azkv"]["index"] = {
+        "enabled": True,
+        "path": index_path,
+        "max_age": 3600,
+    }
+    vaults = list(config_defaults["azkv"]["keyvaults"])
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        fetcher = SecretFetcher(app)
+
+        for max_age in (3600, None):
+            fetcher.refresh_index(app.secret_index, vaults, max_age)
+
+        assert fetcher.get_indexed_vaults(vaults, "foo-tls") == []  # noqa: S101
+
+    # vaults were listed once, when refreshed without reading the index first
+    assert sorted(listed) == sorted(vaults)  # noqa: S101
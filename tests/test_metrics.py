@@ -0,0 +1,93 @@
+"""Module defines test cases for run metrics."""
+import json
+import os
+from types import SimpleNamespace
+
+from azkv.core.metrics import Metrics
+from azkv.main import AzKVTest
+
+
+def test_textfile_has_histograms_and_counters():
+    """Test that metrics are formatted in Prometheus text exposition format."""
+    metrics = Metrics()
+
+    metrics.observe("fetch", 0.02, vault="foo", secret='a"b')
+    metrics.observe("fetch", 3.0, vault="foo", secret='a"b')
+    metrics.count("requests", vault="foo", outcome="found")
+    metrics.count("requests", vault="foo", outcome="found")
+
+    lines = metrics.textfile().splitlines()
+
+    labels = 'phase="fetch",secret="a\\"b",vault="foo"'
+    assert "# TYPE azkv_phase_duration_seconds histogram" in lines  # noqa: S101
+    for line in [
+        'azkv_phase_duration_seconds_bucket{{{},le="0.025"}} 1'.format(labels),
+        'azkv_phase_duration_seconds_bucket{{{},le="+Inf"}} 2'.format(labels),
+        "azkv_phase_duration_seconds_count{{{}}} 2".format(labels),
+    ]:
+        assert line in lines  # noqa: S101
+    assert 'azkv_requests_total{outcome="found",vault="foo"} 2' in lines  # noqa: S101
+
+
+def test_save_writes_metrics(config_defaults, make_secret, tmp):
+    """Test that save records its phases and writes JSON summary and textfile."""
+
+    class FakeClients:
+        def get(self, vault):
+            return SimpleNamespace(get_secret=lambda name, version: make_secret(name))
+
+        def close(self):
+            pass
+
+    textfile = "{}/azkv.prom".format(tmp.dir)
+    config_defaults["azkv"]["metrics"] = {"textfile": textfile}
+
+    argv = [
+        "--metrics-json",
+        "{}/metrics.json".format(tmp.dir),
+        "secrets",
+        "save",
+        "-n",
+        "foo",
+        "-f",
+        "{}/secret".format(tmp.dir),
+    ]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+    with open("{}/metrics.json".format(tmp.dir)) as f:
+        summary = json.load(f)
+
+    phases = {item["phase"] for item in summary["phases"]}
+    assert {"save", "fetch", "decode", "write"} <= phases  # noqa: S101
+    assert {  # noqa: S101
+        "name": "secrets",
+        "labels": {"status": "updated"},
+        "value": 1,
+    } in summary["counters"]
+
+    # node_exporter usually runs as another user
+    assert os.stat(textfile).st_mode & 0o777 == 0o644  # noqa: S101
+
+    with open(textfile) as f:
+        content = f.read()
+
+    assert (  # noqa: S101
+        'azkv_phase_duration_seconds_count{phase="fetch",secret="foo",'
+        'vault="foo-prod-eastus"} 1' in content
+    )
+
+
+
+def test_metrics_json_to_dash_is_written_to_stderr(capsys):
+    """Test that JSON summary to ``-`` is not mixed with output of the command."""
+    metrics = Metrics()
+    metrics.observe("fetch", 0.02, vault="foo")
+
+    metrics.write_json("-")
+
+    captured = capsys.readouterr()
+
+    assert captured.out == ""  # noqa: S101
+    assert json.loads(captured.err)["phases"][0]["phase"] == "fetch"  # noqa: S101
@@ -0,0 +1,95 @@
+"""Module defines test cases for coalesced post-hooks."""
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+from azkv.core.posthooks import PostHookRunner
+from azkv.main import AzKVTest
+
+
+def test_runner_debounces_and_times_out(logger, tmp):
+    """Test that hooks wait for debounce window and busy secrets, and time out."""
+    counter = "{}/counter".format(tmp.dir)
+
+    runner = PostHookRunner(
+        SimpleNamespace(log=logger),
+        actions={
+            "count": {"command": "echo >> {}".format(counter)},
+            "hang": {"command": "sleep 5", "timeout": 0.2},
+        },
+        debounce=0.2,
+        parallel=True,
+    )
+
+    runner.notify("a", ["count"], None)
+    runner.notify("b", ["count"], None)
+    runner.notify("c", ["hang"], None)
+
+    assert runner.run_due() == set()  # noqa: S101
+    assert runner.next_due() > monotonic()  # noqa: S101
+
+    sleep(0.25)
+
+    busy = runner.keys(["count"], None)
+    assert runner.run_due(busy) == {"c"}  # noqa: S101
+    assert runner.next_due() is not None  # noqa: S101
+
+    started = monotonic()
+    assert runner.run_due() == set()  # noqa: S101
+    assert monotonic() - started < 1  # noqa: S101
+
+    with open(counter) as f:
+        assert f.read() == "\n"  # noqa: S101
+
+    assert runner.flush() == set()  # noqa: S101
+
+
+def test_save_many_runs_each_hook_once(config_defaults, make_secret, tmp):
+    """Test that hooks shared by secrets run once, and their failures are reported."""
+
+    class FakeClients:
+        def get(self, vault):
+            return SimpleNamespace(get_secret=lambda name, version: make_secret(name))
+
+        def close(self):
+            pass
+
+    counter = "{}/counter".format(tmp.dir)
+
+    config_defaults["azkv"]["hooks"] = {
+        "actions": {
+            "reload": {"command": "echo reload >> {}".format(counter)},
+            "broken": {"command": "exit 1"},
+        }
+    }
+
+    manifest = "{}/manifest.yaml".format(tmp.dir)
+    with open(manifest, "w") as f:
+        f.write(
+            """
+- {{name: cert, file: {0}/cert, hooks: reload}}
+- {{name: key, file: {0}/key, hooks: [reload], post_hook: "echo inline >> {1}"}}
+- {{name: ca, file: {0}/ca, hooks: [reload, broken]}}
+- {{name: other, file: {0}/other, post_hook: "echo inline >> {1}"}}
+""".format(
+                tmp.dir, counter
+            )
+        )
+
+    argv = ["secrets", "save-many", "-m", manifest]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+        data, _ = app.last_rendered
+
+        assert app.exit_code == 1  # noqa: S101
+
+    assert [r["status"] for r in data["results"]] == [  # noqa: S101
+        "updated",
+        "updated",
+        "failed",
+        "updated",
+    ]
+
+    with open(counter) as f:
+        assert sorted(f.read().split()) == ["inline", "reload"]  # noqa: S101
@@ -0,0 +1,61 @@
+"""Module defines test cases for the refresh scheduler."""
+from datetime import datetime, timedelta, timezone
+
+from azkv.core.fetch import SecretFetcher
+from azkv.core.schedule import RefreshScheduler
+from azkv.main import AzKVTest
+
+NOW = datetime(2020, 6, 1, tzinfo=timezone.utc)
+
+DAY = 86400
+
+
+def test_scheduler_backs_off_and_tightens():
+    """Test that static secrets are polled rarely and expiring ones often."""
+    scheduler = RefreshScheduler(
+        min_interval=300, max_interval=7 * DAY, safety_margin=DAY, backoff=0.5
+    )
+
+    # unknown lifecycle
+    assert scheduler.next_interval(None, None, NOW) == 7 * DAY  # noqa: S101
+    # static secret
+    static = NOW - timedelta(days=365)
+    assert scheduler.next_interval(static, None, NOW) == 7 * DAY  # noqa: S101
+    # recently rotated secret
+    recent = NOW - timedelta(hours=2)
+    assert scheduler.next_interval(recent, None, NOW) == 3600  # noqa: S101
+    # static secret approaching expiry
+    expires_on = NOW + timedelta(days=5)
+    assert scheduler.next_interval(static, expires_on, NOW) == 2 * DAY  # noqa: S101
+    # secret within safety margin of expiry
+    expires_on = NOW + timedelta(hours=12)
+    assert scheduler.next_interval(static, expires_on, NOW) == 300  # noqa: S101
+
+
+def test_next_refresh_lists_timer_times(monkeypatch, config_defaults, make_secret):
+    """Test that next refresh is planned for each secret."""
+
+    def fake_get_secret(self, vault, name, version=None):
+        if name == "missing":
+            return None
+        secret = make_secret(name)
+        secret.properties.updated_on = datetime.now(timezone.utc)
+        return secret
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    argv = ["secrets", "next-refresh", "-n", "foo", "-n", "missing"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.run()
+
+        data, _ = app.last_rendered
+
+        assert app.exit_code == 1  # noqa: S101
+
+    foo, missing = data["secrets"]
+    next_refresh = datetime.strptime(foo["next_refresh"], "%Y-%m-%d %H:%M:%S UTC")
+    delay = next_refresh.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+
+    assert timedelta(0) < delay <= timedelta(seconds=300)  # noqa: S101
+    assert foo["vault_name"] == "foo-prod-eastus"  # noqa: S101
+    assert missing["next_refresh"] == ""  # noqa: S101
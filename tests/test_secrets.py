@@ -0,0 +1,366 @@
+"""Module defines test cases for the ``secrets`` namespace."""
+import json
+import os
+import select
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+from azkv.core.fetch import SecretFetcher
+from azkv.core.pipeline import SavePipeline
+from azkv.main import AzKVTest
+
+
+def test_search_queries_vaults_concurrently(monkeypatch, config_defaults, make_secret):
+    """Test that search latency tracks the slowest vault and keeps config order."""
+    delays = {"foo-prod-eastus": 0.3, "foo-prod-uksouth": 0.1, "foo-prod-ukwest": 0.2}
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(delays[vault])
+        return make_secret(name, version=vault)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    argv = ["secrets", "search", "--name", "foo"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        started = monotonic()
+        app.run()
+        elapsed = monotonic() - started
+
+        data, _ = app.last_rendered
+
+    assert elapsed < sum(delays.values())  # noqa: S101
+    assert [s["vault_name"] for s in data["secrets"]] == list(delays)  # noqa: S101
+
+
+def test_search_streams_ndjson_as_vaults_respond(
+    monkeypatch, config_defaults, make_secret
+):
+    """Test that NDJSON search outputs each secret on arrival, without jinja2."""
+    delays = {"foo-prod-eastus": 0.3, "foo-prod-uksouth": 0.1, "foo-prod-ukwest": 0.2}
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(delays[vault])
+        return make_secret(name, version=vault)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    rendered = []
+
+    argv = ["--output", "ndjson", "secrets", "search", "--name", "foo"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        started = monotonic()
+
+        render = app.render
+        app.render = lambda data, *args, **kw: rendered.append(
+            (monotonic() - started, render(data, *args))
+        )
+        app.run()
+
+        loaded = app.ext.get_loaded_extensions()
+
+    assert "cement.ext.ext_jinja2" not in loaded  # noqa: S101
+
+    # the first secret is output before the slowest vault responds
+    assert rendered[0][0] < delays["foo-prod-eastus"]  # noqa: S101
+
+    records = [json.loads(line) for _, text in rendered for line in text.splitlines()]
+    assert [r["vault_name"] for r in records] == sorted(  # noqa: S101
+        delays, key=delays.get
+    )
+    assert records[0]["created_on"] == "2020-01-01T00:00:00Z+0000"  # noqa: S101
+
+
+def test_search_flushes_ndjson_records_to_pipe(
+    monkeypatch, config_defaults, make_secret
+):
+    """Test that NDJSON records reach a block-buffered pipe before the command ends."""
+    delays = {"foo-prod-eastus": 0.3, "foo-prod-uksouth": 0.1, "foo-prod-ukwest": 0.2}
+
+    read_fd, write_fd = os.pipe()
+    readable_before_last = []
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(delays[vault])
+        if vault == "foo-prod-eastus":
+            readable, _, _ = select.select([read_fd], [], [], 0)
+            readable_before_last.append(bool(readable))
+        return make_secret(name, version=vault)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    with os.fdopen(write_fd, "w", buffering=1 << 16) as pipe:
+        monkeypatch.setattr("sys.stdout", pipe)
+
+        argv = ["--output", "ndjson", "secrets", "search", "--name", "foo"]
+        with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+            app.run()
+
+    with os.fdopen(read_fd) as f:
+        records = [json.loads(line) for line in f]
+
+    assert readable_before_last == [True]  # noqa: S101
+    assert len(records) == 3  # noqa: S101
+
+
+def test_save_hedged_takes_first_available_vault(
+    monkeypatch, config_defaults, make_secret, tmp
+):
+    """Test that hedged save does not wait for a slow or failing vault."""
+    delays = {"foo-prod-eastus": 0.5, "foo-prod-uksouth": 0.0, "foo-prod-ukwest": 0.3}
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(delays[vault])
+        if vault != "foo-prod-ukwest":
+            return None
+        return make_secret(name, value=vault)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    # hedging does not depend on the fan-out limit
+    config_defaults["azkv"]["concurrency"] = 1
+
+    file_path = "{}/secret".format(tmp.dir)
+
+    argv = ["secrets", "save", "-n", "foo", "-f", file_path, "--hedge-delay", "0.1"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        started = monotonic()
+        app.run()
+        elapsed = monotonic() - started
+
+    # the last vault was queried while waiting for the first one to fail
+    assert elapsed < sum(delays.values())  # noqa: S101
+    with open(file_path) as f:
+        assert f.read() == "foo-prod-ukwest"  # noqa: S101
+
+
+def test_save_hedged_prefers_vault_listed_first(
+    monkeypatch, config_defaults, make_secret, tmp
+):
+    """Test that hedged save waits for a slow vault listed before the others."""
+    delays = {"foo-prod-eastus": 0.3, "foo-prod-uksouth": 0.0, "foo-prod-ukwest": 0.0}
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(delays[vault])
+        return make_secret(name, value=vault)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    file_path = "{}/secret".format(tmp.dir)
+
+    argv = ["secrets", "save", "-n", "foo", "-f", file_path, "--hedge-delay", "0.1"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.run()
+
+    with open(file_path) as f:
+        assert f.read() == "foo-prod-eastus"  # noqa: S101
+
+
+def test_save_many_reports_each_entry(monkeypatch, config_defaults, make_secret, tmp):
+    """Test that secrets from manifest are saved and summarized."""
+
+    def fake_get_secret(self, vault, name, version=None):
+        sleep(0.2)
+        if name == "missing":
+            return None
+        return make_secret(name, value=name)
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    names = ["foo", "bar", "baz", "missing"]
+
+    manifest_path = "{}/manifest.yaml".format(tmp.dir)
+    with open(manifest_path, "w") as f:
+        for name in names:
+            f.write("- name: {}\n  file: {}/{}\n".format(name, tmp.dir, name))
+            f.write("  vaults: foo-prod-eastus\n")
+
+    argv = ["secrets", "save-many", "--manifest", manifest_path]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        started = monotonic()
+        app.run()
+        elapsed = monotonic() - started
+
+        data, _ = app.last_rendered
+
+        assert app.exit_code == 1  # noqa: S101
+
+    assert elapsed < 0.2 * len(names)  # noqa: S101
+    assert [r["status"] for r in data["results"]] == [  # noqa: S101
+        "updated",
+        "updated",
+        "updated",
+        "not-found",
+    ]
+    with open("{}/bar".format(tmp.dir)) as f:
+        assert f.read() == "bar"  # noqa: S101
+
+
+def test_save_skips_unchanged_version(monkeypatch, config_defaults, make_secret, tmp):
+    """Test that save stops early when the secret version has not changed."""
+    version = "1" * 32
+    writes = []
+
+    def fake_get_secret(self, vault, name, version=None):
+        return make_secret(name, value=current_version, version=current_version)
+
+    def spy_write(self, secret_name, file_path_secret, secret_output):
+        writes.append(secret_output)
+        return original_write(self, secret_name, file_path_secret, secret_output)
+
+    original_write = SavePipeline._write
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+    monkeypatch.setattr(SavePipeline, "_write", spy_write)
+
+    argv = ["secrets", "save", "-n", "foo", "-f", "{}/secret".format(tmp.dir)]
+
+    for current_version, extra_argv in [
+        (version, []),
+        (version, []),
+        (version, ["--force"]),
+        ("2" * 32, []),
+    ]:
+        with AzKVTest(argv=argv + extra_argv, config_defaults=config_defaults) as app:
+            app.run()
+
+    assert writes == [b"1" * 32, b"1" * 32, b"2" * 32]  # noqa: S101
+
+
+def test_list_streams_filtered_pages(monkeypatch, config_defaults):
+    """Test that list filters secrets and outputs them page by page."""
+    read_fd, write_fd = os.pipe()
+    flushed = []
+
+    class FakePager:
+        def __init__(self, vault):
+            self.vault = vault
+
+        def by_page(self):
+            for page in range(3):
+                yield iter(
+                    SimpleNamespace(
+                        name="{}-{}-{}".format(prefix, self.vault, page),
+                        tags={"env": "prod"} if page else {"env": "dev"},
+                        updated_on=None,
+                        expires_on=None,
+                    )
+                    for prefix in ("foo", "bar")
+                )
+
+    class FakeClients:
+        def get(self, vault):
+            return SimpleNamespace(list_properties_of_secrets=lambda: FakePager(vault))
+
+        def close(self):
+            pass
+
+    argv = ["secrets", "list", "--prefix", "foo", "--tag", "env=prod", "-kv"]
+    argv += ["foo-prod-eastus", "-kv", "foo-prod-ukwest"]
+    rendered = []
+
+    # pages are flushed as rendered, also to block-buffered pipes
+    with os.fdopen(write_fd, "w", buffering=1 << 16) as pipe:
+        monkeypatch.setattr("sys.stdout", pipe)
+
+        with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+            app.vault_clients = FakeClients()
+
+            render = app.render
+
+            def render_page(data, *args, **kw):
+                # previous pages reached the pipe before the next one is rendered
+                readable, _, _ = select.select([read_fd], [], [], 0)
+                flushed.append(bool(readable) == bool(rendered))
+                rendered.append(render(data, *args, **kw))
+
+            app.render = render_page
+            app.run()
+
+    with os.fdopen(read_fd) as f:
+        assert f.read() == "".join(rendered)  # noqa: S101
+
+    assert all(flushed)  # noqa: S101
+
+    # one render for each page with matching secrets
+    assert len(rendered) == 4  # noqa: S101
+
+    lines = "".join(rendered).splitlines()
+
+    assert lines[0].split() == ["NAME", "UPDATED", "EXPIRES", "VAULT"]  # noqa: S101
+    assert sorted(line.split()[0] for line in lines[1:]) == [  # noqa: S101
+        "foo-foo-prod-eastus-1",
+        "foo-foo-prod-eastus-2",
+        "foo-foo-prod-ukwest-1",
+        "foo-foo-prod-ukwest-2",
+    ]
+
+
+def test_keyvaults_show_renders_json_document(config_defaults):
+    """Test that JSON output is a single document with records of the command."""
+    argv = ["--output", "json", "keyvaults", "show"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.run()
+
+        _, text = app.last_rendered
+
+    assert json.loads(text)["keyvaults"][0] == {  # noqa: S101
+        "name": "foo-prod-eastus",
+        "url": "https://foo-prod-eastus.vault.azure.net/",
+    }
+
+
+def test_versions_reports_duplicates_and_save_pins_version(config_defaults, tmp):
+    """Test that versions are listed newest first with digests, and saved by pin."""
+    from datetime import datetime, timezone
+
+    values = {"v1": "old", "v2": "new", "v3": "new"}
+
+    def make_properties(version):
+        return SimpleNamespace(
+            name="foo",
+            version=version,
+            enabled=True,
+            created_on=datetime(2020, 1, int(version[1:]), tzinfo=timezone.utc),
+            expires_on=None,
+            updated_on=None,
+        )
+
+    class FakePager:
+        def by_page(self):
+            yield iter(make_properties(version) for version in ("v2", "v1"))
+            yield iter([make_properties("v3")])
+
+    class FakeClients:
+        def get(self, vault):
+            return SimpleNamespace(
+                list_properties_of_secret_versions=lambda name: FakePager(),
+                get_secret=lambda name, version=None: SimpleNamespace(
+                    name=name,
+                    value=values[version or "v3"],
+                    properties=make_properties(version or "v3"),
+                ),
+            )
+
+        def close(self):
+            pass
+
+    argv = ["secrets", "versions", "-n", "foo", "-kv", "foo-prod-eastus"]
+    argv += ["--with-values"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+        data, _ = app.last_rendered
+
+    assert [v["version"] for v in data["versions"]] == ["v3", "v2", "v1"]  # noqa: S101
+    assert [v["duplicate_of"] for v in data["versions"]] == ["", "v3", ""]  # noqa: S101
+    assert data["versions"][0]["digest"] == data["versions"][1]["digest"]  # noqa: S101
+
+    file_path = "{}/secret".format(tmp.dir)
+
+    argv = ["secrets", "save", "-n", "foo", "-f", file_path, "--version", "v1"]
+    with AzKVTest(argv=argv, config_defaults=config_defaults) as app:
+        app.vault_clients = FakeClients()
+        app.run()
+
+    with open(file_path) as f:
+        assert f.read() == "old"  # noqa: S101
@@ -0,0 +1,99 @@
+"""Module defines test cases for the local secret server."""
+import json
+import os
+import socket
+from threading import Thread
+from time import sleep
+
+from azkv.core.fetch import SecretFetcher
+from azkv.core.server import SecretServer
+from azkv.main import AzKVTest
+
+
+def test_server_answers_cached_and_checks_acl(
+    monkeypatch, config_defaults, make_secret, tmp
+):
+    """Test that secrets are served from cache subject to access rules."""
+    calls = []
+
+    def fake_get_secret(self, vault, name, version=None):
+        calls.append((vault, name))
+        if vault == "foo-prod-eastus":
+            return None
+        return make_secret(name, value="{}-value".format(name))
+
+    monkeypatch.setattr(SecretFetcher, "get_secret", fake_get_secret)
+
+    socket_path = "{}/azkv.sock".format(tmp.dir)
+    acl = [{"uid": os.getuid(), "secrets": ["foo*"]}]
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        server = SecretServer(app, socket_path, ttl=60, max_size=10, acl=acl)
+
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            while not os.path.exists(socket_path):
+                sleep(0.01)
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                stream = client.makefile("rwb")
+
+                responses = []
+                for request in [
+                    {"name": "foo"},
+                    {"name": "foo"},
+                    {"name": "bar"},
+                    {"name": "foo", "vaults": "unknown"},
+                    "not a request",
+                ]:
+                    stream.write(json.dumps(request).encode() + b"\n")
+                    stream.flush()
+                    responses.append(json.loads(stream.readline()))
+        finally:
+            server.shutdown()
+            thread.join(timeout=5)
+
+    assert responses[0] == responses[1]  # noqa: S101
+    assert responses[0]["value"] == "foo-value"  # noqa: S101
+    assert responses[0]["vault"] == "foo-prod-uksouth"  # noqa: S101
+    assert responses[2] == {"error": "access denied"}  # noqa: S101
+    assert responses[3] == {"error": "secret not found"}  # noqa: S101
+    assert "error" in responses[4]  # noqa: S101
+    assert calls == [  # noqa: S101
+        ("foo-prod-eastus", "foo"),
+        ("foo-prod-uksouth", "foo"),
+    ]
+    assert not os.path.exists(socket_path)  # noqa: S101
+
+
+def test_server_ignores_rules_without_principal(config_defaults, tmp):
+    """Test that access rules matching no user or group allow nobody."""
+    acl = [{"secrets": ["foo*"]}, {"gid": os.getgid(), "secrets": ["bar"]}]
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        server = SecretServer(app, "{}/azkv.sock".format(tmp.dir), acl=acl)
+
+    assert not server.is_allowed(os.getuid(), os.getgid(), "foo")  # noqa: S101
+    assert server.is_allowed(os.getuid(), os.getgid(), "bar")  # noqa: S101
+
+
+def test_server_rejects_malformed_fields(config_defaults, tmp):
+    """Test that requests with fields of wrong types get an error reply."""
+    acl = [{"uid": os.getuid(), "secrets": ["*"]}]
+
+    with AzKVTest(config_defaults=config_defaults) as app:
+        server = SecretServer(app, "{}/azkv.sock".format(tmp.dir), acl=acl)
+
+        for request in [
+            {"name": 1},
+            {"name": "foo", "vaults": 1},
+            {"name": "foo", "vaults": [["foo-prod-eastus"]]},
+            {"name": "foo", "version": {"id": 1}},
+        ]:
+            response = server.handle_request(
+                json.dumps(request).encode(), os.getpid(), os.getuid(), os.getgid()
+            )
+
+            assert set(response) == {"error"}  # noqa: S101
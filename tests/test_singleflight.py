@@ -0,0 +1,60 @@
+"""Module defines test cases for coalescing of requests across processes."""
+from pathlib import Path
+from threading import Barrier, Lock, Thread
+from time import sleep
+
+from azkv.core.singleflight import SingleFlight
+
+import pytest
+
+
+def test_single_flight_runs_concurrent_requests_once(tmp):
+    """Test that concurrent requests share one result through a private file."""
+    path = "{}/run/azkv".format(tmp.dir)
+    calls = []
+    results = []
+    lock = Lock()
+    barrier = Barrier(4)
+
+    def request():
+        with lock:
+            calls.append(None)
+        sleep(0.2)
+        return {"value": "bar"}
+
+    def run():
+        # every thread has its own coordinator and lock file descriptor,
+        # as separate processes would
+        single_flight = SingleFlight(path, ttl=30, wait=5)
+        barrier.wait()
+        results.append(single_flight.do("secret|foo", request))
+
+    threads = [Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1  # noqa: S101
+    assert results == [{"value": "bar"}] * 4  # noqa: S101
+
+    (result_path,) = Path(path).glob("*.result")
+    assert result_path.stat().st_mode & 0o777 == 0o600  # noqa: S101
+    assert Path(path).stat().st_mode & 0o777 == 0o700  # noqa: S101
+
+
+def test_single_flight_does_not_share_failures_or_expired_results(tmp):
+    """Test that failed requests are retried and expired results are refreshed."""
+    single_flight = SingleFlight("{}/run/azkv".format(tmp.dir), ttl=30, wait=5)
+
+    def fail():
+        raise RuntimeError("unavailable")
+
+    with pytest.raises(RuntimeError):
+        single_flight.do("secret|foo", fail)
+
+    assert single_flight.do("secret|foo", lambda: "first") == "first"  # noqa: S101
+    assert single_flight.do("secret|foo", lambda: "second") == "first"  # noqa: S101
+
+    single_flight.ttl = 0
+    assert single_flight.do("secret|foo", lambda: "third") == "third"  # noqa: S101
@@ -0,0 +1,128 @@
+"""Module defines test cases for secret replication between Key Vaults."""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from azkv.main import AzKVTest
+
+
+class FakeVaults:
+    """In-memory Key Vaults counting fetches of secret values."""
+
+    def __init__(self, vaults):
+        self.vaults = vaults
+        self.fetches = 0
+        self.clock = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def put(self, vault, name, value, tags=None):
+        self.clock += timedelta(seconds=1)
+        self.vaults[vault][name] = {
+            "value": value,
+            "tags": dict(tags or {}),
+            "updated_on": self.clock,
+        }
+
+    def _properties(self, name, secret):
+        return SimpleNamespace(
+            name=name,
+            version=None,
+            enabled=True,
+            content_type=None,
+            tags=secret["tags"],
+            not_before=None,
+            expires_on=None,
+            updated_on=secret["updated_on"],
+        )
+
+    def get(self, vault):
+        secrets = self.vaults[vault]
+
+        def get_secret(name, version=None):
+            from azure.core.exceptions import ResourceNotFoundError
+
+            self.fetches += 1
+
+            if name not in secrets:
+                raise ResourceNotFoundError("not found")
+
+            return SimpleNamespace(
+                name=name,
+                value=secrets[name]["value"],
+                properties=self._properties(name, secrets[name]),
+            )
+
+        def update_secret_properties(name, **kwargs):
+            secrets[name]["tags"] = dict(kwargs["tags"])
+
+        pages = SimpleNamespace(
+            by_page=lambda: iter(
+                [[self._properties(name, secret) for name, secret in secrets.items()]]
+            )
+        )
+
+        return SimpleNamespace(
+            list_properties_of_secrets=lambda: pages,
+            get_secret=get_secret,
+            set_secret=lambda name, value, **kwargs: self.put(
+                vault, name, value, kwargs["tags"]
+            ),
+            update_secret_properties=update_secret_properties,
+        )
+
+    def close(self):
+        pass
+
+
+def test_sync_copies_only_changed_secrets(config_defaults):
+    """Test that sync plans, copies changes, and skips synced secrets unfetched."""
+    fake = FakeVaults(
+        {"foo-prod-eastus": {}, "foo-prod-uksouth": {}, "foo-prod-ukwest": {}}
+    )
+    for name in ("a", "b", "c"):
+        fake.put("foo-prod-eastus", name, "value-" + name)
+    fake.put("foo-prod-uksouth", "a", "value-a")
+    fake.put("foo-prod-uksouth", "b", "stale")
+
+    argv = ["secrets", "sync", "--from", "foo-prod-eastus"]
+    argv += ["--to", "foo-prod-uksouth", "--to", "foo-prod-ukwest"]
+
+    def run(extra_argv=()):
+        run_argv = argv + list(extra_argv)
+        with AzKVTest(argv=run_argv, config_defaults=config_defaults) as app:
+            app.vault_clients = fake
+            app.run()
+
+            data, _ = app.last_rendered
+
+            assert app.exit_code == 0  # noqa: S101
+
+        return [
+            (r["name"], r["vault_name"][9:], r["action"], r["status"])
+            for r in data["results"]
+        ]
+
+    assert run(["--dry-run"]) == [  # noqa: S101
+        ("a", "uksouth", "properties", "planned"),
+        ("a", "ukwest", "create", "planned"),
+        ("b", "uksouth", "update", "planned"),
+        ("b", "ukwest", "create", "planned"),
+        ("c", "uksouth", "create", "planned"),
+        ("c", "ukwest", "create", "planned"),
+    ]
+    assert "c" not in fake.vaults["foo-prod-ukwest"]  # noqa: S101
+
+    assert {status for _, _, _, status in run()} == {"done"}  # noqa: S101
+    assert fake.vaults["foo-prod-uksouth"]["b"]["value"] == "value-b"  # noqa: S101
+
+    # nothing changed, so no values are fetched
+    fake.fetches = 0
+    assert run() == []  # noqa: S101
+    assert fake.fetches == 0  # noqa: S101
+
+    fake.put("foo-prod-eastus", "b", "rotated")
+
+    assert run() == [  # noqa: S101
+        ("b", "uksouth", "update", "done"),
+        ("b", "ukwest", "update", "done"),
+    ]
+    assert fake.fetches == 1  # noqa: S101
+    assert fake.vaults["foo-prod-ukwest"]["b"]["value"] == "rotated"  # noqa: S101
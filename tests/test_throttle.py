@@ -0,0 +1,80 @@
+"""Module defines test cases for client-side throttling."""
+from time import monotonic
+
+from azkv.core.throttle import TokenBucket, VaultThrottle, get_retry_after
+
+
+def test_token_bucket_limits_rate():
+    """Test that bucket lets through bursts, then requests at its rate."""
+    bucket = TokenBucket(rate=20, burst=2)
+
+    started = monotonic()
+    waits = [bucket.acquire() for _ in range(6)]
+    elapsed = monotonic() - started
+
+    assert waits[:2] == [0.0, 0.0]  # noqa: S101
+    assert 0.15 < elapsed < 0.5  # noqa: S101
+
+    bucket.pause(0.2)
+
+    assert bucket.acquire() > 0.15  # noqa: S101
+
+
+def test_get_retry_after():
+    """Test that delay is read from any supported header."""
+    assert get_retry_after({"retry-after-ms": "1500"}) == 1.5  # noqa: S101
+    assert get_retry_after({"retry-after": "3"}) == 3.0  # noqa: S101
+    past = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert get_retry_after({"retry-after": past}) == 0  # noqa: S101
+    assert get_retry_after({"retry-after": "soon"}) is None  # noqa: S101
+    assert get_retry_after({}) is None  # noqa: S101
+
+
+def test_throttle_policy_backs_off_on_429():
+    """Test that 429 responses hold back requests and are counted."""
+    from azure.core.pipeline import Pipeline
+    from azure.core.pipeline.policies import RetryPolicy
+    from azure.core.pipeline.transport import HttpTransport, RequestsTransportResponse
+    from azure.core.rest import HttpRequest
+
+    from azkv.core.policies import ThrottlePolicy
+
+    import requests
+
+    statuses = [429, 429, 200]
+    sent = []
+
+    class FakeTransport(HttpTransport):
+        def send(self, request, **kwargs):
+            sent.append(monotonic())
+
+            response = requests.Response()
+            response.status_code = statuses[len(sent) - 1]
+            response.headers["Retry-After"] = "0.1"
+            response._content = b""
+
+            return RequestsTransportResponse(request, response)
+
+        def open(self):
+            pass
+
+        def close(self):
+            pass
+
+        def __exit__(self, *args):
+            pass
+
+    throttle = VaultThrottle({"foo": {"url": "https://foo.vault.azure.net/"}})
+
+    pipeline = Pipeline(
+        transport=FakeTransport(),
+        policies=[RetryPolicy(retry_backoff_factor=0), ThrottlePolicy("foo", throttle)],
+    )
+
+    response = pipeline.run(HttpRequest("GET", "https://foo.vault.azure.net/"))
+
+    assert response.http_response.status_code == 200  # noqa: S101
+    assert throttle.throttled == {"foo": 2}  # noqa: S101
+    # retries wait for Retry-After at least
+    assert sent[1] - sent[0] >= 0.1  # noqa: S101
+    assert sent[2] - sent[1] >= 0.1  # noqa: S101